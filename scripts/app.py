@@ -1,40 +1,88 @@
+import os
 import streamlit as st
-import pandas as pd
+
+import image_pack
+from catalog_service import connect
+from image_render import thumbnail_path
 
 st.set_page_config(page_title="Aura & Alpine", page_icon="🏔️")
 
-# Load data
-@st.cache_data
-def load_data():
-    return pd.read_csv('data/items.csv')
+# One catalog per process: a client of the shared catalog service when
+# $CATALOG_SERVICE is set, otherwise the catalog and its indexes in-process.
+# Its result cache starts with the most frequent logged searches already answered
+@st.cache_resource
+def load_catalog():
+    catalog = connect()
+    catalog.warmup()
+    return catalog
 
-df = load_data()
+# With CATALOG_IMAGES=pack local images are slices of the memory-mapped image pack
+@st.cache_resource
+def load_images():
+    return image_pack.ImagePack() if image_pack.enabled() else None
 
-st.title("🏔️ Aura & Alpine")
+catalog = load_catalog()
+info = catalog.info()
+images = load_images()
+if images is not None:
+    images.refresh()
 
-# Sidebar
-st.sidebar.header("Filters")
-brand_list = ["All"] + sorted(df['metadata:brand'].unique().tolist())
-selected_brand = st.sidebar.selectbox("Brand", brand_list)
+st.title("🏔️ Aura & Alpine")
 
 # Main Search
-query = st.text_input("Search catalog...", placeholder="e.g. Waterproof, Men, Tee")
+query = st.text_input("Search catalog...", placeholder="e.g. Waterproof, Men, Tee", key="query")
 
-# Filter logic
-filtered_df = df.copy()
-if selected_brand != "All":
-    filtered_df = filtered_df[filtered_df['metadata:brand'] == selected_brand]
+def use_suggestion(text):
+    st.session_state["query"] = text
 
-if query:
-    mask = (filtered_df['item_name'].str.contains(query, case=False, na=False) | 
-            filtered_df['description'].str.contains(query, case=False, na=False))
-    results = filtered_df[mask]
-    
-    st.write(f"Found {len(results)} matches")
+# Completions and typo fixes for what has been typed so far
+suggestions = catalog.suggest(query, limit=5) if query else []
+if suggestions:
+    for col, (text, _) in zip(st.columns(len(suggestions)), suggestions):
+        col.button(text, key=f"suggest_{text}", on_click=use_suggestion, args=(text,))
+
+# One query returns the page of results and every facet's option counts, which
+# come from the other facets' current selections (read before the widgets draw)
+price_bounds = tuple(info["price_bounds"])
+selections = {f: st.session_state.get(f"facet_{f}", []) for f in info["facets"]}
+price = st.session_state.get("facet_price", price_bounds)
+hide_sold_out = st.session_state.get("hide_sold_out", False)
+page_size = st.session_state.get("page_size", 24)
+page = st.session_state.get("page", 1)
+filtering = any(selections.values()) or tuple(price) != price_bounds
+
+def run_query(page):
+    return catalog.query(query, selections, price if filtering else None, hide_sold_out,
+                         offset=(page - 1) * page_size, limit=page_size)
+
+result = run_query(page)
+n_pages = max(1, -(-result["total"] // page_size))
+if page > n_pages:
+    page = st.session_state["page"] = n_pages
+    result = run_query(page)
+counts = result["counts"]
+
+st.sidebar.header("Filters")
+for facet, values in info["facets"].items():
+    st.sidebar.multiselect(
+        facet, values, key=f"facet_{facet}",
+        format_func=lambda v, c=counts[facet]: f"{v} ({c.get(v, 0)})",
+    )
+st.sidebar.slider("Price", *price_bounds, value=price_bounds, key="facet_price")
+st.sidebar.checkbox("Hide sold-out items", key="hide_sold_out")
+st.sidebar.selectbox("Results per page", [12, 24, 48, 96], index=1, key="page_size")
+
+if query or filtering:
+    # Only the current page is fetched and rendered, so page cost stays flat however many matches there are
+    if n_pages > 1:
+        page = st.number_input("Page", min_value=1, max_value=n_pages, key="page")
+    page_results = result["items"]
+
+    st.write(f"Found {result['total']} matches (page {page} of {n_pages})")
     
     # Display Grid
     cols = st.columns(3)
-    for i, row in results.reset_index().iterrows():
+    for i, row in enumerate(page_results):
         with cols[i % 3]:
             # Prefer the item's own image URL from the CSV. If missing, fall back to
             # a brand-based tag for loremflickr, then to a cleaned item-name tag.
@@ -50,10 +98,24 @@ if query:
                     tag = words[0] if words else 'apparel'
                 img_src = f"https://loremflickr.com/320/240/apparel,outdoor,{tag}"
 
+            # Local images are served from their precomputed 320px thumbnail when present
+            if not img_src.startswith(('http://', 'https://')):
+                thumb = thumbnail_path(img_src)
+                if images is not None and (thumb in images or img_src in images):
+                    # Streamlit keeps its own copy of image bytes, so the mapped slice is copied once here
+                    img_src = bytes(images.read(thumb if thumb in images else img_src))
+                elif os.path.exists(thumb):
+                    img_src = thumb
+
             # Use a numeric width so Streamlit renders predictably
             st.image(img_src, width=320)
             st.subheader(row['item_name'])
             st.write(f"Price: ${row['metadata:price']}")
+            st.caption(row['stock_summary'])
+            # Precomputed by similar_products.py: one row lookup per card
+            similar = catalog.similar(row['id'], limit=3)
+            if similar and similar['items']:
+                st.caption("Similar: " + ", ".join(f"{s['item_name']} (\\${s['metadata:price']})" for s in similar['items']))
             st.divider()
 else:
-    st.info("Enter a keyword to see our 5,000 products.")
\ No newline at end of file
+    st.info(f"Enter a keyword or pick a filter to see our {info['items']:,} products.")
\ No newline at end of file
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmarks for the catalog pipeline.
+
+For each catalog size a scratch copy of scripts/ is made under a temporary
+workspace, a catalog of that size is generated into it, and every stage runs
+there as its own subprocess:
+
+    generate, improve_names, refresh:<style> (each style), validate,
+    render (a sample of images), search (index build + a fixed query set)
+
+Refresh stages run with --no-images unless --refresh-images is given: their
+time is otherwise dominated by drawing every item's image, which the render
+stage measures on a fixed sample.
+
+Each stage records wall time, CPU time (user + sys, including worker
+processes) and peak RSS via os.wait4, plus items/s. Results go to
+data/benchmarks/<timestamp>.json. With --compare the run is checked against
+data/benchmarks/baseline.json (or --baseline) and any stage whose wall time or
+peak RSS grew by more than --threshold is reported as a regression (exit 1);
+--save-baseline stores the run as the new baseline.
+
+Usage: python3 scripts/benchmark.py [--sizes 5k,50k,500k,5M] [--stages ...] [--refresh-images]
+                                    [--compare] [--save-baseline] [--threshold 1.25]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+SCRIPTS_DIR = os.path.join(BASE, 'scripts')
+BENCH_DIR = os.path.join(BASE, 'data', 'benchmarks')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+DEFAULT_SIZES = '5k,50k,500k,5M'
+STYLES = ['brand', 'adjective', 'casual', 'premium']
+STAGES = ['generate', 'improve_names'] + [f'refresh:{s}' for s in STYLES] + ['validate', 'render', 'search']
+RENDER_SAMPLE = 64
+SEARCH_QUERIES = ['jacket', 'men tee', 'summit ridge', 'waterproof', 'cargo pants', 'hoodie women', 'ca']
+SEARCH_REPEAT = 20
+REGRESSION_THRESHOLD = 1.25
+# Exit statuses that still count as a completed run (validation reports findings with 1)
+OK_STATUS = {'validate': (0, 1)}
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+def stage_command(stage: str, n_items: int, images: bool = False) -> list:
+    py = sys.executable
+    if stage == 'generate':
+        return [py, 'scripts/generate_catalog.py', '--items', str(n_items)]
+    if stage == 'improve_names':
+        return [py, 'scripts/improve_product_names.py']
+    if stage.startswith('refresh:'):
+        cmd = [py, 'scripts/refresh_catalog.py', '--style', stage.split(':', 1)[1]]
+        return cmd if images else cmd + ['--no-images']
+    if stage == 'validate':
+        return [py, 'scripts/validate_catalog.py']
+    return [py, 'scripts/benchmark.py', '--stage', stage]
+
+def run_stage(stage: str, n_items: int, workdir: str, timeout: float = None, images: bool = False) -> dict:
+    """Run one stage in workdir and return its timings; the stage's last stdout line may add JSON metrics."""
+    out_path = os.path.join(workdir, f'{stage.replace(":", "-")}.log')
+    start = time.perf_counter()
+    with open(out_path, 'w') as out:
+        proc = subprocess.Popen(stage_command(stage, n_items, images), cwd=workdir, stdout=out, stderr=subprocess.STDOUT)
+        deadline = start + timeout if timeout else None
+        while True:
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                break
+            if deadline and time.perf_counter() > deadline:
+                proc.kill()
+            time.sleep(0.01)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    result = {
+        'items': n_items,
+        'stage': stage,
+        'returncode': proc.returncode,
+        'wall_s': round(wall, 4),
+        'cpu_s': round(usage.ru_utime + usage.ru_stime, 4),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),  # ru_maxrss is KiB on Linux
+        'items_per_s': round(n_items / wall, 1) if wall else None,
+    }
+    with open(out_path) as f:
+        lines = f.read().strip().splitlines()
+    if lines and lines[-1].startswith('{'):
+        try:
+            result.update(json.loads(lines[-1]))
+        except ValueError:
+            pass
+    if proc.returncode not in OK_STATUS.get(stage, (0,)):
+        result['error'] = '\n'.join(lines[-5:])
+    return result
+
+def bench_render(sample: int = RENDER_SAMPLE):
+    """Stage body: render a fixed sample of item images (and thumbnails) into a scratch dir."""
+    import pandas as pd
+    from image_render import render_all
+    items = pd.read_csv(os.path.join(BASE, 'data', 'items.csv'), nrows=sample)
+    out_dir = os.path.join(BASE, 'data', 'bench_render')
+    os.makedirs(out_dir, exist_ok=True)
+    palette = ['#0e6ea8', '#bdb07a', '#111111', '#f6f7f8']
+    jobs = [(os.path.join(out_dir, f'{i}.jpg'), palette[i % len(palette)], str(name))
+            for i, name in enumerate(items['item_name'])]
+    start = time.perf_counter()
+    render_all(jobs, progress=False)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'images': len(jobs), 'images_per_s': round(len(jobs) / elapsed, 1)}))
+
+def bench_search(queries: list = SEARCH_QUERIES, repeat: int = SEARCH_REPEAT):
+    """Stage body: build the search index, then time every query `repeat` times."""
+    import numpy as np
+    from catalog_search import CatalogSearchIndex
+    start = time.perf_counter()
+    index = CatalogSearchIndex.from_csv()
+    build = time.perf_counter() - start
+    latencies = []
+    for _ in range(repeat):
+        for q in queries:
+            t = time.perf_counter()
+            index.search(q, prefix=True)
+            latencies.append(time.perf_counter() - t)
+    ms = np.array(latencies) * 1000
+    print(json.dumps({'index_build_s': round(build, 4), 'queries': len(ms),
+                      'query_p50_ms': round(float(np.percentile(ms, 50)), 3),
+                      'query_p95_ms': round(float(np.percentile(ms, 95)), 3)}))
+
+def run_size(n_items: int, stages: list, timeout: float = None, keep: bool = False, images: bool = False) -> list:
+    workdir = tempfile.mkdtemp(prefix=f'catalog-bench-{n_items}-')
+    try:
+        shutil.copytree(SCRIPTS_DIR, os.path.join(workdir, 'scripts'), ignore=shutil.ignore_patterns('__pycache__'))
+        os.makedirs(os.path.join(workdir, 'data'))
+        results = []
+        for stage in ['generate'] + [s for s in stages if s != 'generate']:
+            r = run_stage(stage, n_items, workdir, timeout, images)
+            if stage in stages:
+                results.append(r)
+            print(f"{n_items:>9,} items  {stage:<17} {r['wall_s']:>9.2f}s wall {r['cpu_s']:>9.2f}s cpu "
+                  f"{r['peak_rss_mb']:>8.1f} MB" + ('  FAILED' if 'error' in r else ''), flush=True)
+            if 'error' in r and stage == 'generate':
+                break
+        return results
+    finally:
+        if keep:
+            print(f'Kept workspace {workdir}')
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def compare(results: list, baseline: list, threshold: float) -> list:
+    """Stages whose wall time or peak RSS grew by more than threshold x the baseline."""
+    known = {(r['items'], r['stage']): r for r in baseline}
+    regressions = []
+    for r in results:
+        old = known.get((r['items'], r['stage']))
+        if old is None:
+            continue
+        for metric in ('wall_s', 'peak_rss_mb'):
+            if old.get(metric) and r.get(metric) is not None and r[metric] > old[metric] * threshold:
+                regressions.append({'items': r['items'], 'stage': r['stage'], 'metric': metric,
+                                    'baseline': old[metric], 'current': r[metric],
+                                    'ratio': round(r[metric] / old[metric], 2)})
+    return regressions
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--sizes', default=DEFAULT_SIZES, help='comma-separated item counts, e.g. 5k,50k')
+    p.add_argument('--stages', default=','.join(STAGES), help='comma-separated subset of: ' + ', '.join(STAGES))
+    p.add_argument('--timeout', type=float, default=None, help='seconds before a stage is killed')
+    p.add_argument('--out', default=None, help='result JSON path (default: data/benchmarks/<timestamp>.json)')
+    p.add_argument('--compare', action='store_true', help='compare against the stored baseline')
+    p.add_argument('--baseline', default=BASELINE_PATH)
+    p.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    p.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    p.add_argument('--keep', action='store_true', help='keep the scratch workspaces')
+    p.add_argument('--refresh-images', action='store_true', help='let refresh stages render every image')
+    p.add_argument('--stage', choices=['render', 'search'], help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.stage == 'render':
+        return bench_render()
+    if args.stage == 'search':
+        return bench_search()
+
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        p.error(f'unknown stage(s): {", ".join(sorted(unknown))}')
+
+    results = []
+    for n in [parse_size(s) for s in args.sizes.split(',')]:
+        results.extend(run_size(n, stages, args.timeout, args.keep, args.refresh_images))
+
+    run = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'refresh_images': args.refresh_images,
+        'results': results,
+    }
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    out = args.out or os.path.join(BENCH_DIR, time.strftime('%Y%m%dT%H%M%S') + '.json')
+    if args.compare and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Refresh timings with and without rendering are not comparable; older baselines always rendered
+        same_refresh = baseline.get('refresh_images', True) == args.refresh_images
+        run['regressions'] = compare([r for r in results if same_refresh or not r['stage'].startswith('refresh:')],
+                                     baseline['results'], args.threshold)
+    with open(out, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f'Wrote {out}')
+    if args.save_baseline:
+        shutil.copyfile(out, args.baseline)
+        print(f'Saved baseline {args.baseline}')
+
+    failed = [r for r in results if 'error' in r]
+    for r in failed:
+        print(f"{r['stage']} failed at {r['items']} items:\n{r['error']}")
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f'No baseline at {args.baseline}; run with --save-baseline first')
+        for r in run.get('regressions', []):
+            print(f"REGRESSION {r['stage']} @ {r['items']:,} items: {r['metric']} "
+                  f"{r['baseline']} -> {r['current']} ({r['ratio']}x)")
+    sys.exit(1 if failed or run.get('regressions') else 0)
+
+if __name__ == '__main__':
+    main()
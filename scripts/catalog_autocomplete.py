@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Search-box autocomplete over item names and the naming vocabulary.
+
+Completion keys are every distinct item name plus every word that appears in
+item names, brands and genders or in the name generators' vocabularies
+(NAME_WORDS, ADJECTIVES, NOUNS, ...), each weighted by how many items it
+matches. Keys are kept in
+one sorted array, which acts as a compact prefix trie: every trie node (a
+prefix) is a contiguous range of keys found by binary search. A sparse table
+over the weights answers "heaviest key in a range" in O(1), so the top-k
+completions of any prefix come out of a small heap without scanning the
+range.
+
+Typos are handled by a character-trigram index over the words: candidates
+sharing trigrams with the typed word are checked with a bounded edit
+distance, so "jaket" still suggests "Jacket".
+
+Usage: python3 scripts/catalog_autocomplete.py "summit ja" [--limit 8]
+"""
+import argparse
+import bisect
+import heapq
+import numpy as np
+import pandas as pd
+
+from catalog_snapshot import load_items
+from improve_product_names import NAME_WORDS, NAME_TYPES
+from refresh_catalog import ADJECTIVES, NOUNS, CASUAL_ADJ, PREMIUM_ADJ
+
+FACET_COLUMNS = ('metadata:brand', 'metadata:gender')
+VOCABULARY = NAME_WORDS + NAME_TYPES + ADJECTIVES + NOUNS + CASUAL_ADJ + PREMIUM_ADJ
+DEFAULT_LIMIT = 8
+NGRAM = 3
+WORD_RE = r"[a-z0-9]+"
+
+def normalize(text: str) -> str:
+    return ' '.join(str(text).lower().split())
+
+def ngrams(word: str) -> set:
+    padded = f'^{word}$'
+    return {padded[i:i + NGRAM] for i in range(max(1, len(padded) - NGRAM + 1))}
+
+def max_typos(word: str) -> int:
+    return 0 if len(word) < 3 else 1 if len(word) < 5 else 2
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or limit + 1 as soon as it must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+class Autocomplete:
+    def __init__(self, weights: dict, display: dict, words: dict):
+        self.keys = sorted(weights)                         # normalized keys; the implicit trie
+        self.display = [display[k] for k in self.keys]      # original casing to show
+        self.word_display = {w: display[w] for w in words}
+        self.weights = np.array([weights[k] for k in self.keys], dtype=np.int64)
+        self._sparse = self._sparse_table(self.weights)
+
+        # Word-level trigram index for typo-tolerant matches
+        self.words = sorted(words)
+        self.word_weights = np.array([words[w] for w in self.words], dtype=np.int64)
+        grams = {}
+        for i, w in enumerate(self.words):
+            for g in ngrams(w):
+                grams.setdefault(g, []).append(i)
+        self.grams = {g: np.array(ids, dtype=np.int32) for g, ids in grams.items()}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, vocabulary: list = VOCABULARY):
+        # Normalize each distinct name once; the most common spelling is the one displayed
+        raw = df['item_name'].dropna().astype(str).value_counts()
+        keys = raw.index.map(normalize)
+        name_counts = pd.Series(raw.to_numpy(), index=keys).groupby(level=0).sum()
+        display = dict(zip(keys[::-1], raw.index[::-1]))
+
+        # Words weighted by how many items' names contain them
+        distinct = pd.DataFrame({'word': name_counts.index.str.findall(WORD_RE), 'n': name_counts.to_numpy()})
+        words = distinct.explode('word').dropna().groupby('word')['n'].sum()
+        word_counts = {str(w): int(n) for w, n in words.items()}
+        for col in FACET_COLUMNS:
+            if col in df:
+                values = df[col].dropna().astype(str).value_counts()
+                for value, n in values.items():
+                    for w in normalize(value).split():
+                        word_counts[w] = word_counts.get(w, 0) + int(n)
+                        display.setdefault(w, w.capitalize())
+        for v in vocabulary:
+            key = normalize(v)
+            if key not in word_counts:
+                # Multi-word entries ("Cargo Pants") count the names containing the phrase
+                word_counts[key] = int(name_counts[name_counts.index.str.contains(key, regex=False)].sum()) if ' ' in key else 0
+            display.setdefault(key, v)
+        for w in word_counts:
+            display.setdefault(w, w.capitalize())
+
+        weights = {str(k): int(n) for k, n in name_counts.items()}
+        for w, n in word_counts.items():
+            weights[w] = max(weights.get(w, 0), n)
+        return cls(weights, display, word_counts)
+
+    @classmethod
+    def from_csv(cls, path: str = None):
+        return cls.from_frame(load_items(path) if path else load_items())
+
+    @staticmethod
+    def _sparse_table(values: np.ndarray) -> list:
+        """table[j][i] = position of the max of values[i:i + 2**j]."""
+        table = [np.arange(len(values), dtype=np.int32)]
+        span = 1
+        while span * 2 <= len(values):
+            prev = table[-1]
+            left, right = prev[:-span], prev[span:]
+            table.append(np.where(values[left] >= values[right], left, right))
+            span *= 2
+        return table
+
+    def _argmax(self, lo: int, hi: int) -> int:
+        j = (hi - lo).bit_length() - 1
+        a, b = self._sparse[j][lo], self._sparse[j][hi - (1 << j)]
+        return int(a if self.weights[a] >= self.weights[b] else b)
+
+    def complete(self, prefix: str, limit: int = DEFAULT_LIMIT) -> list:
+        """Top-`limit` keys starting with prefix, heaviest first, as (display, weight)."""
+        prefix = normalize(prefix)
+        if not prefix or not self.keys:
+            return []
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + '\uffff')
+        out = []
+        heap = []
+        if lo < hi:
+            m = self._argmax(lo, hi)
+            heap.append((-self.weights[m], m, lo, hi))
+        while heap and len(out) < limit:
+            _, m, a, b = heapq.heappop(heap)
+            out.append((self.display[m], int(self.weights[m])))
+            for x, y in ((a, m), (m + 1, b)):
+                if x < y:
+                    n = self._argmax(x, y)
+                    heapq.heappush(heap, (-self.weights[n], n, x, y))
+        return out
+
+    def fuzzy(self, word: str, limit: int = DEFAULT_LIMIT) -> list:
+        """Words within a few edits of word (or of its prefix), closest then heaviest first."""
+        word = normalize(word)
+        budget = max_typos(word)
+        if not budget:
+            return []
+        hits = [self.grams[g] for g in ngrams(word) if g in self.grams]
+        if not hits:
+            return []
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.words))
+        candidates = np.flatnonzero(shared)
+        candidates = candidates[np.argsort(-shared[candidates], kind='stable')][:64]
+        scored = []
+        for i in candidates:
+            w = self.words[i]
+            # Typed words are often unfinished, so also compare against the candidate's prefix
+            d = min(edit_distance(word, w, budget), edit_distance(word, w[:len(word)], budget))
+            if 0 < d <= budget or (d == 0 and w != word):
+                scored.append((d, -int(self.word_weights[i]), w))
+        scored.sort()
+        return [(self.word_display[w], -neg) for _, neg, w in scored[:limit]]
+
+    def correct(self, query: str) -> str:
+        """The query with every unknown word replaced by its closest known word (None if nothing changed)."""
+        words = normalize(query).split()
+        fixed = []
+        for w in words:
+            fix = self.fuzzy(w, 1) if w not in self.word_display else []
+            fixed.append(fix[0][0].lower() if fix else w)
+        return ' '.join(fixed) if fixed != words else None
+
+    def suggest(self, query: str, limit: int = DEFAULT_LIMIT) -> list:
+        """Completions for a search box: whole-query prefix matches, then the last word
+        completed after the earlier words, then typo corrections of the last word."""
+        query = normalize(query)
+        if not query:
+            return []
+        out = self.complete(query, limit)
+        head, _, last = query.rpartition(' ')
+        if head:
+            head = self.correct(head) or head
+        if head and len(out) < limit:
+            out += [(f'{head} {text.lower()}', n) for text, n in self.complete(last, limit)]
+        if len(out) < limit:
+            fixes = self.fuzzy(last, limit)
+            out += [((f'{head} ' if head else '') + text, n) for text, n in fixes]
+        seen = set()
+        unique = []
+        for text, n in out:
+            if normalize(text) not in seen and normalize(text) != query:
+                seen.add(normalize(text))
+                unique.append((text, n))
+        return unique[:limit]
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('query')
+    p.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    args = p.parse_args()
+    ac = Autocomplete.from_csv()
+    for text, n in ac.suggest(args.query, args.limit):
+        print(f'{n:>6}  {text}')
+
+if __name__ == '__main__':
+    main()
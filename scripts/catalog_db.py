@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Optional SQLite backend for the catalog.
+
+With CATALOG_BACKEND=sqlite the catalog lives in data/catalog.db (or
+$CATALOG_DB) instead of the CSVs: `load_items` / `load_variations` read it
+over read-only connections, and the rewrite scripts send only the rows they
+changed as one batched transaction instead of rewriting whole files. The
+database runs in WAL mode, so the app can keep reading while a refresh
+writes, and concurrent writers queue on the write lock instead of
+clobbering each other.
+
+Rows are addressed by SQLite rowid (the DataFrame index of a loaded table),
+so duplicate ids are updated exactly like the CSV row they came from. id,
+variation_id and item_id are indexed.
+
+Usage: python3 scripts/catalog_db.py import|export [--table items|variations]
+"""
+import argparse
+import os
+import sqlite3
+import pandas as pd
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+DB_PATH = os.environ.get('CATALOG_DB') or os.path.join(BASE, 'data', 'catalog.db')
+TABLES = {
+    'items': os.path.join(BASE, 'data', 'items.csv'),
+    'variations': os.path.join(BASE, 'data', 'variations.csv'),
+}
+INDEXES = {
+    'items': ['id'],
+    'variations': ['variation_id', 'item_id'],
+}
+BUSY_TIMEOUT = 30.0
+
+def enabled() -> bool:
+    return os.environ.get('CATALOG_BACKEND', 'csv').lower() == 'sqlite'
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def connect(path: str = DB_PATH, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+def read_table(table: str, path: str = DB_PATH, columns: list = None) -> pd.DataFrame:
+    """The whole table (or just columns) in rowid order, indexed by rowid."""
+    select = ', '.join(_quote(c) for c in columns) if columns else '*'
+    conn = connect(path, readonly=True)
+    try:
+        df = pd.read_sql(f'SELECT rowid AS _rowid, {select} FROM {_quote(table)} ORDER BY rowid', conn, index_col='_rowid')
+    finally:
+        conn.close()
+    df.index.name = None
+    return df
+
+def update_rows(tables: dict, path: str = DB_PATH) -> int:
+    """Write {table: DataFrame indexed by rowid} in one transaction; every column given is updated."""
+    conn = connect(path)
+    total = 0
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        for table, df in tables.items():
+            if df.empty:
+                continue
+            sets = ', '.join(f'{_quote(c)} = ?' for c in df.columns)
+            values = df.astype(object).where(df.notna(), None)
+            params = [(*row, int(rowid)) for rowid, row in zip(df.index, values.itertuples(index=False, name=None))]
+            conn.executemany(f'UPDATE {_quote(table)} SET {sets} WHERE rowid = ?', params)
+            total += len(params)
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return total
+
+def import_csv(table: str, csv_path: str = None, path: str = DB_PATH) -> int:
+    """Replace a table with the contents of its CSV; the swap is atomic for readers."""
+    df = pd.read_csv(csv_path or TABLES[table])
+    staging = f'{table}__import'
+    conn = connect(path)
+    try:
+        conn.execute(f'DROP TABLE IF EXISTS {_quote(staging)}')
+        df.to_sql(staging, conn, index=False, chunksize=10_000)
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(f'DROP TABLE IF EXISTS {_quote(table)}')
+        conn.execute(f'ALTER TABLE {_quote(staging)} RENAME TO {_quote(table)}')
+        for col in INDEXES.get(table, []):
+            conn.execute(f'CREATE INDEX {_quote(f"{table}_{col}")} ON {_quote(table)} ({_quote(col)})')
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    return len(df)
+
+def export_csv(table: str, csv_path: str = None, path: str = DB_PATH) -> int:
+    csv_path = csv_path or TABLES[table]
+    df = read_table(table, path)
+    tmp = csv_path + '.tmp'
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, csv_path)
+    return len(df)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('action', choices=['import', 'export'])
+    p.add_argument('--table', choices=list(TABLES), action='append', help='default: all tables')
+    args = p.parse_args()
+    for table in args.table or TABLES:
+        if args.action == 'import':
+            n = import_csv(table)
+            print(f'Imported {n} rows from {TABLES[table]} into {DB_PATH}:{table}')
+        else:
+            n = export_csv(table)
+            print(f'Exported {n} rows from {DB_PATH}:{table} to {TABLES[table]}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Bitmap facet index for filtering items in app.py.
+
+Every facet value (brand, gender, group, price bucket, and the colours and
+sizes an item has in stock) gets one bitmap over item row positions, packed
+8 rows per byte with np.packbits. A filter ORs the selected values within a
+facet and ANDs across facets; option counts are popcounts of the filter on
+every *other* facet intersected with the option's bitmap, so each option
+shows how many items selecting it would leave. Price ranges binary-search a
+presorted price array instead of scanning.
+"""
+import numpy as np
+import pandas as pd
+
+from catalog_transform import first_positions
+
+ITEM_FACETS = {
+    'Brand': 'metadata:brand',
+    'Gender': 'metadata:gender',
+    'Group': 'group_ids',
+}
+VARIATION_FACETS = {
+    'Colour': 'metadata:color',
+    'Size': 'metadata:size',
+}
+PRICE_FACET = 'Price'
+PRICE_BUCKETS = [0, 25, 50, 100, 150, 200, float('inf')]
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(bitmap: np.ndarray) -> int:
+        return int(np.bitwise_count(bitmap).sum())
+else:
+    _POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(bitmap: np.ndarray) -> int:
+        return int(_POPCOUNT[bitmap].sum(dtype=np.int64))
+
+def price_bucket_labels() -> list:
+    labels = []
+    for lo, hi in zip(PRICE_BUCKETS[:-1], PRICE_BUCKETS[1:]):
+        labels.append(f'${lo}+' if hi == float('inf') else f'${lo}–{hi}')
+    return labels
+
+class FacetIndex:
+    def __init__(self, n_rows: int, bitmaps: dict, sorted_prices: np.ndarray, price_order: np.ndarray):
+        self.n_rows = n_rows
+        self.bitmaps = bitmaps              # facet -> {value: packed bitmap}
+        self.sorted_prices = sorted_prices
+        self.price_order = price_order      # row positions in ascending price order
+        self.all_rows = self.from_positions(np.arange(n_rows))
+
+    @classmethod
+    def build(cls, items: pd.DataFrame, variations: pd.DataFrame = None):
+        n = len(items)
+        bitmaps = {}
+        for facet, col in ITEM_FACETS.items():
+            codes, uniques = pd.factorize(items[col], sort=True)
+            bitmaps[facet] = {str(v): np.packbits(codes == k) for k, v in enumerate(uniques)}
+
+        prices = pd.to_numeric(items['metadata:price'], errors='coerce').to_numpy(dtype=np.float64)
+        buckets = np.digitize(prices, PRICE_BUCKETS[1:-1])
+        valid = ~np.isnan(prices)
+        bitmaps[PRICE_FACET] = {label: np.packbits((buckets == k) & valid)
+                                for k, label in enumerate(price_bucket_labels())}
+
+        if variations is not None:
+            # An item carries a colour/size value if any in-stock variation has it
+            parent = first_positions(items['id'], variations['item_id'])
+            stock = pd.to_numeric(variations['metadata:inventory'], errors='coerce').fillna(0).to_numpy()
+            keep = (parent >= 0) & (stock > 0)
+            for facet, col in VARIATION_FACETS.items():
+                codes, uniques = pd.factorize(variations[col], sort=True)
+                codes, rows = codes[keep], parent[keep]
+                bitmaps[facet] = {}
+                for k, v in enumerate(uniques):
+                    mask = np.zeros(n, dtype=bool)
+                    mask[rows[codes == k]] = True
+                    bitmaps[facet][str(v)] = np.packbits(mask)
+
+        order = np.argsort(np.where(valid, prices, np.inf), kind='stable')
+        order = order[valid[order]]
+        return cls(n, bitmaps, prices[order], order)
+
+    def from_positions(self, rows: np.ndarray) -> np.ndarray:
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask)
+
+    def positions(self, bitmap: np.ndarray) -> np.ndarray:
+        """Row positions set in a bitmap, ascending."""
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.n_rows))
+
+    def contains(self, bitmap: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Boolean mask of which rows are set, keeping the order of rows (e.g. search rank)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return ((bitmap[rows >> 3] >> (7 - (rows & 7))) & 1).astype(bool)
+
+    def values(self, facet: str) -> list:
+        return list(self.bitmaps.get(facet, {}))
+
+    def price_range(self, low: float = None, high: float = None) -> np.ndarray:
+        lo = 0 if low is None else np.searchsorted(self.sorted_prices, low, side='left')
+        hi = len(self.sorted_prices) if high is None else np.searchsorted(self.sorted_prices, high, side='right')
+        return self.from_positions(self.price_order[lo:hi])
+
+    def _facet_bitmap(self, facet: str, selected) -> np.ndarray:
+        out = np.zeros_like(self.all_rows)
+        for value in selected:
+            bm = self.bitmaps[facet].get(value)
+            if bm is not None:
+                out |= bm
+        return out
+
+    def filter(self, selections: dict, price: tuple = None, base: np.ndarray = None, skip: str = None) -> np.ndarray:
+        """AND across facets of the OR within each facet's selected values.
+
+        skip leaves one facet out, which is what its option counts need.
+        """
+        out = (self.all_rows if base is None else base).copy()
+        for facet, selected in selections.items():
+            if selected and facet != skip:
+                out &= self._facet_bitmap(facet, selected)
+        if price is not None:
+            out &= self.price_range(*price)
+        return out
+
+    def counts(self, selections: dict, price: tuple = None, base: np.ndarray = None) -> dict:
+        """{facet: {value: number of matching items if that value were selected}}"""
+        out = {}
+        for facet, values in self.bitmaps.items():
+            others = self.filter(selections, price, base, skip=facet)
+            out[facet] = {v: popcount(others & bm) for v, bm in values.items()}
+        return out
@@ -0,0 +1,46 @@
+"""
+Per-row fingerprints for incremental catalog refreshes.
+
+A fingerprint is a 64-bit hash of a row's values plus a salt naming the
+transform that produced it (script and style). The rewrite scripts record
+the fingerprint of every row they write; on the next run a row is recomputed
+only if its fingerprint no longer matches, i.e. it is new, its inputs (id,
+brand, colour, ...) were edited, another script rewrote it, or the style
+changed. State lives in data/refresh_state/<script>-<table>.csv.
+"""
+import os
+import pandas as pd
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+STATE_DIR = os.path.join(BASE, 'data', 'refresh_state')
+
+def fingerprint(df: pd.DataFrame, salt: str) -> pd.Series:
+    """uint64 hash of each row's values combined with salt."""
+    values = df.astype(object).where(df.notna(), '').astype(str)
+    row_hash = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    salt_hash = pd.util.hash_pandas_object(pd.Series([salt]), index=False).to_numpy()[0]
+    return pd.Series(row_hash ^ salt_hash, index=df.index, dtype='uint64')
+
+class FingerprintState:
+    def __init__(self, name: str, table: str):
+        self.path = os.path.join(STATE_DIR, f'{name}-{table}.csv')
+        self.known = pd.Series(dtype='uint64', index=pd.Index([], dtype=object))
+        if os.path.exists(self.path):
+            state = pd.read_csv(self.path, dtype={'key': str, 'fingerprint': 'uint64'})
+            self.known = pd.Series(state['fingerprint'].to_numpy(), index=state['key'].to_numpy())
+
+    def changed(self, keys: pd.Series, fingerprints: pd.Series) -> pd.Series:
+        """Boolean mask of rows that are new or whose fingerprint differs."""
+        # Positional lookup keeps the uint64 values exact (a .map would go through float64)
+        pos = self.known.index.get_indexer(keys.astype(str))
+        known = self.known.to_numpy()
+        stale = pos < 0
+        stale[~stale] = known[pos[~stale]] != fingerprints.to_numpy()[~stale]
+        return pd.Series(stale, index=keys.index)
+
+    def save(self, keys: pd.Series, fingerprints: pd.Series):
+        os.makedirs(STATE_DIR, exist_ok=True)
+        state = pd.DataFrame({'key': keys.astype(str).to_numpy(), 'fingerprint': fingerprints.to_numpy()})
+        tmp = self.path + '.tmp'
+        state.drop_duplicates('key', keep='last').to_csv(tmp, index=False)
+        os.replace(tmp, self.path)
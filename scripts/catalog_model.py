@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Compact typed in-memory catalog.
+
+`pd.read_csv` keeps every text cell as its own Python string and every
+number as 64 bits. CatalogModel stores the same tables as flat numpy arrays:
+
+- ids as fixed-width byte strings,
+- every other text column as interned categorical codes (int8/16/32 plus one
+  copy of each distinct value),
+- price as float32 and inventory as int32,
+- variations point at their parent by int32 row instead of repeating the
+  item id string.
+
+Columns the catalog scripts generate from other columns are not stored at
+all but derived on demand: an item's url, image_url and description from its
+id or name (whichever rule the loaded rows follow: generate_catalog.py's or
+refresh_catalog.py's), a variation's item_id, item_name
+("<parent> (<colour> / <size>)") and image_url from its parent. Only rows whose
+stored value differs from the derived one are kept, as overrides, so
+hand-edited rows round-trip exactly through `to_frames()`.
+
+Rows are read through `ItemView` / `VariationView`, `__slots__` objects that
+hold only the model and a row number.
+
+Usage: python3 scripts/catalog_model.py   (prints the footprint of the current catalog)
+"""
+import sys
+import numpy as np
+import pandas as pd
+
+from catalog_snapshot import load_items, load_variations
+from catalog_transform import (
+    PRODUCT_URL_PREFIX, first_positions, image_paths, product_urls, slugify_column, variation_names,
+)
+
+ITEM_ID = 'id'
+VARIATION_ID = 'variation_id'
+PARENT_ID = 'item_id'
+FLOAT_COLUMNS = {'metadata:price'}
+INT_COLUMNS = {'metadata:inventory'}
+# generate_catalog.py's placeholder image host
+IMAGE_HOST = 'https://images.aura-alpine.com/'
+
+def _code_dtype(n: int):
+    return np.int8 if n < 127 else np.int16 if n < 32767 else np.int32
+
+def _take(table: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """table[codes] with None where codes < 0."""
+    out = np.full(len(codes), None, dtype=object)
+    valid = codes >= 0
+    out[valid] = table[codes[valid]]
+    return out
+
+class CodedColumn:
+    """Interned strings: small integer codes into one array of distinct values (-1 = missing)."""
+    def __init__(self, values):
+        codes, categories = pd.factorize(pd.Series(values, dtype=object), sort=False)
+        self.codes = codes.astype(_code_dtype(len(categories)))
+        self.categories = np.asarray(categories, dtype=object)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def value(self, i: int):
+        code = self.codes[i]
+        return None if code < 0 else self.categories[code]
+
+    def array(self) -> np.ndarray:
+        return _take(self.categories, self.codes)
+
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.categories.nbytes + sum(sys.getsizeof(v) for v in self.categories)
+
+class BytesColumn:
+    """Unique keys (ids) as fixed-width UTF-8 byte strings."""
+    def __init__(self, values):
+        values = pd.Series(values).astype(str).to_numpy(dtype=object)
+        try:
+            self.values = values.astype(bytes)      # numpy's fast path, ASCII only
+            self.ascii = True
+        except UnicodeEncodeError:
+            self.values = np.array([v.encode('utf-8') for v in values], dtype=bytes)
+            self.ascii = False
+
+    def __len__(self):
+        return len(self.values)
+
+    def value(self, i: int) -> str:
+        return self.values[i].decode('utf-8')
+
+    def array(self) -> np.ndarray:
+        if self.ascii:
+            return self.values.astype(str).astype(object)
+        return np.array([v.decode('utf-8') for v in self.values], dtype=object)
+
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+class NumericColumn:
+    def __init__(self, values, dtype):
+        values = pd.to_numeric(pd.Series(values), errors='coerce')
+        # Integers with gaps fall back to float32 so missing stays missing
+        if np.issubdtype(dtype, np.integer) and values.isna().any():
+            dtype = np.float32
+        self.values = values.to_numpy(dtype=np.float64).astype(dtype)
+
+    def __len__(self):
+        return len(self.values)
+
+    def value(self, i: int):
+        v = self.values[i]
+        if v != v:
+            return None
+        # float32 prints its shortest round-trip form, so 115.77 comes back as 115.77
+        return float(str(v)) if self.values.dtype == np.float32 else v.item()
+
+    def array(self) -> np.ndarray:
+        if self.values.dtype == np.float32:
+            return self.values.astype(str).astype(np.float64)
+        return self.values
+
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+class _Lookup:
+    """A per-category table applied to a coded column (e.g. name -> url)."""
+    def __init__(self, table: np.ndarray, column: CodedColumn):
+        self.table = table
+        self.column = column
+
+    def value(self, i: int):
+        code = self.column.codes[i]
+        return None if code < 0 else self.table[code]
+
+    def array(self) -> np.ndarray:
+        return _take(self.table, self.column.codes)
+
+class _Parent:
+    """An item column read through each variation's parent row."""
+    def __init__(self, column, parent: np.ndarray):
+        self.column = column
+        self.parent = parent
+
+    def value(self, j: int):
+        pos = self.parent[j]
+        return None if pos < 0 else self.column.value(pos)
+
+    def array(self) -> np.ndarray:
+        out = np.full(len(self.parent), None, dtype=object)
+        owned = self.parent >= 0
+        out[owned] = self.column.array()[self.parent[owned]]
+        return out
+
+class _PairLookup:
+    """A table over (colour, size) code pairs; the last slot of each axis is 'missing'."""
+    def __init__(self, table: np.ndarray, first: CodedColumn, second: CodedColumn):
+        self.table = table
+        self.first = first
+        self.second = second
+        self.width = len(second.categories) + 1
+
+    def _index(self, a, b):
+        a = np.where(a < 0, len(self.first.categories), a).astype(np.int64)
+        b = np.where(b < 0, self.width - 1, b).astype(np.int64)
+        return a * self.width + b
+
+    def value(self, i: int):
+        return self.table[self._index(self.first.codes[i], self.second.codes[i])]
+
+    def array(self) -> np.ndarray:
+        return self.table[self._index(self.first.codes, self.second.codes)]
+
+class Template:
+    """Concatenation of literals and per-row fields; None if any field is missing or empty."""
+    def __init__(self, *parts):
+        self.parts = parts
+
+    def value(self, i: int):
+        out = []
+        for part in self.parts:
+            v = part if isinstance(part, str) else part.value(i)
+            if v is None or v == '':
+                return None
+            out.append(v)
+        return ''.join(out) if out else None
+
+    def series(self, n: int) -> pd.Series:
+        """All n rows at once, as a pandas string Series (vectorised concatenation, <NA> = missing)."""
+        if not self.parts:
+            return pd.Series(pd.NA, index=range(n), dtype='string')
+        text = pd.Series('', index=range(n), dtype='string')
+        for part in self.parts:
+            if isinstance(part, str):
+                text = text + part
+            else:
+                values = pd.Series(part.array(), dtype='string')
+                text = text + values.mask(values == '')
+        return text
+
+    def array(self, n: int) -> np.ndarray:
+        text = self.series(n)
+        return text.astype(object).where(text.notna(), None).to_numpy(dtype=object, copy=True)
+
+class DerivedColumn:
+    """Computed from other columns by whichever candidate Template matches most rows;
+    rows it gets wrong are stored as overrides (a sorted row array + interned values)."""
+    def __init__(self, rules: list, actual):
+        actual = pd.Series(actual).reset_index(drop=True)
+        text = actual.astype('string')
+        self.length = len(actual)
+        best = None
+        for rule in rules:
+            derived = rule.series(self.length)
+            same = ((text == derived).fillna(False) | (text.isna() & derived.isna())).to_numpy(dtype=bool)
+            if best is None or same.sum() > best[1].sum():
+                best = (rule, same)
+        self.rule, same = best
+        self.rows = np.flatnonzero(~same).astype(np.int32)
+        self.overrides = CodedColumn(actual.astype(object).to_numpy()[self.rows])
+
+    def __len__(self):
+        return self.length
+
+    def value(self, i: int):
+        k = np.searchsorted(self.rows, i)
+        if k < len(self.rows) and self.rows[k] == i:
+            return self.overrides.value(k)
+        return self.rule.value(i)
+
+    def array(self) -> np.ndarray:
+        out = self.rule.array(self.length)
+        out[self.rows] = self.overrides.array()
+        return out
+
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.overrides.nbytes()
+
+class ItemView:
+    __slots__ = ('_model', '_row')
+
+    def __init__(self, model, row: int):
+        self._model = model
+        self._row = row
+
+    def __getitem__(self, column: str):
+        return self._model.item_columns[column].value(self._row)
+
+    def get(self, column: str, default=None):
+        col = self._model.item_columns.get(column)
+        return default if col is None else col.value(self._row)
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    @property
+    def id(self) -> str:
+        return self[ITEM_ID]
+
+    @property
+    def name(self) -> str:
+        return self['item_name']
+
+    @property
+    def variations(self) -> list:
+        return [VariationView(self._model, int(j)) for j in self._model.variation_rows(self._row)]
+
+    def to_dict(self) -> dict:
+        return {c: col.value(self._row) for c, col in self._model.item_columns.items()}
+
+    def __repr__(self):
+        return f'ItemView({self.id!r}, {self.name!r})'
+
+class VariationView:
+    __slots__ = ('_model', '_row')
+
+    def __init__(self, model, row: int):
+        self._model = model
+        self._row = row
+
+    def __getitem__(self, column: str):
+        return self._model.variation_columns[column].value(self._row)
+
+    def get(self, column: str, default=None):
+        col = self._model.variation_columns.get(column)
+        return default if col is None else col.value(self._row)
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    @property
+    def id(self) -> str:
+        return self[VARIATION_ID]
+
+    @property
+    def parent(self):
+        pos = self._model.parent[self._row]
+        return None if pos < 0 else ItemView(self._model, int(pos))
+
+    def to_dict(self) -> dict:
+        return {c: col.value(self._row) for c, col in self._model.variation_columns.items()}
+
+    def __repr__(self):
+        return f'VariationView({self.id!r})'
+
+class CatalogModel:
+    def __init__(self, items: pd.DataFrame, variations: pd.DataFrame):
+        items = items.reset_index(drop=True)
+        variations = variations.reset_index(drop=True)
+        self.n_items = len(items)
+        self.n_variations = len(variations)
+
+        # Stored item columns first; the derived ones are templates over them
+        cols = {}
+        for col in items.columns:
+            if col == ITEM_ID:
+                cols[col] = BytesColumn(items[col])
+            elif col in FLOAT_COLUMNS:
+                cols[col] = NumericColumn(items[col], np.float32)
+            elif col not in ('url', 'image_url', 'description'):
+                cols[col] = CodedColumn(items[col])
+        for col, rules in self._item_rules(cols).items():
+            if col in items.columns:
+                cols[col] = DerivedColumn(rules, items[col])
+        self.item_columns = {c: cols[c] for c in items.columns}
+
+        # Variations hold their parent's row; orphans keep their item_id as an override
+        if PARENT_ID in variations and ITEM_ID in items:
+            parent = first_positions(items[ITEM_ID].astype(str), variations[PARENT_ID].astype(str))
+        else:
+            parent = np.full(self.n_variations, -1)
+        self.parent = parent.astype(np.int32)
+        cols = {}
+        for col in variations.columns:
+            if col == VARIATION_ID:
+                cols[col] = BytesColumn(variations[col])
+            elif col in INT_COLUMNS:
+                cols[col] = NumericColumn(variations[col], np.int32)
+            elif col not in (PARENT_ID, 'item_name', 'image_url'):
+                cols[col] = CodedColumn(variations[col])
+        for col, rules in self._variation_rules(cols).items():
+            if col in variations.columns:
+                cols[col] = DerivedColumn(rules, variations[col])
+        self.variation_columns = {c: cols[c] for c in variations.columns}
+
+        # Each item's variations as a [start, end) range of a parent-sorted order
+        key = np.where(self.parent >= 0, self.parent, self.n_items)
+        self.order = np.argsort(key, kind='stable').astype(np.int32)
+        counts = np.bincount(key, minlength=self.n_items + 1)[:self.n_items]
+        self.ends = np.cumsum(counts)
+        self.starts = self.ends - counts
+        ids = self.item_columns[ITEM_ID].values if ITEM_ID in self.item_columns else np.empty(0, dtype=bytes)
+        self._id_order = np.argsort(ids, kind='stable').astype(np.int32)
+        self._sorted_ids = ids[self._id_order]
+
+    @classmethod
+    def load(cls):
+        return cls(load_items(), load_variations())
+
+    @staticmethod
+    def _item_rules(cols: dict) -> dict:
+        item_id, name = cols.get(ITEM_ID), cols.get('item_name')
+        brand, gender = cols.get('metadata:brand'), cols.get('metadata:gender')
+        rules = {'url': [], 'image_url': [], 'description': []}
+        if item_id is not None:
+            # generate_catalog.py: everything keyed by id
+            rules['url'].append(Template(PRODUCT_URL_PREFIX, item_id))
+            rules['image_url'].append(Template(IMAGE_HOST, item_id, '.jpg'))
+        if name is not None:
+            # refresh_catalog.py: slugs of the name, one table entry per distinct name
+            slugs = slugify_column(pd.Series(name.categories, dtype=object))
+            rules['url'].append(Template(_Lookup(product_urls(slugs).to_numpy(dtype=object), name)))
+            rules['image_url'].append(Template(_Lookup(image_paths(slugs).to_numpy(dtype=object), name)))
+            if brand is not None:
+                rules['description'].append(Template('The ', name, ' from ', brand,
+                                                     ' — premium apparel built for everyday adventure.'))
+        if brand is not None and gender is not None:
+            rules['description'].append(Template('A high-quality ', brand, ' product designed for ', gender, '.'))
+        return {col: r or [Template()] for col, r in rules.items()}
+
+    def _variation_rules(self, cols: dict) -> dict:
+        items = self.item_columns
+        rules = {'item_id': [], 'item_name': [], 'image_url': []}
+        if ITEM_ID in items:
+            rules['item_id'].append(Template(_Parent(items[ITEM_ID], self.parent)))
+        if 'image_url' in items:
+            rules['image_url'].append(Template(_Parent(items['image_url'], self.parent)))
+        color, size = cols.get('metadata:color'), cols.get('metadata:size')
+        if color is not None and ITEM_ID in items:
+            # generate_catalog.py: <host><item id>-<first three letters of the colour>.jpg
+            tags = np.array([str(c)[:3].lower() for c in color.categories], dtype=object)
+            rules['image_url'].append(Template(IMAGE_HOST, _Parent(items[ITEM_ID], self.parent),
+                                               '-', _Lookup(tags, color), '.jpg'))
+        if color is not None and size is not None and 'item_name' in items:
+            # The name suffix depends only on (colour, size): one entry per pair, missing last
+            pairs = pd.DataFrame({'metadata:color': np.append(color.categories, None).repeat(len(size.categories) + 1),
+                                  'metadata:size': np.tile(np.append(size.categories, None), len(color.categories) + 1),
+                                  'item_name': None})
+            # A one-character stand-in base name, stripped again, leaves just the suffix
+            suffix = variation_names(pairs, pd.Series('x', index=pairs.index)).str[1:].to_numpy(dtype=object)
+            rules['item_name'].append(Template(_Parent(items['item_name'], self.parent),
+                                               _PairLookup(suffix, color, size)))
+        return {col: r or [Template()] for col, r in rules.items()}
+
+    def item(self, row: int) -> ItemView:
+        return ItemView(self, row)
+
+    def variation(self, row: int) -> VariationView:
+        return VariationView(self, row)
+
+    def variation_rows(self, item_row: int) -> np.ndarray:
+        return self.order[self.starts[item_row]:self.ends[item_row]]
+
+    def item_row(self, item_id: str) -> int:
+        """Row of the first item with this id, or -1."""
+        key = str(item_id).encode('utf-8')
+        k = np.searchsorted(self._sorted_ids, key)
+        if k < len(self._sorted_ids) and self._sorted_ids[k] == key:
+            return int(self._id_order[k])
+        return -1
+
+    def to_frames(self) -> tuple:
+        """The items and variations DataFrames, as they were loaded."""
+        items = pd.DataFrame({c: col.array() for c, col in self.item_columns.items()})
+        variations = pd.DataFrame({c: col.array() for c, col in self.variation_columns.items()})
+        return items, variations
+
+    def nbytes(self) -> int:
+        total = sum(a.nbytes for a in (self.parent, self.order, self.starts, self.ends, self._id_order, self._sorted_ids))
+        return total + sum(col.nbytes() for col in [*self.item_columns.values(), *self.variation_columns.values()])
+
+def main():
+    items, variations = load_items(), load_variations()
+    frame_bytes = int(items.memory_usage(deep=True).sum() + variations.memory_usage(deep=True).sum())
+    model = CatalogModel(items, variations)
+    print(f'{model.n_items} items, {model.n_variations} variations')
+    print(f'DataFrames: {frame_bytes / 2**20:8.1f} MB')
+    print(f'Model:      {model.nbytes() / 2**20:8.1f} MB ({frame_bytes / max(model.nbytes(), 1):.1f}x smaller)')
+    for table, columns in (('items', model.item_columns), ('variations', model.variation_columns)):
+        for name, col in columns.items():
+            extra = f', {len(col.rows)} override(s)' if isinstance(col, DerivedColumn) else ''
+            print(f'  {f"{table}.{name}":<30} {type(col).__name__:<13} {col.nbytes() / 2**10:9.1f} KB{extra}')
+
+if __name__ == '__main__':
+    main()
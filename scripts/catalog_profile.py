@@ -0,0 +1,123 @@
+"""
+Per-stage profiling shared by the catalog scripts (`--profile`).
+
+A script wraps each phase in `with profiler.stage('name', items=n):` (or
+calls `.set_items(n)` on the yielded stage once the count is known). When
+profiling is on, every stage records wall time, CPU time (this process plus
+worker processes reaped during the stage: a pool's CPU only counts once it is
+shut down, so a stage should shut down the pool it uses), peak RSS so far and
+its growth during the stage, and items/s. At exit the stages are written as one JSON trace to
+data/profiles/<script>-<timestamp>.json, so runs can be charted over time.
+
+With `--cprofile` each stage also runs under cProfile and the stats of the
+slowest stage are dumped next to the trace (inspect with `python -m pstats`
+or snakeviz). cProfile slows pure-Python stages down, so compare its timings
+only with other --cprofile runs. When profiling is off `stage` does nothing.
+"""
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+PROFILE_DIR = os.path.join(BASE, 'data', 'profiles')
+
+def _rusage() -> tuple:
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = me.ru_utime + me.ru_stime + kids.ru_utime + kids.ru_stime
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return cpu, me.ru_maxrss * scale / 2**20
+
+class _Stage:
+    __slots__ = ('items',)
+
+    def __init__(self, items: int = None):
+        self.items = items
+
+    def set_items(self, items: int):
+        """For stages that only learn their item count while running."""
+        self.items = items
+
+class Profiler:
+    def __init__(self, script: str, enabled: bool = False, use_cprofile: bool = False, out_dir: str = PROFILE_DIR):
+        self.script = script
+        self.enabled = enabled
+        self.use_cprofile = use_cprofile
+        self.out_dir = out_dir
+        self.stages = []
+        self._profiles = {}
+        self._started = time.time()
+        self._t0 = time.perf_counter()
+
+    @classmethod
+    def from_args(cls, script: str, args):
+        cprofile = getattr(args, 'cprofile', False)
+        return cls(script, getattr(args, 'profile', False) or cprofile, cprofile)
+
+    @contextmanager
+    def stage(self, name: str, items: int = None):
+        current = _Stage(items)
+        if not self.enabled:
+            yield current
+            return
+        cpu0, rss0 = _rusage()
+        prof = cProfile.Profile() if self.use_cprofile else None
+        t0 = time.perf_counter()
+        if prof:
+            prof.enable()
+        try:
+            yield current
+        finally:
+            if prof:
+                prof.disable()
+            wall = time.perf_counter() - t0
+            cpu1, rss1 = _rusage()
+            record = {
+                'stage': name,
+                'wall_s': round(wall, 6),
+                'cpu_s': round(cpu1 - cpu0, 6),
+                'peak_rss_mb': round(rss1, 1),
+                'rss_growth_mb': round(rss1 - rss0, 1),
+            }
+            if current.items is not None:
+                record['items'] = int(current.items)
+                record['items_per_s'] = round(current.items / wall, 1) if wall else None
+            self.stages.append(record)
+            if prof:
+                self._profiles[len(self.stages) - 1] = prof
+
+    def write(self) -> str:
+        """Write the JSON trace (and the slowest stage's cProfile stats); returns the trace path."""
+        if not self.enabled:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(self._started))
+        path = os.path.join(self.out_dir, f'{self.script}-{stamp}.json')
+        trace = {
+            'script': self.script,
+            'argv': sys.argv[1:],
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self._started)),
+            'wall_s': round(time.perf_counter() - self._t0, 6),
+            'peak_rss_mb': round(_rusage()[1], 1),
+            'stages': self.stages,
+        }
+        if self._profiles:
+            slowest = max(self._profiles, key=lambda i: self.stages[i]['wall_s'])
+            prof_path = os.path.join(self.out_dir, f'{self.script}-{stamp}-{self.stages[slowest]["stage"]}.prof')
+            self._profiles[slowest].dump_stats(prof_path)
+            trace['cprofile'] = {'stage': self.stages[slowest]['stage'], 'path': prof_path}
+        with open(path, 'w') as f:
+            json.dump(trace, f, indent=2)
+        print(f'Profile trace written to {path}', file=sys.stderr)
+        return path
+
+def add_profile_args(parser):
+    parser.add_argument('--profile', action='store_true', help='write a per-stage timing/memory trace to data/profiles/')
+    parser.add_argument('--cprofile', action='store_true', help='profile, and also dump cProfile stats of the slowest stage')
+
+NULL_PROFILER = Profiler('none')
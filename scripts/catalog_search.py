@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Inverted-index search over data/items.csv.
+
+The index is built once from the items DataFrame: `item_name` and
+`description` are lower-cased and split into alphanumeric tokens, and each
+term keeps a postings list of row positions plus term frequencies. Postings
+are stored CSR-style in flat numpy arrays (one offsets array, one int32 doc
+array, one uint16 tf array) so millions of rows stay compact.
+
+Queries are tokenized the same way and answered with AND (every term must
+match) or OR (any term) semantics, ranked with BM25.
+
+Usage: python3 scripts/catalog_search.py "cargo pants" [--mode and|or] [--limit 10] [--in-stock]
+"""
+import argparse
+import bisect
+import os
+import re
+import numpy as np
+import pandas as pd
+
+from catalog_snapshot import load_items, load_variations
+from variation_index import VariationIndex
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+ITEMS_CSV = os.path.join(BASE, 'data', 'items.csv')
+
+TOKEN_RE = r"[a-z0-9]+"
+SEARCH_FIELDS = ('item_name', 'description')
+
+# BM25 parameters (standard defaults)
+K1 = 1.2
+B = 0.75
+
+def tokenize(text: str) -> list:
+    return re.findall(TOKEN_RE, str(text).lower())
+
+class CatalogSearchIndex:
+    def __init__(self, vocab, offsets, docs, tfs, doc_len):
+        self.vocab = vocab                      # term -> term id
+        self.terms = sorted(vocab)              # sorted vocabulary for prefix lookups
+        self.offsets = offsets                  # int64[n_terms + 1]
+        self.docs = docs                        # int32[n_postings], sorted within each term
+        self.tfs = tfs                          # uint16[n_postings]
+        self.doc_len = doc_len.astype(np.float32)
+        self.n_docs = len(doc_len)
+        self.avg_len = float(doc_len.mean()) if self.n_docs else 0.0
+        df = np.diff(offsets).astype(np.float64)
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        text = df[SEARCH_FIELDS[0]].fillna('').astype(str)
+        for col in SEARCH_FIELDS[1:]:
+            text = text + ' ' + df[col].fillna('').astype(str)
+        tokens = text.str.lower().str.findall(TOKEN_RE)
+        doc_len = tokens.str.len().to_numpy(dtype=np.int32)
+
+        # One row per (doc, token) occurrence, then collapse to (term, doc) -> tf
+        flat = tokens.explode().dropna()
+        doc_ids = np.repeat(np.arange(len(df), dtype=np.int64), doc_len)
+        term_ids, uniques = pd.factorize(flat.to_numpy(), sort=True)
+        key = term_ids.astype(np.int64) * max(len(df), 1) + doc_ids
+        pair, tf = np.unique(key, return_counts=True)
+        pair_terms = pair // max(len(df), 1)
+        pair_docs = (pair % max(len(df), 1)).astype(np.int32)
+
+        offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_terms, minlength=len(uniques)), out=offsets[1:])
+        vocab = {term: i for i, term in enumerate(uniques)}
+        tfs = np.minimum(tf, np.iinfo(np.uint16).max).astype(np.uint16)
+        return cls(vocab, offsets, pair_docs, tfs, doc_len)
+
+    @classmethod
+    def from_csv(cls, path: str = ITEMS_CSV):
+        return cls.from_frame(load_items(path))
+
+    def _postings(self, term_id: int):
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    def _expand(self, token: str, prefix: bool) -> list:
+        if not prefix:
+            tid = self.vocab.get(token)
+            return [] if tid is None else [tid]
+        lo = bisect.bisect_left(self.terms, token)
+        hi = bisect.bisect_left(self.terms, token + '\uffff')
+        return [self.vocab[t] for t in self.terms[lo:hi]]
+
+    def _bm25(self, term_id: int, docs, tfs):
+        tf = tfs.astype(np.float32)
+        norm = K1 * (1 - B + B * self.doc_len[docs] / (self.avg_len or 1.0))
+        return self.idf[term_id] * tf * (K1 + 1) / (tf + norm)
+
+    def search(self, query: str, mode: str = 'and', limit: int = None, prefix: bool = False):
+        """Return (row positions, scores) ranked by BM25, best first.
+
+        With prefix=True the last query token also matches any term it is a
+        prefix of, which suits search-as-you-type boxes.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        empty = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+        if not tokens:
+            return empty
+
+        groups = [self._expand(t, prefix and i == len(tokens) - 1) for i, t in enumerate(tokens)]
+        if mode == 'and':
+            if any(not g for g in groups):
+                return empty
+            candidates = None
+            # Intersect the rarest groups first so the candidate set shrinks fastest
+            for g in sorted(groups, key=lambda g: sum(self.offsets[t + 1] - self.offsets[t] for t in g)):
+                g_docs = np.unique(np.concatenate([self._postings(t)[0] for t in g]))
+                candidates = g_docs if candidates is None else np.intersect1d(candidates, g_docs, assume_unique=True)
+                if not len(candidates):
+                    return empty
+            scores = np.zeros(len(candidates), dtype=np.float32)
+            for g in groups:
+                for t in g:
+                    docs, tfs = self._postings(t)
+                    pos = np.searchsorted(docs, candidates)
+                    pos[pos >= len(docs)] = 0
+                    hit = docs[pos] == candidates
+                    scores[hit] += self._bm25(t, docs[pos[hit]], tfs[pos[hit]])
+        elif mode == 'or':
+            parts_docs, parts_scores = [], []
+            for g in groups:
+                for t in g:
+                    docs, tfs = self._postings(t)
+                    parts_docs.append(docs)
+                    parts_scores.append(self._bm25(t, docs, tfs))
+            if not parts_docs:
+                return empty
+            all_docs = np.concatenate(parts_docs)
+            candidates, inverse = np.unique(all_docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(parts_scores)).astype(np.float32)
+        else:
+            raise ValueError(f"Unknown search mode: {mode!r} (expected 'and' or 'or')")
+
+        # Stable sort keeps catalog order among equal scores
+        order = np.argsort(-scores, kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        return candidates[order].astype(np.int32), scores[order]
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('query')
+    p.add_argument('--mode', choices=['and', 'or'], default='and')
+    p.add_argument('--limit', type=int, default=10)
+    p.add_argument('--in-stock', action='store_true', help='leave out sold-out items')
+    args = p.parse_args()
+
+    df = load_items(ITEMS_CSV)
+    index = CatalogSearchIndex.from_frame(df)
+    stock = VariationIndex.build(df, load_variations())
+    rows, scores = index.search(args.query, mode=args.mode)
+    if args.in_stock:
+        keep = stock.in_stock[rows]
+        rows, scores = rows[keep], scores[keep]
+    rows, scores = rows[:args.limit], scores[:args.limit]
+    results = df.iloc[rows][['id', 'item_name', 'metadata:price', 'metadata:brand']]
+    results = results.assign(stock=stock.total_inventory[rows], score=np.round(scores, 3))
+    print(results.to_string(index=False) if len(results) else f"No products found for '{args.query}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Resident catalog query service.
+
+`Catalog` loads the items and variations, builds every index on them
+(search, facets, stock roll-ups, autocomplete), then keeps the rows only as a
+compact CatalogModel (catalog_model.py) and answers the queries
+app.py and search_preview.py need. `serve` keeps one Catalog in memory
+behind a small asyncio HTTP/1.1 server on localhost or a Unix socket, so
+memory and startup cost are paid once per host instead of once per session.
+
+Requests are not answered one by one: the server queues them and a batcher
+drains everything that arrives within --batch-window ms (up to --max-batch),
+computes each distinct request once on a worker thread, and fans the result
+out to every caller that asked for it. A watcher reloads the catalog in the
+background when the CSVs (or the SQLite database) change and swaps it in
+atomically; in-flight batches finish on the catalog they started with.
+search and query results are cached and logged (query_cache.py); each
+catalog replays the --warm most frequent logged requests before it is
+swapped in, so popular searches are answered from cache straight away.
+
+Endpoints (JSON in, JSON out):
+    GET  /health                 GET /info
+    GET  /suggest?q=...&limit=   GET /correct?q=...
+    GET  /item/<id>              GET /similar/<id>?limit=
+    POST /search {query, mode, limit, prefix}
+    POST /query  {query, selections, price, hide_sold_out, offset, limit}
+    POST /warmup {top}
+
+Clients use `CatalogClient("http://127.0.0.1:8765")` or
+`CatalogClient("unix:///tmp/catalog.sock")`, which has the same methods as
+Catalog; app.py and search_preview.py use it when $CATALOG_SERVICE is set.
+
+Usage: python3 scripts/catalog_service.py [--host 127.0.0.1] [--port 8765] [--socket PATH]
+                                          [--batch-window MS] [--reload-interval SECONDS] [--warm N]
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+from urllib.parse import parse_qs, quote, urlencode, urlsplit
+import numpy as np
+import pandas as pd
+
+import catalog_db
+from catalog_autocomplete import Autocomplete
+from catalog_facets import FacetIndex
+from catalog_model import CatalogModel
+from catalog_search import CatalogSearchIndex
+from catalog_snapshot import ITEMS_CSV, VARS_CSV, load_items, load_variations
+from query_cache import WARM_TOP, QueryCache, normalize_query, normalize_selections, popular
+from similar_products import META_PATH as SIMILAR_META, SimilarItems
+from variation_index import VariationIndex
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+BATCH_WINDOW_MS = 2.0
+MAX_BATCH = 256
+RELOAD_INTERVAL = 2.0
+PAGE_SIZE = 24
+
+def source_signature() -> tuple:
+    """Changes whenever the catalog (or the similar-products table) on disk does."""
+    paths = ([catalog_db.DB_PATH, catalog_db.DB_PATH + '-wal'] if catalog_db.enabled()
+             else [ITEMS_CSV, VARS_CSV]) + [SIMILAR_META]
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sig.append((path, st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            sig.append((path, None, None))
+    return tuple(sig)
+
+def _count(value, name: str, default: int = None) -> int:
+    """A non-negative integer request parameter (query strings send it as text)."""
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f'{name} must be an integer')
+    n = int(value)
+    if n < 0:
+        raise ValueError(f'{name} must not be negative')
+    return n
+
+def _text(value, name: str) -> str:
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(f'{name} must be a string')
+    return value
+
+def _selections(value) -> dict:
+    if value is None:
+        return None
+    if not isinstance(value, dict) or not all(isinstance(v, list) and all(isinstance(x, str) for x in v)
+                                              for v in value.values()):
+        raise ValueError('selections must map facet names to lists of values')
+    return value
+
+def _price(value) -> list:
+    if value is None:
+        return None
+    if (not isinstance(value, list) or len(value) != 2
+            or not all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in value)):
+        raise ValueError('price must be [low, high]')
+    return value
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+class Catalog:
+    """Items, variations and their indexes, answering the app's queries in-process."""
+    def __init__(self, items: pd.DataFrame, variations: pd.DataFrame, signature: tuple = None):
+        self.signature = signature
+        self.index = CatalogSearchIndex.from_frame(items)
+        self.facets = FacetIndex.build(items, variations)
+        self.stock = VariationIndex.build(items, variations)
+        self.autocomplete = Autocomplete.from_frame(items)
+        # The DataFrames are dropped once the indexes exist; rows are served from the model
+        self.model = CatalogModel(items, variations)
+        # Neighbour rows re-keyed to this catalog's item order, so similar() is one row lookup
+        similar = SimilarItems.load()
+        self.neighbors, self.neighbor_scores = similar.rows_for(items['id']) if similar else (None, None)
+        self.cache = QueryCache(source_signature)
+
+    @classmethod
+    def load(cls):
+        signature = source_signature()
+        return cls(load_items(), load_variations(), signature)
+
+    def info(self) -> dict:
+        prices = self.facets.sorted_prices
+        return {
+            'items': self.model.n_items,
+            'variations': self.model.n_variations,
+            'facets': {f: self.facets.values(f) for f in self.facets.bitmaps},
+            'price_bounds': [float(prices[0]), float(prices[-1])] if len(prices) else [0.0, 0.0],
+        }
+
+    def _item_records(self, rows: np.ndarray) -> list:
+        out = []
+        for pos in rows:
+            rec = self.model.item(int(pos)).to_dict()
+            rec['_pos'] = int(pos)
+            rec['stock'] = int(self.stock.total_inventory[pos])
+            rec['stock_summary'] = self.stock.summary(pos)
+            out.append(rec)
+        return out
+
+    def search(self, query: str, mode: str = 'and', limit: int = None, prefix: bool = False) -> dict:
+        """Ranked matches; total counts them all, items/scores hold the first `limit`."""
+        params = {'query': normalize_query(query), 'mode': mode,
+                  'limit': None if limit is None else int(limit), 'prefix': bool(prefix)}
+        return self.cache.get('search', params, lambda: self._search(**params))
+
+    def _search(self, query: str, mode: str, limit: int, prefix: bool) -> dict:
+        rows, scores = self.index.search(query, mode=mode, prefix=prefix)
+        return {'total': int(len(rows)), 'items': self._item_records(rows[:limit]), 'scores': scores[:limit].tolist()}
+
+    def query(self, query: str = '', selections: dict = None, price: list = None, hide_sold_out: bool = False,
+              offset: int = 0, limit: int = PAGE_SIZE) -> dict:
+        """One page of search + facet filter results, with the option counts for every facet."""
+        selections = {f: v for f, v in normalize_selections(selections).items() if f in self.facets.bitmaps}
+        params = {'query': normalize_query(query), 'selections': selections,
+                  'price': [float(p) for p in price] if price is not None else None,
+                  'hide_sold_out': bool(hide_sold_out), 'offset': int(offset), 'limit': int(limit)}
+        return self.cache.get('query', params, lambda: self._query(**params))
+
+    def _query(self, query: str, selections: dict, price: list, hide_sold_out: bool, offset: int, limit: int) -> dict:
+        price = tuple(price) if price is not None else None
+        search_rows = self.index.search(query, prefix=True)[0] if query else None
+        search_bitmap = self.facets.from_positions(search_rows) if query else None
+        counts = self.facets.counts(selections, price, search_bitmap)
+
+        match = self.facets.filter(selections, price, search_bitmap)
+        rows = search_rows[self.facets.contains(match, search_rows)] if query else self.facets.positions(match)
+        if hide_sold_out:
+            rows = self.stock.in_stock_rows(rows)
+        return {
+            'total': int(len(rows)),
+            'items': self._item_records(rows[offset:offset + limit]),
+            'counts': counts,
+        }
+
+    def warmup(self, top: int = WARM_TOP) -> dict:
+        """Answer the most frequent logged searches and queries once, filling the cache (not the log)."""
+        start = time.perf_counter()
+        calls = {'search': self._search, 'query': self._query}
+        replayed = 0
+        for endpoint, params, _ in popular(top):
+            try:
+                self.cache.get(endpoint, params, lambda: calls[endpoint](**params), log=False)
+                replayed += 1
+            except (KeyError, TypeError, ValueError):  # logged by an older version
+                continue
+        return {'replayed': replayed, 'seconds': time.perf_counter() - start}
+
+    def suggest(self, query: str, limit: int = 8) -> list:
+        return [[text, n] for text, n in self.autocomplete.suggest(query, limit)]
+
+    def correct(self, query: str) -> str:
+        return self.autocomplete.correct(query)
+
+    def item(self, item_id: str) -> dict:
+        pos = self.model.item_row(item_id)
+        if pos < 0:
+            return None
+        variations = [self.model.variation(int(j)).to_dict() for j in self.stock.variation_rows(pos)]
+        return {'item': self._item_records([pos])[0], 'variations': variations}
+
+    def similar(self, item_id: str, limit: int = 4) -> dict:
+        """The item's precomputed neighbours (similar_products.py), best first; empty until that job has run."""
+        pos = self.model.item_row(item_id)
+        if pos < 0:
+            return None
+        if self.neighbors is None:
+            return {'items': [], 'scores': []}
+        rows, scores = self.neighbors[pos], self.neighbor_scores[pos]
+        found = rows >= 0
+        rows, scores = rows[found][:limit], scores[found][:limit]
+        return {'items': self._item_records(rows), 'scores': scores.tolist()}
+
+class CatalogServer:
+    def __init__(self, batch_window_ms: float = BATCH_WINDOW_MS, max_batch: int = MAX_BATCH,
+                 reload_interval: float = RELOAD_INTERVAL, warm: int = WARM_TOP):
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.reload_interval = reload_interval
+        self.warm = warm
+        self.catalog = None
+        self.queue = None
+        self.stats = {'requests': 0, 'batches': 0, 'computed': 0, 'reloads': 0}
+
+    def _call(self, catalog: Catalog, endpoint: str, params: dict):
+        if endpoint == 'health':
+            return {'ok': True, **self.stats, 'cache': catalog.cache.stats()}
+        if endpoint == 'info':
+            return catalog.info()
+        if endpoint == 'suggest':
+            return catalog.suggest(_text(params.get('q'), 'q'), _count(params.get('limit'), 'limit', 8))
+        if endpoint == 'correct':
+            return {'query': catalog.correct(_text(params.get('q'), 'q'))}
+        if endpoint == 'item':
+            return catalog.item(params['id'])
+        if endpoint == 'similar':
+            return catalog.similar(params['id'], _count(params.get('limit'), 'limit', 4))
+        if endpoint == 'search':
+            return catalog.search(_text(params.get('query'), 'query'), params.get('mode', 'and'),
+                                  _count(params.get('limit'), 'limit'), bool(params.get('prefix', False)))
+        if endpoint == 'query':
+            return catalog.query(_text(params.get('query'), 'query'), _selections(params.get('selections')),
+                                 _price(params.get('price')), bool(params.get('hide_sold_out', False)),
+                                 _count(params.get('offset'), 'offset', 0), _count(params.get('limit'), 'limit', PAGE_SIZE))
+        if endpoint == 'warmup':
+            return catalog.warmup(_count(params.get('top'), 'top', WARM_TOP))
+        raise KeyError(endpoint)
+
+    def _run_batch(self, catalog: Catalog, batch: list) -> dict:
+        """Compute each distinct request in the batch once."""
+        results = {}
+        for key, endpoint, params, _ in batch:
+            # Repeats of a search/query still go to the catalog: they are cache hits
+            # there, and each one is logged, so the query log counts every caller
+            if key in results and endpoint not in ('search', 'query'):
+                continue
+            try:
+                body = self._call(catalog, endpoint, params)
+                results[key] = (404, {'error': 'not found'}) if body is None else (200, body)
+            except KeyError as e:
+                results[key] = (404, {'error': f'unknown endpoint or missing parameter {e}'})
+            except (ValueError, TypeError) as e:
+                results[key] = (400, {'error': str(e)})
+            except Exception as e:  # a bug in one request must not fail the rest of the batch
+                print(f'Error answering {endpoint} {params}: {e!r}', flush=True)
+                results[key] = (500, {'error': f'{type(e).__name__}: {e}'})
+        self.stats['computed'] += len(results)
+        return results
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.stats['batches'] += 1
+            try:
+                results = await loop.run_in_executor(None, self._run_batch, self.catalog, batch)
+            except Exception as e:  # keep serving: only this batch fails
+                print(f'Batch failed: {e!r}', flush=True)
+                results = {}
+            for key, _, _, fut in batch:
+                if not fut.done():
+                    fut.set_result(results.get(key, (500, {'error': 'internal error'})))
+
+    def _load(self) -> Catalog:
+        catalog = Catalog.load()
+        if self.warm:
+            catalog.warmup(self.warm)
+        return catalog
+
+    async def _watcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            if source_signature() == self.catalog.signature:
+                continue
+            try:
+                catalog = await loop.run_in_executor(None, self._load)
+            except Exception as e:  # a half-written CSV; try again next tick
+                print(f'Reload failed, keeping the current catalog: {e}', flush=True)
+                continue
+            self.catalog = catalog
+            self.stats['reloads'] += 1
+            print(f'Reloaded catalog: {catalog.model.n_items} items, {catalog.model.n_variations} variations', flush=True)
+
+    async def _request(self, endpoint: str, params: dict) -> tuple:
+        self.stats['requests'] += 1
+        key = (endpoint, json.dumps(params, sort_keys=True, default=str))
+        fut = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((key, endpoint, params, fut))
+        return await fut
+
+    @staticmethod
+    def _route(method: str, target: str, body: bytes) -> tuple:
+        url = urlsplit(target)
+        parts = [p for p in url.path.split('/') if p]
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if method == 'POST' and body:
+            payload = json.loads(body)
+            if not isinstance(payload, dict):
+                raise ValueError('request body must be a JSON object')
+            params.update(payload)
+        if len(parts) == 2 and parts[0] in ('item', 'similar'):
+            return parts[0], {**params, 'id': parts[1]}
+        return (parts[0] if parts else 'health'), params
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload):
+        data = json.dumps(payload, default=_json_default).encode()
+        writer.write(f'HTTP/1.1 {status} {http.client.responses.get(status, "")}\r\n'
+                     f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n'.encode() + data)
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                request = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    if len(request) != 3:
+                        raise ValueError('malformed request line')
+                    length = headers.get('content-length', '0') or '0'
+                    if not length.isdigit():
+                        raise ValueError(f'invalid Content-Length: {length!r}')
+                    length = int(length)
+                except ValueError as e:
+                    # Without a request line or body length the rest of the stream cannot be framed
+                    await self._respond(writer, 400, {'error': str(e)})
+                    break
+                body = await reader.readexactly(length)
+                try:
+                    endpoint, params = self._route(request[0], request[1], body)
+                    status, payload = await self._request(endpoint, params)
+                except ValueError as e:
+                    status, payload = 400, {'error': str(e)}
+                await self._respond(writer, status, payload)
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_socket: str = None):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        self.catalog = await loop.run_in_executor(None, self._load)
+        self.queue = asyncio.Queue()
+        print(f'Loaded {self.catalog.model.n_items} items in {time.perf_counter() - start:.2f}s', flush=True)
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            server = await asyncio.start_unix_server(self.handle, path=unix_socket)
+            print(f'Serving on unix://{unix_socket}', flush=True)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            print(f'Serving on http://{host}:{port}', flush=True)
+        tasks = [asyncio.create_task(self._batcher()), asyncio.create_task(self._watcher())]
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for t in tasks:
+                t.cancel()
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = None):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+class CatalogClient:
+    """Same query methods as Catalog, answered by a running catalog service."""
+    def __init__(self, url: str, timeout: float = 30):
+        parsed = urlsplit(url)
+        if parsed.scheme not in ('http', 'unix'):
+            raise ValueError(f'Unsupported catalog service URL: {url}')
+        self.scheme = parsed.scheme
+        self.address = parsed.path if parsed.scheme == 'unix' else parsed.netloc
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, fresh: bool = False):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or fresh:
+            if conn is not None:
+                conn.close()
+            if self.scheme == 'unix':
+                conn = _UnixHTTPConnection(self.address, timeout=self.timeout)
+            else:
+                conn = http.client.HTTPConnection(self.address, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method: str, path: str, payload: dict = None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body else {}
+        # One retry on a fresh connection covers keep-alive connections the server dropped
+        for attempt in range(2):
+            try:
+                conn = self._connection(fresh=attempt > 0)
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = json.loads(resp.read())
+                break
+            except (OSError, http.client.HTTPException):
+                if attempt:
+                    raise
+        if resp.status == 404:
+            return None
+        if resp.status >= 400:
+            raise RuntimeError(f'{method} {path} failed with HTTP {resp.status}: {data.get("error")}')
+        return data
+
+    def info(self) -> dict:
+        return self._request('GET', '/info')
+
+    def search(self, query: str, mode: str = 'and', limit: int = None, prefix: bool = False) -> dict:
+        return self._request('POST', '/search', {'query': query, 'mode': mode, 'limit': limit, 'prefix': prefix})
+
+    def query(self, query: str = '', selections: dict = None, price: list = None, hide_sold_out: bool = False,
+              offset: int = 0, limit: int = PAGE_SIZE) -> dict:
+        return self._request('POST', '/query', {
+            'query': query, 'selections': selections, 'price': list(price) if price is not None else None,
+            'hide_sold_out': hide_sold_out, 'offset': offset, 'limit': limit,
+        })
+
+    def suggest(self, query: str, limit: int = 8) -> list:
+        return self._request('GET', '/suggest?' + urlencode({'q': query, 'limit': limit}))
+
+    def correct(self, query: str) -> str:
+        return self._request('GET', '/correct?' + urlencode({'q': query}))['query']
+
+    def item(self, item_id: str) -> dict:
+        return self._request('GET', '/item/' + quote(str(item_id), safe=''))
+
+    def warmup(self, top: int = WARM_TOP) -> dict:
+        return self._request('POST', '/warmup', {'top': top})
+
+    def similar(self, item_id: str, limit: int = 4) -> dict:
+        return self._request('GET', '/similar/' + quote(str(item_id), safe='') + '?' + urlencode({'limit': limit}))
+
+def connect(url: str = None):
+    """A CatalogClient for $CATALOG_SERVICE (or url), else an in-process Catalog."""
+    url = url or os.environ.get('CATALOG_SERVICE')
+    return CatalogClient(url) if url else Catalog.load()
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--host', default=DEFAULT_HOST)
+    p.add_argument('--port', type=int, default=DEFAULT_PORT)
+    p.add_argument('--socket', default=None, help='listen on this Unix socket instead of TCP')
+    p.add_argument('--batch-window', type=float, default=BATCH_WINDOW_MS, help='ms to collect a batch')
+    p.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    p.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL, help='seconds between change checks')
+    p.add_argument('--warm', type=int, default=WARM_TOP, help='logged requests to replay after each load (0: none)')
+    args = p.parse_args()
+    server = CatalogServer(args.batch_window, args.max_batch, args.reload_interval, args.warm)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Typed columnar snapshots of the catalog CSVs.
+
+`compile_snapshot` writes one file per column under data/snapshot/<table>/:
+numeric columns (price, inventory) as .npy arrays, low-cardinality columns
+(brand, gender, colour, size) as integer category codes plus the category
+list, and remaining text columns as a NUL-separated UTF-8 blob. A meta.json
+records the size and mtime of the CSV the snapshot was built from.
+
+`load_items` / `load_variations` memory-map the snapshot when it matches the
+CSV on disk and fall back to `pd.read_csv` when it is missing or stale, so
+callers always see the current data. With CATALOG_BACKEND=sqlite they read
+the catalog database instead (see catalog_db.py).
+
+Usage: python3 scripts/catalog_snapshot.py   (compiles both CSVs)
+"""
+import json
+import mmap
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+import catalog_db
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+ITEMS_CSV = os.path.join(BASE, 'data', 'items.csv')
+VARS_CSV = os.path.join(BASE, 'data', 'variations.csv')
+SNAPSHOT_DIR = os.path.join(BASE, 'data', 'snapshot')
+
+CATEGORICAL_COLUMNS = {'metadata:brand', 'metadata:gender', 'metadata:color', 'metadata:size'}
+SNAPSHOT_VERSION = 1
+
+def snapshot_path(csv_path: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, os.path.splitext(os.path.basename(csv_path))[0])
+
+def _source_stat(csv_path: str) -> dict:
+    st = os.stat(csv_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def _read_meta(csv_path: str):
+    meta_path = os.path.join(snapshot_path(csv_path), 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+def is_fresh(csv_path: str) -> bool:
+    meta = _read_meta(csv_path)
+    return (meta is not None and meta.get('version') == SNAPSHOT_VERSION
+            and os.path.exists(csv_path) and meta['source'] == _source_stat(csv_path))
+
+def compile_snapshot(csv_path: str, df: pd.DataFrame = None) -> str:
+    """Write the snapshot for csv_path (re-reading the CSV unless df is given)."""
+    source = _source_stat(csv_path)
+    if df is None:
+        df = pd.read_csv(csv_path)
+    out = snapshot_path(csv_path)
+    tmp = out + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        entry = {'name': col}
+        if col in CATEGORICAL_COLUMNS:
+            codes, uniques = pd.factorize(s, sort=True)
+            dtype = np.int8 if len(uniques) < 127 else np.int16 if len(uniques) < 32767 else np.int32
+            np.save(os.path.join(tmp, f'{i}.npy'), codes.astype(dtype))
+            entry.update(kind='category', categories=[str(u) for u in uniques])
+        elif pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            np.save(os.path.join(tmp, f'{i}.npy'), s.to_numpy())
+            entry.update(kind='numeric')
+        else:
+            isnull = s.isna().to_numpy()
+            text = s.astype(object).where(~isnull, '').astype(str)
+            with open(os.path.join(tmp, f'{i}.bin'), 'wb') as f:
+                f.write('\0'.join(text.tolist()).encode('utf-8'))
+            if isnull.any():
+                np.save(os.path.join(tmp, f'{i}.null.npy'), isnull)
+            entry.update(kind='text', nulls=bool(isnull.any()))
+        columns.append(entry)
+
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'version': SNAPSHOT_VERSION, 'source': source, 'rows': len(df), 'columns': columns}, f)
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    return out
+
+def _load_text(path: str, rows: int) -> list:
+    if rows == 0:
+        return []
+    if os.path.getsize(path) == 0:
+        return [''] * rows
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        return m[:].decode('utf-8').split('\0')
+
+def load_snapshot(csv_path: str) -> pd.DataFrame:
+    meta = _read_meta(csv_path)
+    root = snapshot_path(csv_path)
+    rows = meta['rows']
+    data = {}
+    for i, entry in enumerate(meta['columns']):
+        if entry['kind'] == 'category':
+            codes = np.load(os.path.join(root, f'{i}.npy'), mmap_mode='c')
+            data[entry['name']] = pd.Categorical.from_codes(codes, categories=entry['categories'], validate=False)
+        elif entry['kind'] == 'numeric':
+            data[entry['name']] = np.load(os.path.join(root, f'{i}.npy'), mmap_mode='c')
+        else:
+            # Let pandas pick its default string dtype, as read_csv would
+            text = pd.Series(_load_text(os.path.join(root, f'{i}.bin'), rows))
+            if entry['nulls']:
+                text = text.where(~np.load(os.path.join(root, f'{i}.null.npy')))
+            data[entry['name']] = text
+    # copy=False keeps numeric columns and category codes as views of the copy-on-write maps:
+    # pages are read on first touch and only those a caller writes to are copied
+    return pd.DataFrame(data, copy=False)
+
+def load_table(csv_path: str) -> pd.DataFrame:
+    """Memory-mapped snapshot when fresh, otherwise the CSV itself."""
+    table = os.path.splitext(os.path.basename(csv_path))[0]
+    if catalog_db.enabled() and table in catalog_db.TABLES:
+        return catalog_db.read_table(table)
+    if is_fresh(csv_path):
+        return load_snapshot(csv_path)
+    return pd.read_csv(csv_path)
+
+def load_items(path: str = ITEMS_CSV) -> pd.DataFrame:
+    return load_table(path)
+
+def load_variations(path: str = VARS_CSV) -> pd.DataFrame:
+    return load_table(path)
+
+def main():
+    for csv_path in (ITEMS_CSV, VARS_CSV):
+        out = compile_snapshot(csv_path)
+        print(f'Compiled {csv_path} -> {out}')
+
+if __name__ == '__main__':
+    main()
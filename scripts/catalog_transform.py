@@ -0,0 +1,81 @@
+"""
+Columnar transforms shared by the catalog rewrite scripts.
+
+Everything here works on whole pandas columns instead of `iterrows`/`.at`
+loops: ids become integer seeds with one regex pass, per-seed random choices
+are evaluated once per unique seed and broadcast back, slugs are built with
+vectorized string ops, and variations pick up their parent's values through
+a hash join on `item_id` rather than a boolean-mask lookup per row.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+IMAGE_DIR_REL = os.path.join('data', 'generated_images')
+PRODUCT_URL_PREFIX = 'https://aura-alpine.com/products/'
+
+def seed_column(ids: pd.Series) -> pd.Series:
+    """Name seed per id: its first run of digits, or a hash when it has none."""
+    ids = ids.astype(str)
+    digits = ids.str.extract(r"(\d+)", expand=False)
+    missing = digits.isna()
+    seeds = pd.Series(0, index=ids.index, dtype='int64')
+    seeds[~missing] = digits[~missing].astype('int64')
+    if missing.any():
+        seeds[missing] = ids[missing].map(lambda s: abs(hash(s)) % 100000)
+    return seeds
+
+def by_seed(seeds: pd.Series, fn, columns: list) -> pd.DataFrame:
+    """Evaluate fn(seed) -> tuple once per unique seed and broadcast to every row."""
+    uniq, inverse = np.unique(seeds.to_numpy(), return_inverse=True)
+    table = pd.DataFrame([fn(int(s)) for s in uniq], columns=columns)
+    out = table.iloc[inverse.ravel()]
+    out.index = seeds.index
+    return out
+
+def text_column(df: pd.DataFrame, col: str) -> pd.Series:
+    """Column as plain strings with missing values as ''."""
+    if col not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[col].astype(object).where(df[col].notna(), '').astype(str)
+
+def slugify_column(names: pd.Series, default: str = 'item') -> pd.Series:
+    slugs = (names.astype(str).str.lower()
+             .str.replace(r"[^a-z0-9]+", '-', regex=True)
+             .str.strip('-'))
+    return slugs.where(slugs != '', default)
+
+def product_urls(slugs: pd.Series) -> pd.Series:
+    return PRODUCT_URL_PREFIX + slugs
+
+def image_paths(slugs: pd.Series) -> pd.Series:
+    return IMAGE_DIR_REL + os.sep + slugs + '.jpg'
+
+def parent_lookup(vars_df: pd.DataFrame, items: pd.DataFrame, value: pd.Series) -> pd.Series:
+    """Join a per-item column onto variations by item_id (NaN where no parent; a duplicated id's first row)."""
+    table = pd.Series(value.to_numpy(), index=items['id'].to_numpy())
+    table = table[~table.index.duplicated()]
+    return vars_df['item_id'].map(table)
+
+def first_positions(keys: pd.Series, values) -> np.ndarray:
+    """Position of each value in keys, the first row for a duplicated key; -1 where absent."""
+    first = np.flatnonzero(~keys.duplicated().to_numpy())
+    return np.append(first, -1)[pd.Index(keys.iloc[first]).get_indexer(values)]
+
+def variation_names(vars_df: pd.DataFrame, base_names: pd.Series) -> pd.Series:
+    """`<base> (<color> / <size>)`, dropping whichever parts are empty.
+
+    Rows whose base name is missing keep their current item_name.
+    """
+    color = text_column(vars_df, 'metadata:color')
+    size = text_column(vars_df, 'metadata:size')
+    has_color = color != ''
+    has_size = size != ''
+    suffix = np.select(
+        [has_color & has_size, has_color, has_size],
+        [' (' + color + ' / ' + size + ')', ' (' + color + ')', ' (' + size + ')'],
+        default='',
+    )
+    names = base_names.astype(object) + pd.Series(suffix, index=vars_df.index, dtype=object)
+    has_base = base_names.notna() & (base_names.astype(object) != '')
+    return names.where(has_base, vars_df['item_name'])
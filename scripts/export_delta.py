@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Export catalog changes as delta feeds for Constructor.com-style ingestion.
+
+Each table is read through the same backend switch as the app (snapshot or
+CSV, or the catalog database with CATALOG_BACKEND=sqlite) and diffed in
+chunks against a baseline of sorted (key hash, row hash) arrays: every
+current row is classified as added, changed or unchanged, and baseline keys
+never seen are removed. Added/changed rows are written in full and removed
+rows as their key only, to gzip-compressed feed files of at most
+--chunk-rows rows under data/exports/<timestamp>/, with a manifest.json
+listing files and counts.
+
+The baseline is the hashes and keys of exactly the rows the last successful
+export diffed (data/exports/baseline/<table>.npz), so edits made while an
+export runs are picked up by the next one; before the first export the .bak
+files are hashed instead.
+
+With --endpoint every feed file (then the manifest) is PUT to
+<endpoint>/<export id>/<file name> by a pool of persistent HTTP connections,
+retrying connection errors, 429 and 5xx responses with exponential backoff.
+The endpoint can be any HTTP server that accepts PUT, so a small local
+stand-in server is enough for testing.
+
+Usage: python3 scripts/export_delta.py [--endpoint URL] [--token TOKEN]
+                                       [--concurrency N] [--chunk-rows N] [--profile]
+"""
+import argparse
+import csv
+import gzip
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+import numpy as np
+import pandas as pd
+
+import catalog_db
+from catalog_profile import NULL_PROFILER, Profiler, add_profile_args
+from catalog_snapshot import load_table
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+DATA_DIR = os.path.join(BASE, 'data')
+EXPORT_DIR = os.path.join(DATA_DIR, 'exports')
+BASELINE_DIR = os.path.join(EXPORT_DIR, 'baseline')
+
+TABLES = {'items': 'id', 'variations': 'variation_id'}
+READ_CHUNK_ROWS = 250_000
+FEED_CHUNK_ROWS = 100_000
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def text_chunks(df: pd.DataFrame):
+    """READ_CHUNK_ROWS-row slices of df with every value as its CSV text ('' when missing)."""
+    for start in range(0, len(df), READ_CHUNK_ROWS):
+        chunk = df.iloc[start:start + READ_CHUNK_ROWS].reset_index(drop=True)
+        yield chunk.astype(str).where(chunk.notna(), '')
+
+def hash_keys(values: pd.Series) -> np.ndarray:
+    return pd.util.hash_array(values.to_numpy(dtype=object))
+
+def hash_rows(chunk: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+
+def baseline_path(table: str) -> str:
+    path = os.path.join(BASELINE_DIR, f'{table}.npz')
+    return path if os.path.exists(path) else os.path.join(DATA_DIR, f'{table}.csv.bak')
+
+class Hashes:
+    """Collects (key, key hash, row hash) per chunk; `baseline()` sorts them by key hash."""
+    def __init__(self, key: str):
+        self.key = key
+        self.keys, self.key_hash, self.row_hash = [], [], []
+
+    def add(self, chunk: pd.DataFrame, key_hash: np.ndarray, row_hash: np.ndarray):
+        self.keys.append(chunk[self.key].str.encode('utf-8').to_numpy(dtype=object))
+        self.key_hash.append(key_hash)
+        self.row_hash.append(row_hash)
+
+    def baseline(self) -> dict:
+        """{keys (UTF-8 bytes), key_hash, row_hash}, sorted by key hash."""
+        if not self.keys:
+            return {'keys': np.empty(0, dtype='S1'), 'key_hash': np.empty(0, dtype=np.uint64),
+                    'row_hash': np.empty(0, dtype=np.uint64)}
+        key_hash = np.concatenate(self.key_hash)
+        order = np.argsort(key_hash, kind='stable')
+        return {'keys': np.concatenate(self.keys)[order].astype(bytes), 'key_hash': key_hash[order],
+                'row_hash': np.concatenate(self.row_hash)[order]}
+
+def load_baseline(table: str, path: str) -> dict:
+    if path.endswith('.npz'):
+        with np.load(path) as f:
+            return {name: f[name] for name in f.files}
+    hashes = Hashes(TABLES[table])
+    if os.path.exists(path):
+        for chunk in text_chunks(pd.read_csv(path)):
+            hashes.add(chunk, hash_keys(chunk[hashes.key]), hash_rows(chunk))
+    return hashes.baseline()
+
+def save_baseline(table: str, baseline: dict):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f'{table}.npz')
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, **baseline)
+    os.replace(path + '.tmp', path)
+
+class FeedWriter:
+    """Writes rows to <name>-00000.csv.gz, <name>-00001.csv.gz, ... of at most chunk_rows rows."""
+    def __init__(self, out_dir: str, name: str, header: list, chunk_rows: int):
+        self.out_dir = out_dir
+        self.name = name
+        self.header = header
+        self.chunk_rows = chunk_rows
+        self.files = []
+        self.rows = 0
+        self._f = None
+        self._writer = None
+        self._in_file = 0
+
+    def _roll(self):
+        self.close()
+        path = os.path.join(self.out_dir, f'{self.name}-{len(self.files):05d}.csv.gz')
+        self._f = gzip.open(path, 'wt', newline='', compresslevel=6)
+        self._writer = csv.writer(self._f)
+        self._writer.writerow(self.header)
+        self._in_file = 0
+        self.files.append(path)
+
+    def write(self, df: pd.DataFrame):
+        rows = df.itertuples(index=False, name=None)
+        remaining = len(df)
+        while remaining:
+            if self._f is None or self._in_file >= self.chunk_rows:
+                self._roll()
+            n = min(remaining, self.chunk_rows - self._in_file)
+            self._writer.writerows(next(rows) for _ in range(n))
+            self._in_file += n
+            self.rows += n
+            remaining -= n
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+def diff_table(table: str, current: pd.DataFrame, baseline: dict, out_dir: str, chunk_rows: int) -> tuple:
+    """(feed files and row counts per kind, the hashes of current as the next baseline)."""
+    key = TABLES[table]
+    base_keys, base_rows = baseline['key_hash'], baseline['row_hash']
+    seen = np.zeros(len(base_keys), dtype=bool)
+    hashes = Hashes(key)
+
+    writers = {}
+    for chunk in text_chunks(current):
+        if not writers:
+            header = list(chunk.columns)
+            writers = {kind: FeedWriter(out_dir, f'{table}-{kind}', header, chunk_rows) for kind in ('added', 'changed')}
+            writers['removed'] = FeedWriter(out_dir, f'{table}-removed', [key], chunk_rows)
+        kh = hash_keys(chunk[key])
+        rh = hash_rows(chunk)
+        hashes.add(chunk, kh, rh)
+        if len(base_keys):
+            pos = np.minimum(np.searchsorted(base_keys, kh), len(base_keys) - 1)
+            present = base_keys[pos] == kh
+        else:
+            pos = np.zeros(len(kh), dtype=np.int64)
+            present = np.zeros(len(kh), dtype=bool)
+        seen[pos[present]] = True
+        changed = present.copy()
+        changed[present] = base_rows[pos[present]] != rh[present]
+        writers['added'].write(chunk[~present])
+        writers['changed'].write(chunk[changed])
+
+    if not writers:
+        writers['removed'] = FeedWriter(out_dir, f'{table}-removed', [key], chunk_rows)
+    # Baseline keys the current table no longer has
+    if not seen.all():
+        writers['removed'].write(pd.DataFrame({key: np.char.decode(baseline['keys'][~seen], 'utf-8')}))
+
+    for w in writers.values():
+        w.close()
+    result = {kind: {'rows': w.rows, 'files': [os.path.basename(f) for f in w.files]} for kind, w in writers.items()}
+    return result, hashes.baseline()
+
+class FeedUploader:
+    """PUTs files to an HTTP endpoint over per-thread keep-alive connections, with retries."""
+    def __init__(self, endpoint: str, token: str = None, concurrency: int = 4,
+                 retries: int = 5, backoff: float = 0.5, timeout: float = 60):
+        url = urlsplit(endpoint)
+        if url.scheme not in ('http', 'https'):
+            raise ValueError(f'Unsupported endpoint scheme: {endpoint}')
+        self.scheme = url.scheme
+        self.netloc = url.netloc
+        self.base_path = url.path.rstrip('/')
+        self.token = token
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, fresh: bool = False):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or fresh:
+            if conn is not None:
+                conn.close()
+            cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.netloc, timeout=self.timeout)
+        return conn
+
+    def put(self, remote: str, body: bytes, content_type: str) -> int:
+        headers = {'Content-Type': content_type, 'Content-Length': str(len(body))}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        path = f'{self.base_path}/{quote(remote)}'
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * (2 ** attempt)
+            try:
+                conn = self._connection(fresh=attempt > 0)
+                conn.request('PUT', path, body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status < 300:
+                    return resp.status
+                if resp.status not in RETRY_STATUSES or attempt == self.retries:
+                    raise RuntimeError(f'PUT {path} failed with HTTP {resp.status}')
+                retry_after = resp.getheader('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+            except (OSError, http.client.HTTPException):
+                if attempt == self.retries:
+                    raise
+            time.sleep(delay)
+
+    def upload_file(self, path: str, remote: str) -> int:
+        with open(path, 'rb') as f:
+            body = f.read()
+        content_type = 'application/gzip' if path.endswith('.gz') else 'application/json'
+        return self.put(remote, body, content_type)
+
+    def upload_all(self, files: list) -> int:
+        """files: [(local path, remote name)]; returns the number uploaded."""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return len(list(pool.map(lambda f: self.upload_file(*f), files)))
+
+def export_delta(endpoint: str = None, token: str = None, concurrency: int = 4,
+                 chunk_rows: int = FEED_CHUNK_ROWS, profiler: Profiler = NULL_PROFILER) -> str:
+    export_id = time.strftime('%Y%m%dT%H%M%S')
+    out_dir = os.path.join(EXPORT_DIR, export_id)
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = {'export_id': export_id, 'tables': {}}
+    exported = {}
+    for table in TABLES:
+        current = os.path.join(DATA_DIR, f'{table}.csv')
+        baseline = baseline_path(table)
+        source = f'{catalog_db.DB_PATH}:{table}' if catalog_db.enabled() else current
+        print(f'Diffing {source} against {baseline if os.path.exists(baseline) else "an empty baseline"}...')
+        with profiler.stage(f'diff_{table}') as stage:
+            result, exported[table] = diff_table(table, load_table(current), load_baseline(table, baseline),
+                                                 out_dir, chunk_rows)
+            stage.set_items(sum(r['rows'] for r in result.values()))
+        manifest['tables'][table] = result
+        print('  ' + ', '.join(f'{r["rows"]} {kind}' for kind, r in result.items()))
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f'Wrote delta feeds to {out_dir}')
+
+    if endpoint:
+        uploader = FeedUploader(endpoint, token, concurrency)
+        feeds = [(os.path.join(out_dir, name), f'{export_id}/{name}')
+                 for result in manifest['tables'].values() for r in result.values() for name in r['files']]
+        with profiler.stage('upload', items=len(feeds) + 1):
+            n = uploader.upload_all(feeds)
+            # Manifest last, so the receiver only sees complete exports
+            uploader.upload_file(manifest_path, f'{export_id}/manifest.json')
+        print(f'Uploaded {n} feed file(s) and manifest to {endpoint}')
+
+    # The rows just exported, not whatever is on disk now, become the baseline for the next run
+    for table, baseline in exported.items():
+        save_baseline(table, baseline)
+    return out_dir
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('--endpoint', default=None, help='base URL to upload feeds to (omit to only write files)')
+    p.add_argument('--token', default=os.environ.get('CONSTRUCTOR_API_TOKEN'), help='bearer token (default: $CONSTRUCTOR_API_TOKEN)')
+    p.add_argument('--concurrency', type=int, default=4, help='parallel upload connections')
+    p.add_argument('--chunk-rows', type=int, default=FEED_CHUNK_ROWS, help='max rows per feed file')
+    add_profile_args(p)
+    args = p.parse_args()
+    profiler = Profiler.from_args('export_delta', args)
+    try:
+        export_delta(args.endpoint, args.token, args.concurrency, args.chunk_rows, profiler)
+    finally:
+        profiler.write()
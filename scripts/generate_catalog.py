@@ -1,6 +1,26 @@
+"""
+Generate a synthetic catalog (items.csv + variations.csv).
+
+Each shard covers a contiguous range of item numbers and is written by its own
+worker process, streaming rows straight to disk so memory stays constant no
+matter how large the catalog is. The RNG for every shard is seeded from
+(--seed, shard start), so the same arguments always produce the same files.
+
+Usage: python3 scripts/generate_catalog.py [--items N] [--shards N] [--gzip]
+                                           [--seed N] [--workers N] [--out-dir DIR] [--profile]
+
+With the defaults (5000 items, one uncompressed shard) this writes
+data/items.csv and data/variations.csv as before; otherwise shards are named
+items-00000-of-00008.csv[.gz] and variations-00000-of-00008.csv[.gz].
+"""
+import argparse
 import csv
+import gzip
 import random
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog_profile import NULL_PROFILER, Profiler, add_profile_args
 
 # Configuration
 TOTAL_PRODUCTS = 5000
@@ -9,66 +29,115 @@ GENDERS = ["Men", "Women", "Unisex"]
 COLORS = ["Midnight Black", "Arctic White", "Slate Grey", "Forest Green", "Sandstone", "Ocean Blue"]
 SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
 BRANDS = ["Aura & Alpine", "Alpine Tech", "Urban Peak", "Summit Style"]
+DEFAULT_SEED = 42
+
+ITEM_HEADER = ['id', 'item_name', 'image_url', 'url', 'description', 'group_ids', 'metadata:price', 'metadata:brand', 'metadata:gender']
+VARIATION_HEADER = ['variation_id', 'item_id', 'item_name', 'image_url', 'metadata:color', 'metadata:size', 'metadata:inventory']
 
 # Ensure the data directory exists
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
-def generate_catalog():
-    items_file = os.path.join(DATA_DIR, 'items.csv')
-    vars_file = os.path.join(DATA_DIR, 'variations.csv')
+def shard_paths(out_dir: str, shard: int, shards: int, compress: bool) -> tuple:
+    ext = '.csv.gz' if compress else '.csv'
+    if shards == 1 and not compress:
+        names = ('items', 'variations')
+    else:
+        names = tuple(f'{n}-{shard:05d}-of-{shards:05d}' for n in ('items', 'variations'))
+    return tuple(os.path.join(out_dir, n + ext) for n in names)
+
+def _open(path: str, compress: bool):
+    if compress:
+        return gzip.open(path, 'wt', newline='', compresslevel=1)
+    return open(path, 'w', newline='')
+
+def write_shard(out_dir: str, shard: int, shards: int, start: int, stop: int, seed: int, compress: bool) -> tuple:
+    """Write items numbered [start, stop) and their variations. Returns (items, variations)."""
+    rng = random.Random(f'{seed}:{start}')
+    items_file, vars_file = shard_paths(out_dir, shard, shards, compress)
+    n_vars = 0
 
     # 1. Create Items (Parent Products)
-    with open(items_file, 'w', newline='') as f:
+    with _open(items_file, compress) as f, _open(vars_file, compress) as v_f:
         writer = csv.writer(f)
-        writer.writerow(['id', 'item_name', 'image_url', 'url', 'description', 'group_ids', 'metadata:price', 'metadata:brand', 'metadata:gender'])
-        
+        writer.writerow(ITEM_HEADER)
+
         # 2. Create Variations (Child SKUs)
-        with open(vars_file, 'w', newline='') as v_f:
-            v_writer = csv.writer(v_f)
-            v_writer.writerow(['variation_id', 'item_id', 'item_name', 'image_url', 'metadata:color', 'metadata:size', 'metadata:inventory'])
-            
-            for i in range(1, TOTAL_PRODUCTS + 1):
-                item_id = f"AA-{10000 + i}"
-                brand = random.choice(BRANDS)
-                gender = random.choice(GENDERS)
-                price = round(random.uniform(15.0, 250.0), 2)
-                
-                # Assign groups based on gender logic
-                group = "mens" if gender == "Men" else "womens" if gender == "Women" else "accessories"
-                
-                # Write Parent Row
-                writer.writerow([
-                    item_id, 
-                    f"{brand} Seasonal Product {i}", 
-                    f"https://images.aura-alpine.com/{item_id}.jpg",
-                    f"https://aura-alpine.com/products/{item_id}",
-                    f"A high-quality {brand} product designed for {gender}.",
-                    group,
-                    price,
-                    brand,
-                    gender
-                ])
-                
-                # Generate 3-6 variations (Size/Color combos) per parent
-                num_vars = random.randint(3, 6)
-                selected_colors = random.sample(COLORS, 2) # Pick 2 colors
-                selected_sizes = random.sample(SIZES, 3)  # Pick 3 sizes
-                
-                for color in selected_colors:
-                    for size in selected_sizes:
-                        var_id = f"{item_id}-{color[:3].upper()}-{size}"
-                        v_writer.writerow([
-                            var_id,
-                            item_id,
-                            f"{brand} Product {i} ({color} / {size})",
-                            f"https://images.aura-alpine.com/{item_id}-{color[:3].lower()}.jpg",
-                            color,
-                            size,
-                            random.randint(0, 100) # Random stock level
-                        ])
-
-    print(f"✅ Successfully generated {TOTAL_PRODUCTS} items and their variations in the /data folder.")
+        v_writer = csv.writer(v_f)
+        v_writer.writerow(VARIATION_HEADER)
+
+        for i in range(start, stop):
+            item_id = f"AA-{10000 + i}"
+            brand = rng.choice(BRANDS)
+            gender = rng.choice(GENDERS)
+            price = round(rng.uniform(15.0, 250.0), 2)
+
+            # Assign groups based on gender logic
+            group = "mens" if gender == "Men" else "womens" if gender == "Women" else "accessories"
+
+            # Write Parent Row
+            writer.writerow([
+                item_id,
+                f"{brand} Seasonal Product {i}",
+                f"https://images.aura-alpine.com/{item_id}.jpg",
+                f"https://aura-alpine.com/products/{item_id}",
+                f"A high-quality {brand} product designed for {gender}.",
+                group,
+                price,
+                brand,
+                gender
+            ])
+
+            # 2 colors x 3 sizes = 6 variations per parent
+            selected_colors = rng.sample(COLORS, 2) # Pick 2 colors
+            selected_sizes = rng.sample(SIZES, 3)  # Pick 3 sizes
+
+            v_writer.writerows([
+                f"{item_id}-{color[:3].upper()}-{size}",
+                item_id,
+                f"{brand} Product {i} ({color} / {size})",
+                f"https://images.aura-alpine.com/{item_id}-{color[:3].lower()}.jpg",
+                color,
+                size,
+                rng.randint(0, 100) # Random stock level
+            ] for color in selected_colors for size in selected_sizes)
+            n_vars += len(selected_colors) * len(selected_sizes)
+
+    return stop - start, n_vars
+
+def generate_catalog(total: int = TOTAL_PRODUCTS, shards: int = 1, compress: bool = False,
+                     seed: int = DEFAULT_SEED, workers: int = None, out_dir: str = DATA_DIR,
+                     profiler: Profiler = NULL_PROFILER):
+    os.makedirs(out_dir, exist_ok=True)
+    shards = max(1, min(shards, total))
+    bounds = [1 + total * s // shards for s in range(shards + 1)]
+    args = [(out_dir, s, shards, bounds[s], bounds[s + 1], seed, compress) for s in range(shards)]
+
+    workers = workers or min(shards, os.cpu_count() or 1)
+    with profiler.stage('write_shards', items=total):
+        if workers == 1:
+            counts = [write_shard(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(write_shard, *a) for a in args]
+                counts = [f.result() for f in futures]
+
+    n_items = sum(c[0] for c in counts)
+    n_vars = sum(c[1] for c in counts)
+    print(f"✅ Successfully generated {n_items} items and {n_vars} variations in {shards} shard(s) in the /{out_dir} folder.")
 
 if __name__ == "__main__":
-    generate_catalog()
\ No newline at end of file
+    p = argparse.ArgumentParser()
+    p.add_argument('--items', type=int, default=TOTAL_PRODUCTS, help='number of parent products')
+    p.add_argument('--shards', type=int, default=1, help='number of output file pairs')
+    p.add_argument('--gzip', action='store_true', help='gzip-compress the shards')
+    p.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    p.add_argument('--workers', type=int, default=None, help='writer processes (default: one per shard, up to all cores)')
+    p.add_argument('--out-dir', default=DATA_DIR)
+    add_profile_args(p)
+    args = p.parse_args()
+    profiler = Profiler.from_args('generate_catalog', args)
+    try:
+        generate_catalog(args.items, args.shards, args.gzip, args.seed, args.workers, args.out_dir, profiler)
+    finally:
+        profiler.write()
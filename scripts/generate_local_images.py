@@ -5,12 +5,19 @@ currently point to Unsplash, and rewrite those rows to point to
 data/generated_images/<item>-<color>.jpg.
 
 This uses Pillow to render a solid color background (best-effort from the
-metadata color name) with the product id printed on the image.
+metadata color name) with the product id printed on the image. With
+CATALOG_BACKEND=sqlite the rows are read from and updated in the catalog
+database instead.
 """
+import argparse
 import csv
 import os
 import re
-from PIL import Image, ImageDraw, ImageFont
+import pandas as pd
+
+import catalog_db
+from catalog_profile import NULL_PROFILER, Profiler, add_profile_args
+from image_manifest import render_changed
 
 BASE = os.path.dirname(os.path.dirname(__file__))
 CSV_PATH = os.path.join(BASE, 'data', 'variations.csv')
@@ -58,64 +65,85 @@ def pick_color_hex(color_name: str) -> str:
     key = color_name.strip().lower()
     return COLOR_MAP.get(key, '#888888')
 
-def render_image(path: str, bg_hex: str, text: str):
-    size = (800, 800)
-    img = Image.new('RGB', size, bg_hex)
-    draw = ImageDraw.Draw(img)
-    try:
-        # Try to use a default truetype font for nicer output
-        font = ImageFont.truetype('DejaVuSans-Bold.ttf', 36)
-    except Exception:
-        font = ImageFont.load_default()
+def placeholder_job(r: dict):
+    """(render job, new image_url) for a row still pointing at Unsplash, else None."""
+    url = r.get('image_url', '')
+    if 'images.unsplash.com' not in (url or ''):
+        return None
+    item_id = r.get('item_id') or 'unknown'
+    color = r.get('metadata:color') or r.get('metadata:color', '')
+    # create filename based on item & color to reuse across sizes
+    fname = f"{slugify(item_id)}-{slugify(color)}.jpg"
+    out_path = os.path.join('data', 'generated_images', fname)
+    full_out = os.path.join(BASE, out_path)
+    bg = pick_color_hex(color)
+    label = f"{item_id} {color}" if color else item_id
+    return (full_out, bg, label, 'white' if bg != '#f6f7f8' else 'black'), out_path
 
-    # Draw text in center. textsize() was removed in some Pillow releases; try textbbox then fallback
-    try:
-        bbox = draw.textbbox((0, 0), text, font=font)
-        w = bbox[2] - bbox[0]
-        h = bbox[3] - bbox[1]
-    except Exception:
-        try:
-            w, h = font.getsize(text)
-        except Exception:
-            w, h = (len(text) * 10, 20)
-    draw.text(((size[0]-w)/2, (size[1]-h)/2), text, fill='white' if bg_hex != '#f6f7f8' else 'black', font=font)
-    img.save(path, format='JPEG', quality=85)
+def main_db(workers: int = None, profiler: Profiler = NULL_PROFILER):
+    with profiler.stage('scan') as stage:
+        vars_df = catalog_db.read_table('variations')
+        rows = vars_df.astype(object).where(vars_df.notna(), '')
+        jobs, urls = [], {}
+        for rowid, r in zip(rows.index, rows.to_dict('records')):
+            planned = placeholder_job(r)
+            if planned:
+                jobs.append(planned[0])
+                urls[rowid] = planned[1]
+        stage.set_items(len(rows))
+
+    with profiler.stage('render', items=len(jobs)):
+        render_changed(jobs, workers=workers)
+    if urls:
+        with profiler.stage('write_db', items=len(urls)):
+            catalog_db.update_rows({'variations': pd.DataFrame({'image_url': pd.Series(urls)})})
+        print(f"Updated {len(urls)} rows in {catalog_db.DB_PATH} and generated images in {OUT_DIR}")
+    else:
+        print("No Unsplash image URLs found; nothing to do.")
 
-def main():
+def main(workers: int = None, profiler: Profiler = NULL_PROFILER):
+    if catalog_db.enabled():
+        return main_db(workers, profiler)
     rows = []
     changed = 0
-    with open(CSV_PATH, newline='') as f:
+    jobs = []
+    with profiler.stage('scan') as stage, open(CSV_PATH, newline='') as f:
         reader = csv.DictReader(f)
         fieldnames = reader.fieldnames
         for r in reader:
-            url = r.get('image_url', '')
-            if 'images.unsplash.com' in (url or ''):
-                item_id = r.get('item_id') or 'unknown'
-                color = r.get('metadata:color') or r.get('metadata:color', '')
-                # create filename based on item & color to reuse across sizes
-                fname = f"{slugify(item_id)}-{slugify(color)}.jpg"
-                out_path = os.path.join('data', 'generated_images', fname)
-                full_out = os.path.join(BASE, out_path)
-                if not os.path.exists(full_out):
-                    bg = pick_color_hex(color)
-                    label = f"{item_id} {color}" if color else item_id
-                    render_image(full_out, bg, label)
-                r['image_url'] = out_path
+            planned = placeholder_job(r)
+            if planned:
+                jobs.append(planned[0])
+                r['image_url'] = planned[1]
                 changed += 1
             rows.append(r)
+        stage.set_items(len(rows))
+
+    # Only images whose render inputs changed since the last run are redrawn
+    with profiler.stage('render', items=len(jobs)):
+        render_changed(jobs, workers=workers)
 
     if changed:
         # write back CSV preserving fieldnames and order
-        tmp = CSV_PATH + '.tmp'
-        with open(tmp, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for r in rows:
-                writer.writerow(r)
-        os.replace(tmp, CSV_PATH)
+        with profiler.stage('write_csv', items=len(rows)):
+            tmp = CSV_PATH + '.tmp'
+            with open(tmp, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                for r in rows:
+                    writer.writerow(r)
+            os.replace(tmp, CSV_PATH)
         print(f"Updated {changed} rows and generated images in {OUT_DIR}")
     else:
         print("No Unsplash image URLs found; nothing to do.")
 
 if __name__ == '__main__':
-    main()
+    p = argparse.ArgumentParser()
+    p.add_argument('--workers', type=int, default=None, help='image render processes (default: all cores)')
+    add_profile_args(p)
+    args = p.parse_args()
+    profiler = Profiler.from_args('generate_local_images', args)
+    try:
+        main(args.workers, profiler)
+    finally:
+        profiler.write()
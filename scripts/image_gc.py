@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Integrity scan and garbage collection for data/generated_images/.
+
+The image directory collects files from two writers: generate_local_images.py
+(`<item id>-<colour>.jpg`) and refresh_catalog.py (`<slug>.jpg`), each with a
+WebP thumbnail under thumbs/. This script checks it against the catalog:
+
+1. references: one streaming pass over the image_url column of items.csv and
+   variations.csv (or the SQLite tables) collects every local image path; each
+   referenced image also claims its thumbnail.
+2. walk: the directory tree is listed with os.scandir, one directory per task
+   on a thread pool.
+3. verify: every image's header (and trailer) is checked on the same pool,
+   JPEG SOI/EOI markers and the WebP RIFF header and length. Results are cached
+   by (size, mtime) in data/image_scan.csv, so a repeat scan only re-reads
+   files that changed.
+
+It reports images that are referenced but missing, corrupt files, referenced
+images without a thumbnail and orphans (images nothing references). With
+--delete the orphans and corrupt files are removed and dropped from the render
+manifest, so the next refresh redraws anything still needed. Files that are
+not images are listed but never deleted. --delete is refused when the
+catalog cannot be read or references no local images at all, since every
+image would then look like an orphan. With CATALOG_IMAGES=pack, images in
+the packed store (image_pack.py) count as present; its unreferenced blobs
+are dropped by `image_pack.py compact --prune`. Exits 1 when images are missing or corrupt.
+
+Usage: python3 scripts/image_gc.py [--delete] [--workers N] [--full] [--json] [--profile]
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import pandas as pd
+
+import catalog_db
+import image_pack
+from catalog_profile import NULL_PROFILER, Profiler, add_profile_args
+from catalog_snapshot import ITEMS_CSV, VARS_CSV
+from image_manifest import ImageManifest
+from image_render import thumbnail_path
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+IMAGE_DIR = os.path.join(BASE, 'data', 'generated_images')
+CACHE_PATH = os.path.join(BASE, 'data', 'image_scan.csv')
+IMAGE_EXTS = {'.jpg', '.jpeg', '.webp'}
+CHUNK_ROWS = 200_000
+VERIFY_BATCH = 512
+EXAMPLES = 10
+
+def default_workers() -> int:
+    return min(32, (os.cpu_count() or 1) * 4)
+
+def _image_urls(table: str, csv_path: str):
+    """image_url values in chunks, without loading the rest of the table."""
+    if catalog_db.enabled():
+        if not os.path.exists(catalog_db.DB_PATH):
+            raise FileNotFoundError(f'{catalog_db.DB_PATH} not found; there is no catalog to check images against')
+        conn = catalog_db.connect(readonly=True)
+        try:
+            cursor = conn.execute(f'SELECT image_url FROM {table}')
+            while True:
+                rows = cursor.fetchmany(CHUNK_ROWS)
+                if not rows:
+                    break
+                yield [r[0] for r in rows]
+        finally:
+            conn.close()
+    else:
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(f'{csv_path} not found; there is no catalog to check images against')
+        for chunk in pd.read_csv(csv_path, usecols=['image_url'], dtype=str, chunksize=CHUNK_ROWS):
+            yield chunk['image_url'].dropna().tolist()
+
+def referenced_images() -> set:
+    """Local image paths (relative to the repo root) named by any item or variation."""
+    refs = set()
+    for table, csv_path in (('items', ITEMS_CSV), ('variations', VARS_CSV)):
+        for urls in _image_urls(table, csv_path):
+            refs.update(u for u in urls if u and '://' not in u)
+    return {os.path.normpath(os.path.relpath(u, BASE) if os.path.isabs(u) else u) for u in refs}
+
+def _list_dir(path: str) -> tuple:
+    files, dirs = [], []
+    rel = os.path.relpath(path, BASE)
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                st = entry.stat(follow_symlinks=False)
+                files.append((os.path.join(rel, entry.name), st.st_size, st.st_mtime_ns))
+    return files, dirs
+
+def walk(pool: ThreadPoolExecutor, root: str = IMAGE_DIR) -> list:
+    """(path, size, mtime_ns) for every file under root, one directory per pool task."""
+    if not os.path.isdir(root):
+        return []
+    files = []
+    pending = {pool.submit(_list_dir, root)}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            found, dirs = future.result()
+            files.extend(found)
+            pending.update(pool.submit(_list_dir, d) for d in dirs)
+    return files
+
+def check_image(path: str) -> str:
+    """'ok', or what is wrong with the file's header/trailer."""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        with open(os.path.join(BASE, path), 'rb') as f:
+            head = f.read(12)
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return 'empty'
+            f.seek(max(0, size - 2))
+            tail = f.read(2)
+    except OSError:
+        return 'unreadable'
+    if ext in ('.jpg', '.jpeg'):
+        if not head.startswith(b'\xff\xd8\xff'):
+            return 'bad header'
+        return 'ok' if tail == b'\xff\xd9' else 'truncated'
+    if ext == '.webp':
+        if head[:4] != b'RIFF' or head[8:12] != b'WEBP':
+            return 'bad header'
+        return 'ok' if int.from_bytes(head[4:8], 'little') + 8 == size else 'truncated'
+    return 'ok'
+
+def _check_batch(paths: list) -> list:
+    return [check_image(p) for p in paths]
+
+class ScanCache:
+    """Last verification result per file, valid while its size and mtime are unchanged."""
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            df = pd.read_csv(path, dtype={'path': str, 'status': str}, keep_default_na=False)
+            self.entries = dict(zip(df['path'].tolist(),
+                                    zip(df['size'].tolist(), df['mtime_ns'].tolist(), df['status'].tolist())))
+
+    def get(self, path: str, size: int, mtime_ns: int) -> str:
+        hit = self.entries.get(path)
+        return hit[2] if hit and hit[0] == size and hit[1] == mtime_ns else None
+
+    def save(self, files: list, status: dict):
+        rows = [(p, s, m, status[p]) for p, s, m in files if p in status]
+        df = pd.DataFrame(rows, columns=['path', 'size', 'mtime_ns', 'status'])
+        tmp = self.path + '.tmp'
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, self.path)
+
+def scan(workers: int = None, full: bool = False, profiler: Profiler = NULL_PROFILER) -> dict:
+    with profiler.stage('references') as st:
+        refs = referenced_images()
+        st.set_items(len(refs))
+    with ThreadPoolExecutor(max_workers=workers or default_workers()) as pool:
+        with profiler.stage('walk') as st:
+            files = walk(pool)
+            st.set_items(len(files))
+
+        cache = ScanCache()
+        if full:
+            cache.entries = {}
+        images = [f for f in files if os.path.splitext(f[0])[1].lower() in IMAGE_EXTS]
+        status = {p: cache.get(p, s, m) for p, s, m in images}
+        stale = [p for p, result in status.items() if result is None]
+        with profiler.stage('verify', items=len(stale)):
+            batches = [stale[i:i + VERIFY_BATCH] for i in range(0, len(stale), VERIFY_BATCH)]
+            status.update(zip(stale, (r for batch in pool.map(_check_batch, batches) for r in batch)))
+    if stale or len(images) != len(cache.entries):
+        cache.save(images, status)
+
+    # A referenced image keeps its thumbnail alive too
+    present = {p for p, _, _ in files} | (set(image_pack.ImagePack().entries) if image_pack.enabled() else set())
+    thumbs = {thumbnail_path(r): r for r in refs}
+    return {
+        'files': len(files),
+        'images': len(images),
+        'referenced': len(refs),
+        'reverified': len(stale),
+        'missing': sorted(p for p in refs if p not in present),
+        'missing_thumbnails': sorted(t for t, r in thumbs.items() if t not in present and r in present),
+        'corrupt': {p: s for p, s in sorted(status.items()) if s != 'ok'},
+        'orphans': sorted(p for p in status if p not in refs and p not in thumbs),
+        'other_files': sorted(p for p, _, _ in files if p not in status),
+    }
+
+def delete(paths: list) -> int:
+    """Remove files and forget them in the render manifest; returns how many were removed."""
+    manifest = ImageManifest()
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(os.path.join(BASE, path))
+            removed += 1
+        except FileNotFoundError:
+            pass
+        manifest.entries.pop(path, None)
+    if os.path.exists(manifest.path):
+        manifest.save()
+    return removed
+
+def print_report(report: dict):
+    print(f"{report['files']} files ({report['images']} images, {report['reverified']} re-verified), "
+          f"{report['referenced']} referenced images")
+    sections = [('missing', report['missing']), ('missing thumbnails', report['missing_thumbnails']),
+                ('corrupt', [f'{p} ({s})' for p, s in report['corrupt'].items()]),
+                ('orphans', report['orphans']), ('other files (never deleted)', report['other_files'])]
+    for label, paths in sections:
+        print(f'{label}: {len(paths)}')
+        for p in paths[:EXAMPLES]:
+            print(f'  {p}')
+        if len(paths) > EXAMPLES:
+            print(f'  ... and {len(paths) - EXAMPLES} more')
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--delete', action='store_true', help='remove orphans and corrupt files')
+    p.add_argument('--workers', type=int, default=None, help='scan threads (default: 4 per core, at most 32)')
+    p.add_argument('--full', action='store_true', help='ignore the scan cache and re-verify every file')
+    p.add_argument('--json', action='store_true', help='print the full report as JSON')
+    add_profile_args(p)
+    args = p.parse_args()
+    profiler = Profiler.from_args('image_gc', args)
+    try:
+        try:
+            report = scan(args.workers, args.full, profiler)
+        except FileNotFoundError as e:
+            sys.exit(f'Error: {e}')
+        if args.delete and not report['referenced']:
+            sys.exit('Refusing to delete: the catalog references no local images, so every image would be removed')
+        if args.delete:
+            with profiler.stage('delete', items=len(report['orphans']) + len(report['corrupt'])):
+                report['deleted'] = delete(report['orphans'] + list(report['corrupt']))
+    finally:
+        profiler.write()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+        if args.delete:
+            print(f"Deleted {report['deleted']} files")
+    sys.exit(1 if report['missing'] or report['corrupt'] else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Content-addressed manifest for data/generated_images/.
+
+Maps each image path (relative to the repo root) to a hash of everything
+that determines its pixels: background colour, label, text fill, canvas
+size, font, JPEG quality and thumbnail settings. A render job is skipped
+only when the manifest already holds the same hash for its path and the
+image and its thumbnail are in the active store (the pack index with
+CATALOG_IMAGES=pack, else one directory listing per directory, not a stat
+per image). So anything whose inputs changed is redrawn, and so is anything
+deleted, pruned or left behind in the other store.
+"""
+import hashlib
+import json
+import os
+
+import image_pack
+from image_render import (
+    FONT_NAME, FONT_SIZE, IMAGE_SIZE, JPEG_QUALITY, THUMB_FORMAT, THUMB_QUALITY, THUMB_WIDTH,
+    render_all, text_fill, thumbnail_path,
+)
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+MANIFEST_PATH = os.path.join(BASE, 'data', 'image_manifest.json')
+
+def render_key(color: str, text: str, fill: str = None) -> str:
+    inputs = [color, text, fill or text_fill(color), list(IMAGE_SIZE), FONT_NAME, FONT_SIZE, JPEG_QUALITY,
+              THUMB_WIDTH, THUMB_FORMAT, THUMB_QUALITY]
+    return hashlib.sha1(json.dumps(inputs).encode('utf-8')).hexdigest()
+
+class ImageManifest:
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def rel(path: str) -> str:
+        return os.path.relpath(path, BASE) if os.path.isabs(path) else path
+
+    def is_current(self, path: str, key: str) -> bool:
+        return self.entries.get(self.rel(path)) == key
+
+    def record(self, path: str, key: str):
+        self.entries[self.rel(path)] = key
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f, sort_keys=True, separators=(',', ':'))
+        os.replace(tmp, self.path)
+
+def present(paths: list) -> set:
+    """Those of paths whose image and thumbnail are in the active image store."""
+    if image_pack.enabled():
+        pack = image_pack.ImagePack()
+        return {p for p in paths if p in pack and thumbnail_path(p) in pack}
+    listings = {}
+    def listed(path):
+        d = os.path.dirname(path) or '.'
+        if d not in listings:
+            listings[d] = set(os.listdir(d)) if os.path.isdir(d) else set()
+        return os.path.basename(path) in listings[d]
+    return {p for p in paths if listed(p) and listed(thumbnail_path(p))}
+
+def render_changed(jobs, workers: int = None, manifest: ImageManifest = None) -> int:
+    """Render only jobs whose inputs differ from the manifest or whose image is
+    missing from the store, then record them.
+
+    jobs are render_image argument tuples: (path, color, text[, fill]).
+    Returns the number of images rendered.
+    """
+    manifest = manifest or ImageManifest()
+    pending, seen = {}, set()
+    for job in jobs:
+        if job[0] in seen:
+            continue
+        seen.add(job[0])
+        key = render_key(*job[1:])
+        pending[job[0]] = (job, key)
+    current = [path for path, (_, key) in pending.items() if manifest.is_current(path, key)]
+    for path in present(current):
+        del pending[path]
+    if not pending:
+        return 0
+
+    jobs = [job for job, _ in pending.values()]
+    if image_pack.enabled():
+        # CATALOG_IMAGES=pack: appended to data/image_pack/ instead of one file per image
+        with image_pack.ImagePack().writer() as pack:
+            rendered = render_all(jobs, workers=workers, pack=pack)
+    else:
+        rendered = render_all(jobs, workers=workers)
+    for path, (_, key) in pending.items():
+        manifest.record(path, key)
+    manifest.save()
+    return rendered
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Optional packed image store.
+
+With CATALOG_IMAGES=pack, rendered images and their thumbnails are appended
+to data/image_pack/ instead of being written one file each under
+data/generated_images/:
+
+    pack-00000.bin ...  append-only blob files, a new one every PACK_SIZE bytes
+    index.csv           path, pack, offset, size per stored blob; the last line
+                        for a path wins
+
+Paths are the repo-relative image paths items.csv already refers to, so the
+catalog is the same whether images are packed or not. A writer holds an
+exclusive lock, flushes its blobs before it appends their index lines, so a
+crash leaves at most unindexed bytes at the end of a pack. Readers
+memory-map the packs: `read` is a dict lookup and a memoryview slice of the
+map, without an open() or a copy per image. An image rendered again is
+appended again; `compact` copies the live blobs, in pack order, into fresh
+packs (with --prune only those the catalog still references) and removes
+the old ones.
+
+pack moves an existing data/generated_images/ into the store (--remove
+deletes the packed files afterwards).
+
+Usage: python3 scripts/image_pack.py pack [--remove]
+       python3 scripts/image_pack.py compact [--prune]
+       python3 scripts/image_pack.py stats
+"""
+import argparse
+import csv
+import mmap
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+PACK_DIR = os.path.join(BASE, 'data', 'image_pack')
+IMAGE_DIR = os.path.join(BASE, 'data', 'generated_images')
+PACK_SIZE = 1 << 30
+IMAGE_EXTS = {'.jpg', '.jpeg', '.webp'}
+COPY_BUFFER = 8 << 20
+
+def enabled() -> bool:
+    return os.environ.get('CATALOG_IMAGES', 'files').lower() == 'pack'
+
+def rel(path: str) -> str:
+    return os.path.normpath(os.path.relpath(path, BASE) if os.path.isabs(path) else path)
+
+def pack_name(n: int) -> str:
+    return f'pack-{n:05d}.bin'
+
+class ImagePack:
+    """Reader (and, with `writer()`, the single appender) of one packed store."""
+    def __init__(self, root: str = PACK_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, 'index.csv')
+        self.entries = {}
+        self._maps = {}
+        self._index_id = None
+        self._index_pos = 0
+        self._lock = threading.Lock()
+        self._pack = self._pack_no = self._lockfile = None
+        self._pending = []
+        self.refresh()
+
+    def __contains__(self, path: str) -> bool:
+        return rel(path) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def refresh(self):
+        """Pick up index lines appended since the last call; reread it all after a compact."""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if (st.st_dev, st.st_ino) != self._index_id or st.st_size < self._index_pos:
+                self._index_id, self._index_pos = (st.st_dev, st.st_ino), 0
+                self.entries = {}
+                self._maps = {}
+            if st.st_size == self._index_pos:
+                return
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._index_pos)
+                data = f.read(st.st_size - self._index_pos)
+            # Only whole lines; a line being written is read next time
+            data = data[:data.rfind(b'\n') + 1]
+            self._index_pos += len(data)
+            for path, pack, offset, size in csv.reader(data.decode('utf-8').splitlines()):
+                if path != 'path':
+                    self.entries[path] = (int(pack), int(offset), int(size))
+
+    def _map(self, pack: int, end: int) -> mmap.mmap:
+        mm = self._maps.get(pack)
+        if mm is None or len(mm) < end:
+            # A pack that grew since it was mapped is mapped again; views of the old map stay valid
+            with open(os.path.join(self.root, pack_name(pack)), 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[pack] = mm
+        return mm
+
+    def read(self, path: str) -> memoryview:
+        """The stored bytes of path as a zero-copy view, or None."""
+        hit = self.entries.get(rel(path))
+        if hit is None:
+            return None
+        pack, offset, size = hit
+        with self._lock:
+            mm = self._map(pack, offset + size)
+        return memoryview(mm)[offset:offset + size]
+
+    def packs(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(n[5:10]) for n in os.listdir(self.root) if n.startswith('pack-') and n.endswith('.bin'))
+
+    # Writing
+
+    def writer(self):
+        """Take the store's write lock; use as a context manager around append()."""
+        os.makedirs(self.root, exist_ok=True)
+        self._lockfile = open(os.path.join(self.root, 'lock'), 'w')
+        if fcntl is not None:
+            fcntl.flock(self._lockfile, fcntl.LOCK_EX)
+        self.refresh()
+        if not os.path.exists(self.index_path):
+            with open(self.index_path, 'w', newline='') as f:
+                csv.writer(f).writerow(['path', 'pack', 'offset', 'size'])
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open_pack(self, size: int):
+        if self._pack is not None and self._pack.tell() + size <= PACK_SIZE:
+            return
+        if self._pack is not None:
+            self.flush()
+            self._pack.close()
+            self._pack_no += 1
+        else:
+            packs = self.packs()
+            self._pack_no = packs[-1] if packs else 0
+        path = os.path.join(self.root, pack_name(self._pack_no))
+        if os.path.exists(path) and os.path.getsize(path) + size > PACK_SIZE and os.path.getsize(path):
+            self._pack_no += 1
+            path = os.path.join(self.root, pack_name(self._pack_no))
+        self._pack = open(path, 'ab', buffering=COPY_BUFFER)
+
+    def append(self, path: str, data: bytes):
+        self._open_pack(len(data))
+        offset = self._pack.tell()
+        self._pack.write(data)
+        self._pending.append((rel(path), self._pack_no, offset, len(data)))
+
+    def flush(self):
+        """Make appended blobs durable, then index them."""
+        if not self._pending:
+            return
+        self._pack.flush()
+        os.fsync(self._pack.fileno())
+        with open(self.index_path, 'a', newline='') as f:
+            csv.writer(f).writerows(self._pending)
+        self._pending = []
+        self.refresh()
+
+    def close(self):
+        if self._pack is not None:
+            self.flush()
+            self._pack.close()
+            self._pack = None
+        if self._lockfile is not None:
+            self._lockfile.close()
+            self._lockfile = None
+
+    def stats(self) -> dict:
+        pack_bytes = sum(os.path.getsize(os.path.join(self.root, pack_name(n))) for n in self.packs())
+        live = sum(size for _, _, size in self.entries.values())
+        return {'images': len(self.entries), 'packs': len(self.packs()), 'pack_bytes': pack_bytes,
+                'live_bytes': live, 'garbage_bytes': pack_bytes - live}
+
+    def compact(self, keep=None) -> dict:
+        """Rewrite the live blobs (those in keep, if given) into new packs and drop the old ones."""
+        with self.writer():
+            old = self.packs()
+            live = sorted((e for e in self.entries.items() if keep is None or e[0] in keep),
+                          key=lambda e: e[1][:2])
+            first = old[-1] + 1 if old else 0
+            tmp_index = self.index_path + '.tmp'
+            self._pack_no, self._pack = first, None
+            out = None
+            with open(tmp_index, 'w', newline='') as index:
+                w = csv.writer(index)
+                w.writerow(['path', 'pack', 'offset', 'size'])
+                for path, (pack, offset, size) in live:
+                    if out is None or out.tell() + size > PACK_SIZE and out.tell():
+                        if out is not None:
+                            out.flush()
+                            os.fsync(out.fileno())
+                            out.close()
+                            self._pack_no += 1
+                        out = open(os.path.join(self.root, pack_name(self._pack_no)), 'wb', buffering=COPY_BUFFER)
+                    w.writerow([path, self._pack_no, out.tell(), size])
+                    out.write(self._map(pack, offset + size)[offset:offset + size])
+                if out is not None:
+                    out.flush()
+                    os.fsync(out.fileno())
+                    out.close()
+            os.replace(tmp_index, self.index_path)
+            for n in old:
+                os.remove(os.path.join(self.root, pack_name(n)))
+            before = len(self.entries)
+            self._maps = {}
+            self.refresh()
+        return {'kept': len(live), 'dropped': before - len(live)}
+
+def pack_directory(pack: ImagePack, image_dir: str = IMAGE_DIR, remove: bool = False) -> dict:
+    """Append every image under image_dir not already stored with the same bytes."""
+    added = same = 0
+    packed = []
+    with pack.writer():
+        for root, dirs, files in os.walk(image_dir):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in IMAGE_EXTS:
+                    continue
+                path = os.path.join(root, name)
+                with open(path, 'rb') as f:
+                    data = f.read()
+                stored = pack.read(path)
+                if stored is not None and stored == data:
+                    same += 1
+                else:
+                    pack.append(path, data)
+                    added += 1
+                packed.append(path)
+    # Files go only once the index holding them is on disk
+    if remove:
+        for path in packed:
+            os.remove(path)
+    return {'added': added, 'unchanged': same, 'removed': len(packed) if remove else 0}
+
+def main():
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest='command', required=True)
+    cmd = sub.add_parser('pack', help='move data/generated_images/ into the store')
+    cmd.add_argument('--remove', action='store_true', help='delete the image files once packed')
+    cmd = sub.add_parser('compact', help='rewrite the packs without superseded blobs')
+    cmd.add_argument('--prune', action='store_true', help='also drop images the catalog no longer references')
+    sub.add_parser('stats')
+    args = p.parse_args()
+
+    pack = ImagePack()
+    if args.command == 'pack':
+        result = pack_directory(pack, remove=args.remove)
+        print(f"Packed {result['added']} images ({result['unchanged']} already stored, "
+              f"{result['removed']} files removed)")
+    elif args.command == 'compact':
+        keep = None
+        if args.prune:
+            from image_gc import referenced_images
+            from image_render import thumbnail_path
+            refs = referenced_images()
+            if not refs:
+                p.exit(1, 'Refusing to prune: the catalog references no local images\n')
+            keep = refs | {thumbnail_path(r) for r in refs}
+        before = pack.stats()
+        pruned = [path for path in pack.entries if keep is not None and path not in keep]
+        result = pack.compact(keep)
+        if pruned:
+            # Forget pruned images in the render manifest too, so they are redrawn if referenced again
+            from image_manifest import ImageManifest
+            manifest = ImageManifest()
+            for path in pruned:
+                manifest.entries.pop(path, None)
+            if os.path.exists(manifest.path):
+                manifest.save()
+        after = pack.stats()
+        print(f"Kept {result['kept']} images, dropped {result['dropped']}; "
+              f"{before['pack_bytes'] / 1e6:.1f}MB -> {after['pack_bytes'] / 1e6:.1f}MB")
+    else:
+        s = pack.stats()
+        print(f"{s['images']} images in {s['packs']} packs: {s['pack_bytes'] / 1e6:.1f}MB, "
+              f"{s['garbage_bytes'] / 1e6:.1f}MB superseded")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Placeholder image rendering shared by refresh_catalog.py and
+generate_local_images.py.
+
+Jobs are (path, background colour, label, text fill) tuples. `render_all`
+splits them into batches and runs them on a process pool; each worker loads
+the TrueType font once in its initializer instead of once per image.
+
+Every rendered image also gets a 320px-wide WebP thumbnail under
+thumbs/ next to it, which is what app.py serves in the results grid.
+Given an ImagePack (image_pack.py), workers encode images in memory and
+return the bytes, and the parent appends them to the pack instead.
+Thumbnails for images rendered before this existed can be backfilled with:
+
+Usage: python3 scripts/image_render.py --thumbnails [--force] [--workers N]
+"""
+import argparse
+import glob
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+OUT_DIR = os.path.join(BASE, 'data', 'generated_images')
+
+IMAGE_SIZE = (800, 800)
+FONT_NAME = 'DejaVuSans-Bold.ttf'
+FONT_SIZE = 36
+JPEG_QUALITY = 85
+LIGHT_BACKGROUNDS = ('#f6f7f8', '#ffffff')
+DEFAULT_BATCH_SIZE = 64
+
+THUMB_DIRNAME = 'thumbs'
+THUMB_WIDTH = 320
+THUMB_FORMAT = 'WEBP'
+THUMB_EXT = '.webp'
+THUMB_QUALITY = 80
+
+_font = None
+
+def get_font():
+    # Loaded once per process (worker initializer or first in-process render)
+    global _font
+    if _font is None:
+        try:
+            _font = ImageFont.truetype(FONT_NAME, FONT_SIZE)
+        except Exception:
+            _font = ImageFont.load_default()
+    return _font
+
+def text_fill(color: str) -> str:
+    return 'white' if color.lower() not in LIGHT_BACKGROUNDS else 'black'
+
+def thumbnail_path(path: str) -> str:
+    """data/generated_images/x.jpg -> data/generated_images/thumbs/x.webp"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(path), THUMB_DIRNAME, stem + THUMB_EXT)
+
+def _thumbnail(img):
+    height = max(1, round(img.height * THUMB_WIDTH / img.width))
+    return img.resize((THUMB_WIDTH, height), Image.LANCZOS)
+
+def save_thumbnail(img, path: str):
+    thumb = thumbnail_path(path)
+    os.makedirs(os.path.dirname(thumb), exist_ok=True)
+    _thumbnail(img).save(thumb, format=THUMB_FORMAT, quality=THUMB_QUALITY)
+
+def make_thumbnail(path: str):
+    with Image.open(path) as img:
+        save_thumbnail(img.convert('RGB'), path)
+
+def draw_image(color: str, text: str, fill: str = None):
+    img = Image.new('RGB', IMAGE_SIZE, color)
+    draw = ImageDraw.Draw(img)
+    font = get_font()
+    # textsize() was removed in some Pillow releases; try textbbox then fallback
+    try:
+        bbox = draw.textbbox((0, 0), text, font=font)
+        w = bbox[2] - bbox[0]
+        h = bbox[3] - bbox[1]
+    except Exception:
+        try:
+            w, h = font.getsize(text)
+        except Exception:
+            w, h = (len(text) * 10, 20)
+    fill = fill or text_fill(color)
+    draw.text(((IMAGE_SIZE[0]-w)/2, (IMAGE_SIZE[1]-h)/2), text, fill=fill, font=font)
+    return img
+
+def render_image(path: str, color: str, text: str, fill: str = None):
+    img = draw_image(color, text, fill)
+    img.save(path, format='JPEG', quality=JPEG_QUALITY)
+    save_thumbnail(img, path)
+
+def render_bytes(path: str, color: str, text: str, fill: str = None) -> tuple:
+    """(path, JPEG bytes, thumbnail bytes): the same images render_image writes, kept in memory."""
+    img = draw_image(color, text, fill)
+    image, thumb = io.BytesIO(), io.BytesIO()
+    img.save(image, format='JPEG', quality=JPEG_QUALITY)
+    _thumbnail(img).save(thumb, format=THUMB_FORMAT, quality=THUMB_QUALITY)
+    return path, image.getvalue(), thumb.getvalue()
+
+def _render_batch(batch: list) -> int:
+    for job in batch:
+        render_image(*job)
+    return len(batch)
+
+def _render_bytes_batch(batch: list) -> list:
+    return [render_bytes(*job) for job in batch]
+
+def _thumbnail_batch(batch: list) -> int:
+    for path in batch:
+        make_thumbnail(path)
+    return len(batch)
+
+def run_batches(fn, jobs: list, workers: int = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                progress: bool = True, label: str = 'images', collect=None) -> int:
+    """Apply a batch function to jobs, on a process pool when workers != 1.
+
+    fn returns how many jobs it did, or with collect, results that collect()
+    consumes in the parent (returning how many jobs they cover)."""
+    jobs = list(jobs)
+    if not jobs:
+        return 0
+    workers = workers or os.cpu_count() or 1
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+
+    done = 0
+    def report(result):
+        nonlocal done
+        done += collect(result) if collect else result
+        if progress:
+            print(f'Rendered {done}/{len(jobs)} {label}', end='\r' if done < len(jobs) else '\n', flush=True)
+
+    if workers == 1 or len(batches) == 1:
+        for batch in batches:
+            report(fn(batch))
+        return done
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches)), initializer=get_font) as pool:
+        for n in pool.map(fn, batches):
+            report(n)
+    return done
+
+def render_all(jobs: list, workers: int = None, batch_size: int = DEFAULT_BATCH_SIZE, progress: bool = True,
+               pack=None) -> int:
+    """Render every job, in parallel when workers != 1. Returns the number rendered.
+
+    With pack (an ImagePack open for writing) the images and thumbnails are
+    appended to it under the paths the files would have had."""
+    if pack is None:
+        return run_batches(_render_batch, jobs, workers, batch_size, progress)
+
+    def store(results):
+        for path, image, thumb in results:
+            pack.append(path, image)
+            pack.append(thumbnail_path(path), thumb)
+        return len(results)
+    return run_batches(_render_bytes_batch, jobs, workers, batch_size, progress, collect=store)
+
+def thumbnail_all(paths: list, workers: int = None, batch_size: int = DEFAULT_BATCH_SIZE, progress: bool = True) -> int:
+    return run_batches(_thumbnail_batch, paths, workers, batch_size, progress, label='thumbnails')
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--thumbnails', action='store_true', help='create missing thumbnails for existing images')
+    p.add_argument('--force', action='store_true', help='rebuild thumbnails that already exist')
+    p.add_argument('--workers', type=int, default=None)
+    args = p.parse_args()
+    if not args.thumbnails:
+        p.error('nothing to do (pass --thumbnails)')
+    paths = sorted(glob.glob(os.path.join(OUT_DIR, '*.jpg')))
+    if not args.force:
+        paths = [path for path in paths if not os.path.exists(thumbnail_path(path))]
+    n = thumbnail_all(paths, workers=args.workers)
+    print(f'Created {n} thumbnails in {os.path.join(OUT_DIR, THUMB_DIRNAME)}')
+
+if __name__ == '__main__':
+    main()
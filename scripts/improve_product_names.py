@@ -8,13 +8,22 @@ and updates each variation's `item_name` to include the color and size,
 e.g. "Summit Ridge Shirt (Ocean Blue / XL)".
 
 Deterministic mapping uses the numeric part of the item id as a seed
-so repeated runs produce the same results.
+so repeated runs produce the same results. With --incremental only rows
+whose fingerprint changed since the last run are renamed. With
+CATALOG_BACKEND=sqlite the renamed rows are written to the catalog database
+in one transaction instead of rewriting the CSVs.
 """
+import argparse
 import pandas as pd
-import re
 import random
 import os
 
+import catalog_db
+from catalog_fingerprint import FingerprintState, fingerprint
+from catalog_profile import NULL_PROFILER, Profiler, add_profile_args
+from catalog_snapshot import compile_snapshot, load_items, load_variations
+from catalog_transform import by_seed, parent_lookup, seed_column, variation_names
+
 BASE = os.path.dirname(os.path.dirname(__file__))
 ITEMS_CSV = os.path.join(BASE, 'data', 'items.csv')
 VARS_CSV = os.path.join(BASE, 'data', 'variations.csv')
@@ -30,12 +39,7 @@ NAME_TYPES = [
     'Shorts','Cap','Beanie','Skort','Dress','Leggings','Joggers','Blouse','Cardigan','Vest'
 ]
 
-def numeric_seed_from_id(item_id: str) -> int:
-    m = re.search(r"(\d+)", str(item_id))
-    return int(m.group(1)) if m else abs(hash(item_id)) % 100000
-
-def make_item_name(item_id: str) -> str:
-    seed = numeric_seed_from_id(item_id)
+def name_for_seed(seed: int) -> str:
     rnd = random.Random(seed)
     word = rnd.choice(NAME_WORDS)
     typ = rnd.choice(NAME_TYPES)
@@ -47,18 +51,35 @@ def make_item_name(item_id: str) -> str:
         name = f"{word} {typ}"
     return name
 
-def main():
+def main(incremental: bool = False, profiler: Profiler = NULL_PROFILER):
     print('Reading items...')
-    items = pd.read_csv(ITEMS_CSV)
+    with profiler.stage('load'):
+        items = load_items(ITEMS_CSV)
+        print('Reading variations...')
+        vars_df = load_variations(VARS_CSV)
+
+    # Row fingerprints from the last run decide what needs recomputing
+    salt = 'improve_product_names'
+    item_state = FingerprintState(salt, 'items')
+    var_state = FingerprintState(salt, 'variations')
+    if incremental:
+        with profiler.stage('fingerprint', items=len(items) + len(vars_df)):
+            dirty = item_state.changed(items['id'], fingerprint(items, salt))
+            vars_dirty = (var_state.changed(vars_df['variation_id'], fingerprint(vars_df, salt))
+                          | vars_df['item_id'].isin(items.loc[dirty, 'id']))
+        print(f'{dirty.sum()} of {len(items)} items and {vars_dirty.sum()} of {len(vars_df)} variations changed since last run')
+        if not dirty.any() and not vars_dirty.any():
+            print('Names are up to date; nothing to write.')
+            return
+    else:
+        dirty = pd.Series(True, index=items.index)
+        vars_dirty = pd.Series(True, index=vars_df.index)
 
-    # Generate new names
+    # Generate new names (one RNG draw per unique id seed)
     print('Generating new item names...')
-    id_to_name = {}
-    for idx, row in items.iterrows():
-        item_id = row['id']
-        new_name = make_item_name(item_id)
-        id_to_name[item_id] = new_name
-        items.at[idx, 'item_name'] = new_name
+    with profiler.stage('names', items=dirty.sum()):
+        seeds = seed_column(items.loc[dirty, 'id'])
+        items.loc[dirty, 'item_name'] = by_seed(seeds, lambda s: (name_for_seed(s),), ['name'])['name']
 
     # Backup original file
     items_backup = ITEMS_CSV + '.bak'
@@ -66,39 +87,48 @@ def main():
         items.to_csv(items_backup, index=False)
         print(f'Backup written to {items_backup}')
 
-    items.to_csv(ITEMS_CSV, index=False)
-    print(f'Wrote updated items to {ITEMS_CSV}')
+    if not catalog_db.enabled():
+        with profiler.stage('write_items', items=len(items)):
+            items.to_csv(ITEMS_CSV, index=False)
+            compile_snapshot(ITEMS_CSV, items)
+        print(f'Wrote updated items to {ITEMS_CSV}')
 
     # Update variations
-    print('Reading variations...')
-    vars_df = pd.read_csv(VARS_CSV)
     print('Updating variation names to match new parent names...')
-    for idx, row in vars_df.iterrows():
-        item_id = row['item_id']
-        base_name = id_to_name.get(item_id)
-        if base_name:
-            color = row.get('metadata:color', '')
-            size = row.get('metadata:size', '')
-            # Normalize color/size to string
-            color_str = '' if pd.isna(color) else str(color)
-            size_str = '' if pd.isna(size) else str(size)
-            if color_str and size_str:
-                new_var_name = f"{base_name} ({color_str} / {size_str})"
-            elif color_str:
-                new_var_name = f"{base_name} ({color_str})"
-            elif size_str:
-                new_var_name = f"{base_name} ({size_str})"
-            else:
-                new_var_name = base_name
-            vars_df.at[idx, 'item_name'] = new_var_name
+    with profiler.stage('variations', items=vars_dirty.sum()):
+        stale = vars_df.loc[vars_dirty]
+        base_names = parent_lookup(stale, items, items['item_name'])
+        vars_df.loc[vars_dirty, 'item_name'] = variation_names(stale, base_names)
 
     vars_backup = VARS_CSV + '.bak'
     if not os.path.exists(vars_backup):
         vars_df.to_csv(vars_backup, index=False)
         print(f'Backup written to {vars_backup}')
 
-    vars_df.to_csv(VARS_CSV, index=False)
-    print(f'Wrote updated variations to {VARS_CSV}')
+    if catalog_db.enabled():
+        with profiler.stage('write_db', items=dirty.sum() + vars_dirty.sum()):
+            n = catalog_db.update_rows({
+                'items': items.loc[dirty, ['item_name']],
+                'variations': vars_df.loc[vars_dirty, ['item_name']],
+            })
+        print(f'Updated {n} rows in {catalog_db.DB_PATH}')
+    else:
+        with profiler.stage('write_variations', items=len(vars_df)):
+            vars_df.to_csv(VARS_CSV, index=False)
+            compile_snapshot(VARS_CSV, vars_df)
+        print(f'Wrote updated variations to {VARS_CSV}')
+
+    with profiler.stage('save_state', items=len(items) + len(vars_df)):
+        item_state.save(items['id'], fingerprint(items, salt))
+        var_state.save(vars_df['variation_id'], fingerprint(vars_df, salt))
 
 if __name__ == '__main__':
-    main()
+    p = argparse.ArgumentParser()
+    p.add_argument('--incremental', action='store_true', help='only recompute rows changed since the last run')
+    add_profile_args(p)
+    args = p.parse_args()
+    profiler = Profiler.from_args('improve_product_names', args)
+    try:
+        main(args.incremental, profiler)
+    finally:
+        profiler.write()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Apply warehouse inventory events without rewriting variations.csv each time.
+
+Events are JSON lines, one per stock update:
+
+    {"variation_id": "AA-10001-BLK-S", "delta": -2}
+    {"variation_id": "AA-10001-BLK-M", "absolute": 40}
+
+They are read in batches (or whatever has arrived once the oldest pending
+event is --max-wait seconds old) and applied to a fixed-width inventory store under
+data/inventory/: one int32 per variation row (memory-mapped and updated in
+place) plus a sorted array of 64-bit SKU hashes mapping each SKU to its row.
+Within a batch events keep their order per SKU: the last absolute value wins
+and only deltas after it are added. Stock is clamped at zero per batch.
+
+Every --compact-every seconds with uncompacted changes, the store is written
+back into the metadata:inventory column of variations.csv (atomic .tmp +
+os.replace, snapshot recompiled). If variations.csv was rewritten by another
+script since the store was built, values are matched to its rows by SKU
+rather than position (rows the store does not know keep theirs) and the
+store is rebuilt from the result; at startup a stale store is rebuilt the
+same way, carrying over uncompacted values by SKU.
+
+With CATALOG_BACKEND=sqlite the store is built from the catalog database
+(rebuilt on every start, carrying uncompacted values) and compaction
+updates only the inventory values that differ, in one transaction, instead
+of rewriting variations.csv.
+
+Usage: python3 scripts/inventory_ingest.py [EVENTS.jsonl|-] [--batch-size N] [--max-wait SECONDS]
+                                           [--compact-every SECONDS] [--compact] [--profile]
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+import catalog_db
+from catalog_profile import Profiler, add_profile_args
+from catalog_snapshot import compile_snapshot
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+VARS_CSV = os.path.join(BASE, 'data', 'variations.csv')
+STORE_DIR = os.path.join(BASE, 'data', 'inventory')
+
+DEFAULT_BATCH_SIZE = 20_000
+DEFAULT_MAX_WAIT = 1.0
+DEFAULT_COMPACT_EVERY = 60.0
+READ_BUFFER = 1 << 20
+INVENTORY_COL = 'metadata:inventory'
+
+def hash_skus(skus) -> np.ndarray:
+    return pd.util.hash_array(np.asarray(skus, dtype=object))
+
+def _source_stat(path: str) -> dict:
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+class InventoryStore:
+    def __init__(self, csv_path: str = VARS_CSV, store_dir: str = STORE_DIR):
+        self.csv_path = csv_path
+        self.store_dir = store_dir
+        self.meta_path = os.path.join(store_dir, 'meta.json')
+        self.values_path = os.path.join(store_dir, 'inventory.i32')
+        self.meta = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+        if self.meta is None or catalog_db.enabled() or self.meta['source'] != self.source():
+            self.rebuild()
+        self._open()
+
+    def source(self):
+        """Size and mtime of variations.csv, or the catalog database's path."""
+        return f'sqlite:{catalog_db.DB_PATH}' if catalog_db.enabled() else _source_stat(self.csv_path)
+
+    def read(self, columns: list) -> pd.DataFrame:
+        if catalog_db.enabled():
+            return catalog_db.read_table('variations', columns=columns)
+        return pd.read_csv(self.csv_path, usecols=columns, dtype=str, keep_default_na=False)
+
+    def _open(self):
+        self.sku_hash = np.load(os.path.join(self.store_dir, 'sku_hash.npy'))
+        self.sku_row = np.load(os.path.join(self.store_dir, 'sku_row.npy'))
+        self.values = np.memmap(self.values_path, dtype=np.int32, mode='r+', shape=(self.meta['rows'],))
+
+    def _write_meta(self, **changes):
+        self.meta.update(changes)
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def rebuild(self):
+        """(Re)build the store from the catalog, keeping uncompacted values by SKU."""
+        carried = None
+        if self.meta is not None and self.meta.get('dirty'):
+            self._open()
+            carried = (self.sku_hash, self.values[self.sku_row].copy())
+            del self.values
+
+        df = self.read(['variation_id', INVENTORY_COL])
+        hashes = hash_skus(df['variation_id'])
+        values = pd.to_numeric(df[INVENTORY_COL], errors='coerce').fillna(0).to_numpy(dtype=np.int32)
+        order = np.argsort(hashes, kind='stable')
+        sku_hash, sku_row = hashes[order], order.astype(np.int64)
+
+        if carried is not None:
+            old_hash, old_values = carried
+            pos = np.minimum(np.searchsorted(old_hash, sku_hash), max(len(old_hash) - 1, 0))
+            hit = (old_hash[pos] == sku_hash) if len(old_hash) else np.zeros(len(sku_hash), bool)
+            values[sku_row[hit]] = old_values[pos[hit]]
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        np.save(os.path.join(self.store_dir, 'sku_hash.npy'), sku_hash)
+        np.save(os.path.join(self.store_dir, 'sku_row.npy'), sku_row)
+        values.tofile(self.values_path)
+        self.meta = {'source': self.source(), 'rows': len(df), 'dirty': carried is not None}
+        self._write_meta()
+
+    def lookup(self, skus) -> np.ndarray:
+        """Row position for each SKU, -1 when unknown."""
+        h = hash_skus(skus)
+        if not len(self.sku_hash):
+            return np.full(len(h), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.sku_hash, h), len(self.sku_hash) - 1)
+        return np.where(self.sku_hash[pos] == h, self.sku_row[pos], -1)
+
+    def apply(self, rows: np.ndarray, amounts: np.ndarray, absolute: np.ndarray) -> int:
+        """Apply one ordered batch of events in place. Returns how many values were clamped at 0."""
+        known = rows >= 0
+        rows, amounts, absolute = rows[known], amounts[known], absolute[known]
+        if not len(rows):
+            return 0
+        seq = np.arange(len(rows))
+
+        # Per row: the index of its last absolute event (-1 if none) ...
+        touched, inverse = np.unique(rows, return_inverse=True)
+        last_abs = np.full(len(touched), -1, dtype=np.int64)
+        np.maximum.at(last_abs, inverse[absolute], seq[absolute])
+        base = self.values[touched].astype(np.int64)
+        has_abs = last_abs >= 0
+        base[has_abs] = amounts[last_abs[has_abs]]
+
+        # ... plus every delta that came after it
+        after = ~absolute & (seq > last_abs[inverse])
+        np.add.at(base, inverse[after], amounts[after])
+        clamped = int((base < 0).sum())
+        self.values[touched] = np.clip(base, 0, np.iinfo(np.int32).max)
+        if not self.meta.get('dirty'):
+            self._write_meta(dirty=True)
+        return clamped
+
+    def matches(self, skus: pd.Series) -> bool:
+        """Whether every row still holds the SKU it had when the store was built."""
+        return len(skus) == self.meta['rows'] and np.array_equal(hash_skus(skus)[self.sku_row], self.sku_hash)
+
+    def compact(self):
+        """Write the store back into the catalog and mark it clean."""
+        self.values.flush()
+        df = self.read(['variation_id', INVENTORY_COL] if catalog_db.enabled() else None)
+        moved = not self.matches(df['variation_id'])
+        # Rewritten since the store was built: match rows by SKU, unknown SKUs keep their value
+        rows = self.lookup(df['variation_id']) if moved else np.arange(len(df))
+        known = rows >= 0
+        values = self.values[rows[known]]
+        if catalog_db.enabled():
+            current = pd.to_numeric(df.loc[known, INVENTORY_COL], errors='coerce').to_numpy()
+            changed = current != values
+            catalog_db.update_rows({'variations': pd.DataFrame({INVENTORY_COL: values[changed]},
+                                                               index=df.index[known][changed])})
+        else:
+            if moved:
+                df.loc[known, INVENTORY_COL] = values.astype(str)
+            else:
+                df[INVENTORY_COL] = values
+            tmp = self.csv_path + '.tmp'
+            df.to_csv(tmp, index=False)
+            os.replace(tmp, self.csv_path)
+            compile_snapshot(self.csv_path)
+        if moved:
+            del self.values
+            self.meta['dirty'] = False
+            self.rebuild()
+            self._open()
+        else:
+            self._write_meta(source=self.source(), dirty=False)
+
+def parse_batch(lines: list) -> tuple:
+    skus, amounts, absolute = [], [], []
+    bad = 0
+    for line in lines:
+        try:
+            event = json.loads(line)
+            is_absolute = 'absolute' in event
+            amount = int(event['absolute'] if is_absolute else event['delta'])
+            sku = event['variation_id']
+        except (ValueError, KeyError, TypeError):
+            bad += 1
+            continue
+        # Appended together, only for a complete event, so the three stay aligned
+        skus.append(sku)
+        amounts.append(amount)
+        absolute.append(is_absolute)
+    return skus, np.array(amounts, dtype=np.int64), np.array(absolute, dtype=bool), bad
+
+def read_lines(stream, max_wait: float):
+    """Yield the complete lines that have arrived on a binary stream, or [] after max_wait idle seconds."""
+    chunks = queue.Queue(maxsize=64)
+
+    def reader():
+        for chunk in iter(lambda: stream.read1(READ_BUFFER), b''):
+            chunks.put(chunk)
+        chunks.put(None)
+
+    threading.Thread(target=reader, daemon=True).start()
+    tail = b''
+    while True:
+        try:
+            chunk = chunks.get(timeout=max_wait)
+        except queue.Empty:
+            yield []
+            continue
+        if chunk is None:
+            break
+        data = tail + chunk
+        cut = data.rfind(b'\n') + 1
+        tail = data[cut:]
+        yield data[:cut].splitlines()
+    if tail:
+        yield [tail]
+
+def ingest(stream, store: InventoryStore, batch_size: int = DEFAULT_BATCH_SIZE,
+           compact_every: float = DEFAULT_COMPACT_EVERY, max_wait: float = DEFAULT_MAX_WAIT) -> dict:
+    stats = {'events': 0, 'applied': 0, 'unknown_sku': 0, 'malformed': 0, 'clamped': 0}
+    last_compact = time.monotonic()
+
+    def flush(lines):
+        skus, amounts, absolute, bad = parse_batch(lines)
+        rows = store.lookup(skus)
+        stats['events'] += len(lines)
+        stats['malformed'] += bad
+        stats['unknown_sku'] += int((rows < 0).sum())
+        stats['applied'] += int((rows >= 0).sum())
+        stats['clamped'] += store.apply(rows, amounts, absolute)
+
+    # A partial batch is applied once its oldest event has waited max_wait seconds
+    batch, oldest = [], None
+    for lines in read_lines(stream, max_wait):
+        now = time.monotonic()
+        if oldest is None and lines:
+            oldest = now
+        batch.extend(line for line in lines if line.strip())
+        while len(batch) >= batch_size:
+            flush(batch[:batch_size])
+            batch = batch[batch_size:]
+        if batch and now - oldest >= max_wait:
+            flush(batch)
+            batch = []
+        if not batch:
+            oldest = None
+        if compact_every and store.meta.get('dirty') and now - last_compact >= compact_every:
+            store.compact()
+            last_compact = time.monotonic()
+    if batch:
+        flush(batch)
+    return stats
+
+def run(args, profiler: Profiler):
+    with profiler.stage('open_store'):
+        store = InventoryStore()
+    if not args.compact:
+        stream = sys.stdin.buffer if args.events == '-' else open(args.events, 'rb')
+        start = time.perf_counter()
+        try:
+            with profiler.stage('ingest') as stage:
+                stats = ingest(stream, store, args.batch_size, args.compact_every, args.max_wait)
+                stage.set_items(stats['events'])
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+        elapsed = time.perf_counter() - start
+        rate = stats['events'] / elapsed if elapsed else 0
+        print(f"Applied {stats['applied']} of {stats['events']} events in {elapsed:.2f}s ({rate:,.0f}/s); "
+              f"{stats['unknown_sku']} unknown SKU(s), {stats['malformed']} malformed, {stats['clamped']} clamped at 0")
+    with profiler.stage('compact', items=store.meta['rows']):
+        store.compact()
+    print(f"Compacted inventory into {f'{catalog_db.DB_PATH}:variations' if catalog_db.enabled() else VARS_CSV}")
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('events', nargs='?', default='-', help='JSONL event file, or - for stdin')
+    p.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    p.add_argument('--max-wait', type=float, default=DEFAULT_MAX_WAIT,
+                   help='seconds an event may wait for its batch to fill before it is applied')
+    p.add_argument('--compact-every', type=float, default=DEFAULT_COMPACT_EVERY,
+                   help='seconds between compactions into variations.csv (0 = only at the end)')
+    p.add_argument('--compact', action='store_true', help='only compact the store into variations.csv')
+    add_profile_args(p)
+    args = p.parse_args()
+    profiler = Profiler.from_args('inventory_ingest', args)
+    try:
+        run(args, profiler)
+    finally:
+        profiler.write()
+
+if __name__ == '__main__':
+    main()
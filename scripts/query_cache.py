@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Query-result cache and query log for the catalog.
+
+Catalog (catalog_service.py) answers search() and query() through a
+QueryCache: a bounded LRU of results with a time-to-live, keyed by the
+normalised query (lower-cased search tokens, duplicates dropped, exactly
+what the search index sees) plus the active filters, so "Rain  Jacket" and
+"rain jacket" share an entry. The cache is emptied as soon as the catalog
+files on disk change (checked at most once per CHECK_INTERVAL seconds).
+
+Every request is also appended to data/query_log.jsonl, which is cut back
+to its last LOG_WINDOW lines whenever it reaches twice that. warmup replays the
+most frequent logged requests so a fresh process answers them from cache;
+the catalog service does this after every (re)load, and this script asks a
+running service (or an in-process catalog) to do it at deploy time.
+
+Usage: python3 scripts/query_cache.py [--top N] [--show]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+from catalog_search import tokenize
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+LOG_PATH = os.path.join(BASE, 'data', 'query_log.jsonl')
+CACHE_SIZE = 1024
+CACHE_TTL = 600.0
+CHECK_INTERVAL = 1.0
+WARM_TOP = 200
+LOG_WINDOW = 100_000
+
+def normalize_query(query: str) -> str:
+    return ' '.join(dict.fromkeys(tokenize(query or '')))
+
+def normalize_selections(selections: dict) -> dict:
+    """Selected values per facet, sorted, without empty facets."""
+    return {f: sorted(set(map(str, v))) for f, v in sorted((selections or {}).items()) if v}
+
+def popular(top: int = WARM_TOP, path: str = LOG_PATH) -> list:
+    """[(endpoint, params, count)] for the most frequent of the last LOG_WINDOW logged requests."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        lines = deque(f, maxlen=LOG_WINDOW)
+    counts = Counter()
+    for line in lines:
+        try:
+            entry = json.loads(line)
+            counts[entry['endpoint'], json.dumps(entry['params'], sort_keys=True)] += 1
+        except (ValueError, KeyError):  # a line cut short by a crash
+            continue
+    return [(endpoint, json.loads(params), n) for (endpoint, params), n in counts.most_common(top)]
+
+class QueryCache:
+    """LRU + TTL results for one catalog, dropped when signature_fn() changes."""
+    def __init__(self, signature_fn, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL, log_path: str = LOG_PATH):
+        self.signature_fn = signature_fn
+        self.signature = signature_fn()
+        self.checked = time.monotonic()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.log_path = log_path
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._log = None
+        self._log_lines = 0
+
+    def _check_signature(self, now: float):
+        if now - self.checked < CHECK_INTERVAL:
+            return
+        self.checked = now
+        signature = self.signature_fn()
+        if signature != self.signature:
+            self.signature = signature
+            self.entries.clear()
+
+    def _write_log(self, endpoint: str, params: dict):
+        if self._log is None:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            if os.path.exists(self.log_path):
+                with open(self.log_path, 'rb') as f:
+                    self._log_lines = sum(1 for _ in f)
+            self._log = open(self.log_path, 'a', buffering=1)
+        self._log.write(json.dumps({'ts': round(time.time(), 3), 'endpoint': endpoint, 'params': params}) + '\n')
+        self._log_lines += 1
+        if self._log_lines >= 2 * LOG_WINDOW:
+            self._truncate_log()
+
+    def _truncate_log(self):
+        """Keep only the last LOG_WINDOW lines, which is all popular() reads."""
+        self._log.close()
+        with open(self.log_path, 'rb') as f:
+            lines = deque(f, maxlen=LOG_WINDOW)
+        tmp = self.log_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.writelines(lines)
+        os.replace(tmp, self.log_path)
+        self._log = open(self.log_path, 'a', buffering=1)
+        self._log_lines = len(lines)
+
+    def get(self, endpoint: str, params: dict, compute, log: bool = True):
+        """Cached result for (endpoint, params), computing it with compute() on a miss."""
+        key = (endpoint, json.dumps(params, sort_keys=True))
+        now = time.monotonic()
+        with self._lock:
+            if log and self.log_path:
+                self._write_log(endpoint, params)
+            self._check_signature(now)
+            hit = self.entries.get(key)
+            if hit is not None and hit[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+            self.misses += 1
+        result = compute()
+        with self._lock:
+            self.entries[key] = (now + self.ttl, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return result
+
+    def stats(self) -> dict:
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--top', type=int, default=WARM_TOP, help='how many of the most frequent requests to replay')
+    p.add_argument('--show', action='store_true', help='only list the most frequent logged requests')
+    args = p.parse_args()
+    if args.show:
+        for endpoint, params, n in popular(args.top):
+            print(f'{n:8d}  {endpoint} {json.dumps(params, sort_keys=True)}')
+        return
+    # Imported here: the catalog service imports this module
+    from catalog_service import connect
+    catalog = connect()
+    result = catalog.warmup(args.top)
+    where = os.environ.get('CATALOG_SERVICE') or 'an in-process catalog (nothing outlives this run)'
+    print(f"Replayed {result['replayed']} requests on {where} in {result['seconds']:.2f}s")
+
+if __name__ == '__main__':
+    main()
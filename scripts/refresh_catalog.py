@@ -2,21 +2,39 @@
 """
 Refresh the catalog data:
 - Tweak naming style (brand-centric, adjective, casual, premium)
-- Update descriptions and regenerate SEO-friendly URL slugs
+- Update descriptions and regenerate SEO-friendly URL slugs (unique per item,
+  allocated through the persistent slug registry, see slug_registry.py)
 - Regenerate local placeholder images under data/generated_images/ using the new slugs
 - Update items.csv and variations.csv to reference the new images and names
 
-Usage: python3 scripts/refresh_catalog.py [--style brand|adjective|casual|premium]
+Usage: python3 scripts/refresh_catalog.py [--style brand|adjective|casual|premium] [--workers N]
+                                           [--incremental] [--no-images] [--profile] [--cprofile]
 
 This tool is deterministic (seeded from numeric id) so re-running with the same
-style will produce the same outputs.
+style will produce the same outputs. With --incremental only items whose
+row fingerprint changed since the last run (and their variations) are
+recomputed; an unchanged catalog is left untouched. With
+CATALOG_BACKEND=sqlite the changed rows are written to the catalog database
+in one transaction instead of rewriting the CSVs. --no-images updates the
+image paths without drawing the images; the next full (not --incremental)
+run that renders draws whatever is missing.
 """
 import argparse
 import os
 import re
 import random
 import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
+
+import catalog_db
+from catalog_snapshot import compile_snapshot, load_items, load_variations
+from catalog_transform import (
+    by_seed, image_paths, parent_lookup, product_urls, seed_column,
+    slugify_column, text_column, variation_names,
+)
+from catalog_fingerprint import FingerprintState, fingerprint
+from catalog_profile import NULL_PROFILER, Profiler, add_profile_args
+from image_manifest import render_changed
+from slug_registry import SlugRegistry
 
 BASE = os.path.dirname(os.path.dirname(__file__))
 ITEMS_CSV = os.path.join(BASE, 'data', 'items.csv')
@@ -47,141 +65,150 @@ def slugify(s: str) -> str:
     s = s.strip('-')
     return s or 'item'
 
-def numeric_seed_from_id(item_id: str) -> int:
-    m = re.search(r"(\d+)", str(item_id))
-    return int(m.group(1)) if m else abs(hash(item_id)) % 100000
-
-def generate_name(item_id: str, brand: str, style: str) -> str:
-    seed = numeric_seed_from_id(item_id)
+def name_parts(seed: int, style: str) -> tuple:
+    """(adjective or '', noun) drawn from the id-seeded RNG for a style."""
     rnd = random.Random(seed)
 
     if style == 'brand':
         # Brand-centric: <Brand> <Noun> or <Brand> <Adjective> <Noun>
-        brand_word = (brand.split()[0] if isinstance(brand, str) and brand.strip() else 'Aura')
         if rnd.random() < 0.2:
             adj = rnd.choice(ADJECTIVES)
             noun = rnd.choice(NOUNS)
-            return f"{brand_word} {adj} {noun}"
-        else:
-            noun = rnd.choice(NOUNS)
-            return f"{brand_word} {noun}"
+            return adj, noun
+        return '', rnd.choice(NOUNS)
 
     if style == 'adjective':
         # Adjective heavy: <Adjective> <Noun>
         adj = rnd.choice(ADJECTIVES)
-        noun = rnd.choice(NOUNS)
-        return f"{adj} {noun}"
-
-    if style == 'casual':
+    elif style == 'casual':
         adj = rnd.choice(CASUAL_ADJ)
-        noun = rnd.choice(NOUNS)
-        return f"{adj} {noun}"
-
-    # premium
-    adj = rnd.choice(PREMIUM_ADJ)
+    else:
+        # premium
+        adj = rnd.choice(PREMIUM_ADJ)
     noun = rnd.choice(NOUNS)
-    return f"{adj} {noun}"
+    return adj, noun
 
-def render_image(path: str, color: str, text: str):
-    size = (800, 800)
-    img = Image.new('RGB', size, color)
-    draw = ImageDraw.Draw(img)
-    try:
-        font = ImageFont.truetype('DejaVuSans-Bold.ttf', 36)
-    except Exception:
-        font = ImageFont.load_default()
-    try:
-        bbox = draw.textbbox((0,0), text, font=font)
-        w = bbox[2]-bbox[0]
-        h = bbox[3]-bbox[1]
-    except Exception:
-        try:
-            w, h = font.getsize(text)
-        except Exception:
-            w, h = (len(text)*10, 20)
-    fill = 'white' if color.lower() not in ('#f6f7f8','#ffffff') else 'black'
-    draw.text(((size[0]-w)/2,(size[1]-h)/2), text, fill=fill, font=font)
-    img.save(path, format='JPEG', quality=85)
-
-def main(style: str):
+def generate_names(items: pd.DataFrame, seeds: pd.Series, style: str) -> pd.Series:
+    """The style's name for every item, from its id seed and (brand style) its brand."""
+    parts = by_seed(seeds, lambda s: name_parts(s, style), ['adj', 'noun'])
+    lead = parts['adj']
+    if style == 'brand':
+        brand = text_column(items, 'metadata:brand')
+        brand_word = brand.str.split().str[0].where(brand.str.strip() != '', 'Aura')
+        lead = brand_word.where(parts['adj'] == '', brand_word + ' ' + parts['adj'])
+    return lead + ' ' + parts['noun']
+
+def main(style: str, workers: int = None, incremental: bool = False, render: bool = True,
+         profiler: Profiler = NULL_PROFILER):
     print('Loading items...')
-    items = pd.read_csv(ITEMS_CSV)
-    vars_df = pd.read_csv(VARS_CSV)
+    with profiler.stage('load'):
+        items = load_items(ITEMS_CSV)
+        vars_df = load_variations(VARS_CSV)
+
+    # Row fingerprints from the last run decide what needs recomputing
+    salt = f'refresh_catalog:{style}'
+    item_state = FingerprintState('refresh_catalog', 'items')
+    var_state = FingerprintState('refresh_catalog', 'variations')
+    if incremental:
+        with profiler.stage('fingerprint', items=len(items) + len(vars_df)):
+            dirty = item_state.changed(items['id'], fingerprint(items, salt))
+            vars_dirty = (var_state.changed(vars_df['variation_id'], fingerprint(vars_df, salt))
+                          | vars_df['item_id'].isin(items.loc[dirty, 'id']))
+        print(f'{dirty.sum()} of {len(items)} items and {vars_dirty.sum()} of {len(vars_df)} variations changed since last run')
+        if not dirty.any() and not vars_dirty.any():
+            print('Catalog is up to date; nothing to write.')
+            return
+    else:
+        dirty = pd.Series(True, index=items.index)
+        vars_dirty = pd.Series(True, index=vars_df.index)
 
-    id_to_slug = {}
     print(f'Generating names using style: {style}')
-    for idx, row in items.iterrows():
-        item_id = row['id']
-        brand = row.get('metadata:brand', '')
-        name = generate_name(item_id, brand, style)
-        items.at[idx, 'item_name'] = name
+    with profiler.stage('names', items=dirty.sum()):
+        changed = items.loc[dirty]
+        names = generate_names(changed, seed_column(changed['id']), style)
+        items.loc[dirty, 'item_name'] = names
 
         # regenerate description
-        items.at[idx, 'description'] = f"The {name} from {brand} — premium apparel built for everyday adventure."
-
-        # slug and URL
-        slug = slugify(name)
-        id_to_slug[item_id] = slug
-        items.at[idx, 'url'] = f"https://aura-alpine.com/products/{slug}"
-
-        # image path
-        img_fname = f"{slug}.jpg"
-        img_rel = os.path.join('data', 'generated_images', img_fname)
-        img_full = os.path.join(BASE, img_rel)
-        # deterministic color pick
-        seed = numeric_seed_from_id(item_id)
-        rnd = random.Random(seed)
-        color = rnd.choice(COLOR_PALETTE)
-        label = f"{name}"
-        if not os.path.exists(img_full):
-            render_image(img_full, color, label)
-        items.at[idx, 'image_url'] = img_rel
+        brand = changed['metadata:brand'].astype(object).astype(str)
+        items.loc[dirty, 'description'] = 'The ' + names + ' from ' + brand + ' — premium apparel built for everyday adventure.'
+
+    # Unique slug, URL and image path per item; the registry keeps unchanged items' slugs
+    with profiler.stage('slugs', items=len(items)):
+        registry = SlugRegistry()
+        slugs = registry.assign(items['id'], slugify_column(items['item_name']))
+        urls, images = product_urls(slugs), image_paths(slugs)
+        moved = (items['url'] != urls) | (items['image_url'] != images)
+        items.loc[moved, 'url'] = urls[moved]
+        items.loc[moved, 'image_url'] = images[moved]
+        dirty |= moved
+        vars_dirty |= vars_df['item_id'].isin(items.loc[moved, 'id'])
+
+    # deterministic color pick; one image per touched item, skipping images
+    # whose render inputs match the manifest
+    touched = items.loc[dirty]
+    seeds = seed_column(touched['id'])
+    colors = by_seed(seeds, lambda s: (random.Random(s).choice(COLOR_PALETTE),), ['color'])['color']
+    render_jobs = [(os.path.join(OUT_DIR, f"{slug}.jpg"), color, label)
+                   for slug, color, label in zip(slugs[dirty], colors, touched['item_name'])]
+    if render:
+        with profiler.stage('render', items=len(render_jobs)):
+            rendered = render_changed(render_jobs, workers=workers)
+        print(f'Rendered {rendered} new or changed images ({len(render_jobs) - rendered} up to date)')
+    else:
+        print(f'Skipped rendering {len(render_jobs)} images (--no-images)')
 
     # backups
     items_backup = ITEMS_CSV + '.bak'
     if not os.path.exists(items_backup):
         items.to_csv(items_backup, index=False)
         print(f'Backup written to {items_backup}')
-    items.to_csv(ITEMS_CSV, index=False)
-    print(f'Wrote updated items to {ITEMS_CSV}')
+    if not catalog_db.enabled():
+        with profiler.stage('write_items', items=len(items)):
+            items.to_csv(ITEMS_CSV, index=False)
+            compile_snapshot(ITEMS_CSV, items)
+        print(f'Wrote updated items to {ITEMS_CSV}')
 
-    # Update variations: item_name and image_url to match parent
+    # Update variations: item_name and image_url to match parent (hash join on item_id)
     print('Updating variations...')
-    for idx, row in vars_df.iterrows():
-        item_id = row['item_id']
-        base = items[items['id'] == item_id]
-        if base.empty:
-            continue
-        base_name = base.iloc[0]['item_name']
-        color = row.get('metadata:color', '')
-        size = row.get('metadata:size', '')
-        color_str = '' if pd.isna(color) else str(color)
-        size_str = '' if pd.isna(size) else str(size)
-        if color_str and size_str:
-            new_var_name = f"{base_name} ({color_str} / {size_str})"
-        elif color_str:
-            new_var_name = f"{base_name} ({color_str})"
-        elif size_str:
-            new_var_name = f"{base_name} ({size_str})"
-        else:
-            new_var_name = base_name
-        vars_df.at[idx, 'item_name'] = new_var_name
-
-        # point variation images to the parent slug image
-        slug = id_to_slug.get(item_id)
-        if slug:
-            img_rel = os.path.join('data', 'generated_images', f"{slug}.jpg")
-            vars_df.at[idx, 'image_url'] = img_rel
+    with profiler.stage('variations', items=vars_dirty.sum()):
+        stale = vars_df.loc[vars_dirty]
+        vars_df.loc[vars_dirty, 'item_name'] = variation_names(stale, parent_lookup(stale, items, items['item_name']))
+        parent_image = parent_lookup(stale, items, items['image_url'])
+        vars_df.loc[vars_dirty, 'image_url'] = parent_image.where(parent_image.notna(), stale['image_url'])
 
     vars_backup = VARS_CSV + '.bak'
     if not os.path.exists(vars_backup):
         vars_df.to_csv(vars_backup, index=False)
         print(f'Backup written to {vars_backup}')
-    vars_df.to_csv(VARS_CSV, index=False)
-    print(f'Wrote updated variations to {VARS_CSV}')
+    if catalog_db.enabled():
+        # Both tables in one transaction, so readers never see renamed items with stale variations
+        with profiler.stage('write_db', items=dirty.sum() + vars_dirty.sum()):
+            n = catalog_db.update_rows({
+                'items': items.loc[dirty, ['item_name', 'description', 'url', 'image_url']],
+                'variations': vars_df.loc[vars_dirty, ['item_name', 'image_url']],
+            })
+        print(f'Updated {n} rows in {catalog_db.DB_PATH}')
+    else:
+        with profiler.stage('write_variations', items=len(vars_df)):
+            vars_df.to_csv(VARS_CSV, index=False)
+            compile_snapshot(VARS_CSV, vars_df)
+        print(f'Wrote updated variations to {VARS_CSV}')
+
+    with profiler.stage('save_state', items=len(items) + len(vars_df)):
+        registry.save()
+        item_state.save(items['id'], fingerprint(items, salt))
+        var_state.save(vars_df['variation_id'], fingerprint(vars_df, salt))
 
 if __name__ == '__main__':
     p = argparse.ArgumentParser()
     p.add_argument('--style', choices=['brand','adjective','casual','premium'], default='brand')
+    p.add_argument('--workers', type=int, default=None, help='image render processes (default: all cores)')
+    p.add_argument('--incremental', action='store_true', help='only recompute rows changed since the last run')
+    p.add_argument('--no-images', dest='render', action='store_false', help='update image paths without rendering')
+    add_profile_args(p)
     args = p.parse_args()
-    main(args.style)
+    profiler = Profiler.from_args('refresh_catalog', args)
+    try:
+        main(args.style, args.workers, args.incremental, args.render, profiler)
+    finally:
+        profiler.write()
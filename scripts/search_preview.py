@@ -1,23 +1,55 @@
+try:
+    import readline
+except ImportError:  # not available on Windows
+    readline = None
+
 import pandas as pd
 
+from catalog_service import connect
+
+def enable_completion(catalog):
+    """Tab-complete the whole input line from the autocomplete suggestions."""
+    if readline is None:
+        return
+    cache = {}
+    def complete(text, state):
+        if text not in cache:
+            cache.clear()
+            cache[text] = [s for s, _ in catalog.suggest(text)]
+        options = cache[text]
+        return options[state] if state < len(options) else None
+    readline.set_completer_delims('')
+    readline.set_completer(complete)
+    readline.parse_and_bind('tab: complete')
+
 def search_catalog():
     try:
-        # Load the items you generated
-        df = pd.read_csv('data/items.csv')
+        # The shared catalog service when $CATALOG_SERVICE is set, else the items you generated
+        catalog = connect()
+        enable_completion(catalog)
         
         print("\n--- 🏔️ Welcome to the Aura & Alpine Catalog Search ---")
         query = input("What are you looking for today? (e.g. 'Cotton', 'Cargo', 'Women'): ")
         
-        # Search the item_name and description columns
-        results = df[df['item_name'].str.contains(query, case=False) | 
-                     df['description'].str.contains(query, case=False)]
+        # Search the item_name and description columns, best BM25 matches first
+        # Only the top 10 results are fetched
+        found = catalog.search(query, limit=10)
+        results = pd.DataFrame(found['items'])
         
         if not results.empty:
-            print(f"\n✅ Found {len(results)} matches for '{query}':")
-            # Show the top 10 results
-            print(results[['item_name', 'metadata:price', 'metadata:brand']].head(10).to_string(index=False))
+            print(f"\n✅ Found {found['total']} matches for '{query}':")
+            print(results[['item_name', 'metadata:price', 'metadata:brand', 'stock']].to_string(index=False))
         else:
             print(f"\n❌ No products found for '{query}'.")
+            corrected = catalog.correct(query)
+            candidates = ([corrected] if corrected else []) + [s for s, _ in catalog.suggest(query, limit=3)]
+            # Same suggestion in different casing only once
+            unique = {}
+            for s in candidates:
+                unique.setdefault(s.lower(), s)
+            suggestions = list(unique.values())[:3]
+            if suggestions:
+                print("Did you mean: " + ", ".join(suggestions) + "?")
             
     except FileNotFoundError:
         print("❌ Error: data/items.csv not found. Make sure you ran the generator script!")
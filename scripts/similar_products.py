@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Offline "similar products" neighbours.
+
+Every item is encoded as a vector of feature blocks, each normalised on its
+own and then weighted (WEIGHTS): brand, gender, group, the noun of its name
+(NOUNS / NAME_TYPES, e.g. "Cargo Pants"), the adjectives in its name, a price
+band (the neighbouring bands count half) and the colours and sizes its
+variations still have in stock. Rows are then scaled to unit length, so the
+dot product of two items is their cosine similarity.
+
+Neighbours are only searched among items with the same noun (a jacket's
+neighbours are jackets), which divides the work by the number of nouns;
+items whose name has no known noun are compared with the whole catalog.
+Inside a noun group scores come from float32 matrix products over blocks of
+rows x blocks of columns, keeping a running top-k per row: only scores above
+a row's current k-th best are merged in (argpartition while that is most of
+the block), so memory stays at one block of scores however large the catalog is.
+
+The table goes to data/similar/:
+    ids.npy        item ids (fixed-width UTF-8 bytes)
+    neighbors.npy  int32 [items x k] rows into ids, best first (-1 = none)
+    scores.npy     float16 [items x k] cosine similarity
+    meta.json      k, weights and the catalog files it was built from
+and is read back with SimilarItems, a single row lookup per item.
+
+Usage: python3 scripts/similar_products.py [--k 8] [--block 1024] [--profile]
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from catalog_profile import NULL_PROFILER, Profiler, add_profile_args
+from catalog_snapshot import ITEMS_CSV, VARS_CSV, load_items, load_variations
+from catalog_transform import first_positions
+from improve_product_names import NAME_TYPES, NAME_WORDS
+from refresh_catalog import ADJECTIVES, CASUAL_ADJ, NOUNS, PREMIUM_ADJ
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+OUT_DIR = os.path.join(BASE, 'data', 'similar')
+META_PATH = os.path.join(OUT_DIR, 'meta.json')
+DEFAULT_K = 8
+BLOCK = 1024
+PRICE_BANDS = 10
+SEED_COLS = 256
+WEIGHTS = {
+    'noun': 3.0, 'group': 1.5, 'gender': 1.5, 'brand': 1.0, 'adjective': 1.0,
+    'price': 1.0, 'colour': 0.7, 'size': 0.5,
+}
+NOUN_WORDS = {n.lower() for n in NOUNS + NAME_TYPES}
+ADJECTIVE_WORDS = {a.lower() for a in ADJECTIVES + CASUAL_ADJ + PREMIUM_ADJ + NAME_WORDS}
+
+def name_parts(name: str) -> tuple:
+    """(noun, adjectives) of a generated name: the longest known noun at the end, known adjectives before it."""
+    words = str(name).lower().split()
+    for width in (2, 1):
+        noun = ' '.join(words[-width:])
+        if len(words) >= width and noun in NOUN_WORDS:
+            return noun, [w for w in words[:-width] if w in ADJECTIVE_WORDS]
+    return '', [w for w in words if w in ADJECTIVE_WORDS]
+
+def _one_hot(codes: np.ndarray, width: int) -> np.ndarray:
+    block = np.zeros((len(codes), width), dtype=np.float32)
+    rows = np.flatnonzero(codes >= 0)
+    block[rows, codes[rows]] = 1
+    return block
+
+def _normalize(block: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(block, axis=1, keepdims=True)
+    return np.divide(block, norm, out=np.zeros_like(block), where=norm > 0)
+
+def encode(items: pd.DataFrame, variations: pd.DataFrame) -> tuple:
+    """(unit-length float32 item vectors, noun code per item, whether that noun is known)."""
+    blocks = {}
+    for feature, col in (('brand', 'metadata:brand'), ('gender', 'metadata:gender'), ('group', 'group_ids')):
+        codes, uniq = pd.factorize(items[col]) if col in items else (np.full(len(items), -1), [])
+        blocks[feature] = _one_hot(codes, len(uniq))
+
+    # Names repeat a lot, so each distinct name is parsed once
+    name_codes, names = pd.factorize(items['item_name'].astype(str))
+    parsed = [name_parts(n) for n in names]
+    noun_codes, nouns = pd.factorize(pd.Series([p[0] for p in parsed], dtype=object))
+    adjectives = sorted({a for _, adjs in parsed for a in adjs})
+    adj_table = np.zeros((len(names), len(adjectives)), dtype=np.float32)
+    for i, (_, adjs) in enumerate(parsed):
+        for a in adjs:
+            adj_table[i, adjectives.index(a)] = 1
+    noun_per_item = noun_codes[name_codes]
+    blocks['noun'] = _one_hot(np.where(nouns[noun_codes] == '', -1, noun_codes)[name_codes], len(nouns))
+    blocks['adjective'] = adj_table[name_codes]
+
+    price = pd.to_numeric(items.get('metadata:price'), errors='coerce').to_numpy(dtype=np.float64)
+    edges = np.nanquantile(price, np.linspace(0, 1, PRICE_BANDS + 1)[1:-1]) if np.isfinite(price).any() else []
+    band = np.where(np.isfinite(price), np.searchsorted(edges, price), -1)
+    price_block = _one_hot(band, PRICE_BANDS)
+    for step in (-1, 1):
+        near = band + step
+        ok = (band >= 0) & (near >= 0) & (near < PRICE_BANDS)
+        price_block[np.flatnonzero(ok), near[ok]] = 0.5
+    blocks['price'] = price_block
+
+    # Colours and sizes still in stock, gathered onto the parent item
+    stocked = variations[pd.to_numeric(variations['metadata:inventory'], errors='coerce').fillna(0) > 0]
+    parent = first_positions(items['id'].astype(str), stocked['item_id'].astype(str))
+    for feature, col in (('colour', 'metadata:color'), ('size', 'metadata:size')):
+        codes, uniq = pd.factorize(stocked[col])
+        block = np.zeros((len(items), len(uniq)), dtype=np.float32)
+        ok = (parent >= 0) & (codes >= 0)
+        block[parent[ok], codes[ok]] = 1
+        blocks[feature] = block
+
+    vectors = np.hstack([_normalize(blocks[f]) * WEIGHTS[f] for f in WEIGHTS])
+    return _normalize(vectors), noun_per_item, np.asarray(nouns[noun_per_item] != '')
+
+def _merge(rows_i: np.ndarray, rows_s: np.ndarray, hit_r: np.ndarray, hit_i: np.ndarray, hit_s: np.ndarray):
+    """Fold sparse (row, candidate, score) hits into each row's k best, in place."""
+    n, k = rows_s.shape
+    all_r = np.concatenate([np.repeat(np.arange(n), k), hit_r])
+    all_i = np.concatenate([rows_i.ravel(), hit_i])
+    all_s = np.concatenate([rows_s.ravel(), hit_s])
+    order = np.lexsort((-all_s, all_r))
+    all_r, all_i, all_s = all_r[order], all_i[order], all_s[order]
+    rank = np.arange(len(all_r)) - np.searchsorted(all_r, all_r)
+    keep = rank < k
+    rows_i[all_r[keep], rank[keep]] = all_i[keep]
+    rows_s[all_r[keep], rank[keep]] = all_s[keep]
+
+def top_k(vectors: np.ndarray, rows: np.ndarray, candidates: np.ndarray, k: int, block: int = BLOCK) -> tuple:
+    """Best k candidates (other than itself) for each of rows by dot product, as
+    (int32 row numbers, float32 scores) best first; short rows are padded with -1 / -inf."""
+    best_i = np.full((len(rows), k), -1, dtype=np.int64)
+    best_s = np.full((len(rows), k), -np.inf, dtype=np.float32)
+    for r0 in range(0, len(rows), block):
+        query = rows[r0:r0 + block]
+        q_vectors = vectors[query]
+        rows_i, rows_s = best_i[r0:r0 + block], best_s[r0:r0 + block]
+        # A narrow first slice seeds each row's k best, so later slices mostly take the sparse merge
+        starts = [0, *range(min(SEED_COLS, len(candidates)), len(candidates), block * 8)]
+        for c0, c1 in zip(starts, starts[1:] + [len(candidates)]):
+            cand = candidates[c0:c1]
+            scores = q_vectors @ vectors[cand].T
+            scores[query[:, None] == cand[None, :]] = -np.inf
+            # Once rows hold k good candidates, few new scores beat the k-th best:
+            # merge just those; a dense argpartition only while most of the block qualifies
+            hit_r, hit_c = np.nonzero(scores > rows_s.min(axis=1)[:, None])
+            if len(hit_r) > scores.size // 8:
+                cand_s = np.hstack([rows_s, scores])
+                cand_i = np.hstack([rows_i, np.broadcast_to(cand, scores.shape)])
+                keep = np.argpartition(-cand_s, k - 1, axis=1)[:, :k]
+                rows_s[:] = np.take_along_axis(cand_s, keep, axis=1)
+                rows_i[:] = np.take_along_axis(cand_i, keep, axis=1)
+            elif len(hit_r):
+                _merge(rows_i, rows_s, hit_r, cand[hit_c], scores[hit_r, hit_c])
+    order = np.argsort(-best_s, axis=1, kind='stable')
+    best_s = np.take_along_axis(best_s, order, axis=1)
+    best_i = np.take_along_axis(best_i, order, axis=1)
+    best_i[~np.isfinite(best_s)] = -1
+    return best_i.astype(np.int32), best_s
+
+def build(items: pd.DataFrame, variations: pd.DataFrame, k: int = DEFAULT_K, block: int = BLOCK,
+          profiler: Profiler = NULL_PROFILER) -> tuple:
+    """(neighbors, scores) for every item row, searched within its noun group.
+
+    Items whose name has no known noun are compared with the whole catalog."""
+    with profiler.stage('encode', items=len(items)):
+        vectors, groups, has_noun = encode(items, variations)
+    neighbors = np.full((len(items), k), -1, dtype=np.int32)
+    scores = np.zeros((len(items), k), dtype=np.float32)
+    everyone = np.arange(len(items))
+    with profiler.stage('top_k', items=len(items)):
+        order = np.argsort(groups, kind='stable')
+        bounds = np.flatnonzero(np.diff(groups[order])) + 1
+        for rows in np.split(order, bounds):
+            if not len(rows):
+                continue
+            found_i, found_s = top_k(vectors, rows, rows if has_noun[rows[0]] else everyone, k, block)
+            neighbors[rows] = found_i
+            scores[rows] = np.where(found_i >= 0, found_s, 0)
+    return neighbors, scores
+
+def source_files() -> dict:
+    out = {}
+    for path in (ITEMS_CSV, VARS_CSV):
+        if os.path.exists(path):
+            st = os.stat(path)
+            out[os.path.relpath(path, BASE)] = [st.st_size, st.st_mtime_ns]
+    return out
+
+def write(ids: pd.Series, neighbors: np.ndarray, scores: np.ndarray, k: int, out_dir: str = OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {
+        'ids': np.array([str(i).encode('utf-8') for i in ids], dtype=bytes),
+        'neighbors': neighbors,
+        'scores': scores.astype(np.float16),
+    }
+    for name, array in arrays.items():
+        tmp = os.path.join(out_dir, f'{name}.tmp.npy')
+        np.save(tmp, array)
+        os.replace(tmp, os.path.join(out_dir, f'{name}.npy'))
+    meta = {'items': len(ids), 'k': k, 'weights': WEIGHTS, 'sources': source_files(),
+            'built': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    # meta.json last: readers (and the catalog service's reload check) key off it
+    tmp = os.path.join(out_dir, 'meta.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, 'meta.json'))
+
+class SimilarItems:
+    """The neighbour table, memory-mapped; `rows_for` re-keys it to any item order."""
+    def __init__(self, out_dir: str = OUT_DIR):
+        self.ids = np.load(os.path.join(out_dir, 'ids.npy'))
+        self.neighbors = np.load(os.path.join(out_dir, 'neighbors.npy'), mmap_mode='r')
+        self.scores = np.load(os.path.join(out_dir, 'scores.npy'), mmap_mode='r')
+
+    @classmethod
+    def load(cls, out_dir: str = OUT_DIR):
+        """The table, or None if the job has not run yet."""
+        if not os.path.exists(os.path.join(out_dir, 'meta.json')):
+            return None
+        return cls(out_dir)
+
+    def rows_for(self, ids: pd.Series) -> tuple:
+        """(neighbors, scores) as [len(ids) x k] positions into ids; items added since the build get none."""
+        table_ids = pd.Series([i.decode('utf-8') for i in self.ids], dtype=object)
+        to_table = first_positions(table_ids, ids.astype(str))
+        to_items = first_positions(ids.astype(str), table_ids)
+        neighbors = np.full((len(ids), self.neighbors.shape[1]), -1, dtype=np.int32)
+        scores = np.zeros((len(ids), self.neighbors.shape[1]), dtype=np.float32)
+        known = np.flatnonzero(to_table >= 0)
+        table_rows = np.asarray(self.neighbors[to_table[known]])
+        mapped = np.where(table_rows >= 0, to_items[np.maximum(table_rows, 0)], -1)
+        neighbors[known] = mapped
+        scores[known] = np.where(mapped >= 0, self.scores[to_table[known]], 0)
+        return neighbors, scores
+
+def main(k: int = DEFAULT_K, block: int = BLOCK, profiler: Profiler = NULL_PROFILER):
+    with profiler.stage('load'):
+        items = load_items()
+        variations = load_variations()
+    neighbors, scores = build(items, variations, k, block, profiler)
+    with profiler.stage('write', items=len(items)):
+        write(items['id'], neighbors, scores, k)
+    found = neighbors >= 0
+    print(f'Wrote {k} neighbours for {len(items)} items to {OUT_DIR} '
+          f'(mean similarity {scores[found].mean() if found.any() else 0:.3f})')
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('--k', type=int, default=DEFAULT_K, help='neighbours per item')
+    p.add_argument('--block', type=int, default=BLOCK, help='rows per matrix-product block')
+    add_profile_args(p)
+    args = p.parse_args()
+    profiler = Profiler.from_args('similar_products', args)
+    try:
+        main(args.k, args.block, profiler)
+    finally:
+        profiler.write()
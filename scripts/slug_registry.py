@@ -0,0 +1,103 @@
+"""
+Persistent registry of item slugs.
+
+Generated names repeat ("Urban Cardigan" is drawn for dozens of items), so a
+bare slugify(name) sends many products to the same URL and image. The
+registry hands every item id a unique slug and remembers it:
+
+- an item whose name still slugifies to the same base keeps its slug, so
+  URLs and image paths stay put across reruns;
+- a new or renamed item gets its base if that is free, else base-2, base-3,
+  ... (the smallest free suffix), allocated in id-seed order so the result
+  does not depend on row order;
+- slugs of items that left the catalog stay reserved, so a retired URL is
+  never handed to a different product.
+
+The table is loaded once into hash indexes (id -> base/slug, slug -> id), so
+keeping a slug or checking a candidate is O(1). It lives in
+data/refresh_state/slug_registry.csv.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+from catalog_transform import seed_column
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+REGISTRY_PATH = os.path.join(BASE, 'data', 'refresh_state', 'slug_registry.csv')
+
+class SlugRegistry:
+    def __init__(self, path: str = REGISTRY_PATH):
+        self.path = path
+        table = pd.DataFrame({'id': [], 'base': [], 'slug': []}, dtype=object)
+        if os.path.exists(path):
+            table = pd.read_csv(path, dtype=str, keep_default_na=False)
+        self.table = table.drop_duplicates('id', keep='last').set_index('id')
+        self.owner = dict(zip(self.table['slug'], self.table.index))
+
+    def __len__(self):
+        return len(self.table)
+
+    def lookup(self, slug: str) -> str:
+        """Id of the item that owns slug, or None."""
+        return self.owner.get(slug)
+
+    def assign(self, ids: pd.Series, bases: pd.Series) -> pd.Series:
+        """Unique slug for every id (aligned with ids), registering new allocations."""
+        ids = ids.astype(str)
+        bases = bases.astype(str)
+        first = ~ids.duplicated()
+        req = pd.DataFrame({'id': ids[first].to_numpy(), 'base': bases[first].to_numpy()})
+
+        # Items whose base is unchanged keep their registered slug
+        pos = self.table.index.get_indexer(req['id'])
+        known = pos >= 0
+        keep = known.copy()
+        keep[known] = self.table['base'].to_numpy()[pos[known]] == req['base'].to_numpy()[known]
+        slugs = np.full(len(req), None, dtype=object)
+        slugs[keep] = self.table['slug'].to_numpy()[pos[keep]]
+
+        # Everything else is released, then reallocated
+        moving = req['id'].to_numpy()[known & ~keep]
+        for slug in self.table.loc[moving, 'slug']:
+            self.owner.pop(slug, None)
+        new = req.loc[~keep].assign(seed=seed_column(req.loc[~keep, 'id']).to_numpy())
+        new = new.sort_values(['base', 'seed', 'id'], kind='stable')
+
+        # Fast path: the n-th new item of a base gets base, base-2, ...
+        rank = new.groupby('base', sort=False).cumcount().to_numpy()
+        cand = np.where(rank == 0, new['base'].to_numpy(), new['base'].to_numpy() + '-' + (rank + 1).astype(str))
+        cand = pd.Series(cand, index=new.index, dtype=object)
+        taken = np.fromiter((c in self.owner for c in cand), dtype=bool, count=len(cand))
+        clash = pd.Series(taken, index=cand.index) | cand.duplicated(keep=False)
+        # A base with any clash is allocated entirely by the slow path, in seed order
+        ok = ~clash.groupby(new['base']).transform('any')
+        for slug, item_id in zip(cand[ok], new.loc[ok, 'id']):
+            self.owner[slug] = item_id
+
+        # Slow path for the rest: smallest free suffix, one counter per base
+        nxt = {}
+        for idx in new.index[~ok.to_numpy()]:
+            base, item_id = new.at[idx, 'base'], new.at[idx, 'id']
+            slug = base
+            if slug in self.owner:
+                n = nxt.get(base, 2)
+                while f'{base}-{n}' in self.owner:
+                    n += 1
+                nxt[base] = n + 1
+                slug = f'{base}-{n}'
+            self.owner[slug] = item_id
+            cand[idx] = slug
+        slugs[new.index.to_numpy()] = cand.loc[new.index].to_numpy()
+
+        update = pd.DataFrame({'base': req['base'].to_numpy(), 'slug': slugs}, index=req['id'].to_numpy())
+        table = pd.concat([self.table, update])
+        self.table = table[~table.index.duplicated(keep='last')]
+        by_id = pd.Series(slugs, index=req['id'].to_numpy())
+        return pd.Series(by_id.loc[ids].to_numpy(), index=ids.index)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + '.tmp'
+        self.table.rename_axis('id').reset_index().to_csv(tmp, index=False)
+        os.replace(tmp, self.path)
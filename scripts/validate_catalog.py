@@ -1,44 +1,250 @@
-import pandas as pd
+#!/usr/bin/env python3
+"""
+Validate the catalog CSVs before they are sent to Constructor.com.
+
+Files are streamed in fixed-size chunks (all columns read as raw strings), so
+memory stays bounded regardless of catalog size. Parent and variation ids are
+tracked as sorted arrays of 64-bit hashes rather than Python sets, and each
+shard is validated in its own worker process.
+
+Rules:
+- duplicate parent ids and duplicate variation ids (SKUs)
+- variations whose item_id has no parent (orphans)
+- SKU format: <item_id>-<colour code>-<size>, where the colour code is 2-3
+  capitals starting with the colour's initial and the size is written out or
+  abbreviated to three characters ("One Size" -> ONE)
+- metadata:price must be numeric
+- metadata:inventory must be a non-negative integer
+- local image_url files must exist (in the image pack with CATALOG_IMAGES=pack)
+
+Usage: python3 scripts/validate_catalog.py [--items PATH ...] [--variations PATH ...]
+                                           [--errors-out FILE|-] [--workers N] [--profile]
+
+Shards may be gzip-compressed. Row-level errors are written as JSON lines
+({"file", "row", "rule", "id", "value"}) to --errors-out; "-" means stdout.
+"""
+import argparse
+import json
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import image_pack
+from catalog_profile import NULL_PROFILER, Profiler, add_profile_args
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+ITEMS_CSV = os.path.join(BASE, 'data', 'items.csv')
+VARS_CSV = os.path.join(BASE, 'data', 'variations.csv')
+
+CHUNK_ROWS = 250_000
+MAX_ERRORS_PER_SHARD = 1000
+SKU_RE = r"^(?P<item>.+)-(?P<color>[A-Z]{2,3})-(?P<size>[A-Z0-9]+)$"
+
+RULE_MESSAGES = {
+    'duplicate_item_id': 'Duplicate Parent IDs found.',
+    'orphan_variation': 'variations found with no matching Parent ID.',
+    'duplicate_variation_id': 'Duplicate Variation IDs detected.',
+    'sku_format': 'Variation IDs do not match <item_id>-<colour>-<size>.',
+    'price_not_numeric': 'Parent rows have a non-numeric price.',
+    'inventory_invalid': 'variations have a negative or non-integer inventory.',
+    'image_missing': 'rows reference an image file that does not exist.',
+}
+
+def hash_keys(values: pd.Series) -> np.ndarray:
+    return pd.util.hash_array(values.to_numpy(dtype=object))
+
+def contains(sorted_hashes: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Membership test against a sorted hash array via binary search."""
+    if not len(sorted_hashes):
+        return np.zeros(len(values), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_hashes, values), len(sorted_hashes) - 1)
+    return sorted_hashes[pos] == values
+
+def read_chunks(path: str):
+    return pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=CHUNK_ROWS)
+
+class ShardReport:
+    """Rule counts plus a capped list of row-level errors for one shard."""
+    def __init__(self, path: str, max_errors: int):
+        self.path = path
+        self.max_errors = max_errors
+        self.rows = 0
+        self.counts = {}
+        self.errors = []
+
+    def add(self, rule: str, mask, rows: np.ndarray, ids: pd.Series, values: pd.Series):
+        mask = np.asarray(mask)
+        n = int(mask.sum())
+        if not n:
+            return
+        self.counts[rule] = self.counts.get(rule, 0) + n
+        room = self.max_errors - len(self.errors)
+        if room <= 0:
+            return
+        for row, key, value in zip(rows[mask][:room], ids[mask][:room], values[mask][:room]):
+            self.errors.append({'file': self.path, 'row': int(row), 'rule': rule, 'id': key, 'value': value})
+
+class ImageChecker:
+    """os.path.exists (or, with CATALOG_IMAGES=pack, the pack index) per unique local image path, cached for the shard."""
+    def __init__(self):
+        self.seen = {}
+        self.pack = image_pack.ImagePack() if image_pack.enabled() else None
+
+    def missing(self, urls: pd.Series) -> np.ndarray:
+        local = (urls != '') & ~urls.str.startswith(('http://', 'https://'))
+        for url in urls[local].unique():
+            if url not in self.seen:
+                self.seen[url] = ((self.pack is not None and url in self.pack)
+                                  or os.path.exists(os.path.join(BASE, url)))
+        exists = urls.map(self.seen).fillna(True).astype(bool)
+        return (local & ~exists).to_numpy()
 
-def validate_catalog():
-    items_path = 'data/items.csv'
-    vars_path = 'data/variations.csv'
-    
-    if not os.path.exists(items_path) or not os.path.exists(vars_path):
+def check_items_shard(path: str, max_errors: int) -> tuple:
+    report = ShardReport(path, max_errors)
+    images = ImageChecker()
+    hashes = []
+    for chunk in read_chunks(path):
+        rows = np.arange(report.rows + 1, report.rows + len(chunk) + 1)
+        report.rows += len(chunk)
+        ids = chunk['id']
+        hashes.append(hash_keys(ids))
+
+        price = chunk['metadata:price']
+        report.add('price_not_numeric', pd.to_numeric(price, errors='coerce').isna(), rows, ids, price)
+        report.add('image_missing', images.missing(chunk['image_url']), rows, ids, chunk['image_url'])
+    return report, np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+
+def check_variations_shard(path: str, item_hashes: np.ndarray, max_errors: int) -> tuple:
+    report = ShardReport(path, max_errors)
+    images = ImageChecker()
+    hashes = []
+    for chunk in read_chunks(path):
+        rows = np.arange(report.rows + 1, report.rows + len(chunk) + 1)
+        report.rows += len(chunk)
+        skus = chunk['variation_id']
+        hashes.append(hash_keys(skus))
+
+        # Referential integrity (child -> parent) against the sorted parent hashes
+        found = contains(item_hashes, hash_keys(chunk['item_id']))
+        report.add('orphan_variation', ~found, rows, skus, chunk['item_id'])
+
+        parts = skus.str.extract(SKU_RE)
+        size = chunk['metadata:size'].str.upper().str.replace(' ', '', regex=False)
+        sku_ok = ((parts['item'] == chunk['item_id'])
+                  & (parts['color'].str[:1] == chunk['metadata:color'].str[:1].str.upper())
+                  & ((parts['size'] == size) | (parts['size'] == size.str[:3])))
+        report.add('sku_format', ~sku_ok.fillna(False).astype(bool), rows, skus, skus)
+
+        inventory = chunk['metadata:inventory']
+        stock = pd.to_numeric(inventory, errors='coerce')
+        report.add('inventory_invalid', ~((stock >= 0) & (stock == stock.round())).fillna(False), rows, skus, inventory)
+        report.add('image_missing', images.missing(chunk['image_url']), rows, skus, chunk['image_url'])
+    return report, np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+
+def duplicate_hashes(hashes: np.ndarray) -> tuple:
+    """(number of duplicate rows, sorted array of hashes that occur more than once)."""
+    hashes = np.sort(hashes)
+    repeated = hashes[1:] == hashes[:-1]
+    return int(repeated.sum()), np.unique(hashes[1:][repeated])
+
+def report_duplicates(paths: list, key_col: str, dup: np.ndarray, rule: str, max_errors: int) -> list:
+    # Second pass only runs when duplicates exist, to recover their row numbers
+    errors = []
+    for path in paths:
+        start = 0
+        for chunk in read_chunks(path):
+            hit = contains(dup, hash_keys(chunk[key_col]))
+            for offset in np.flatnonzero(hit):
+                if len(errors) >= max_errors:
+                    return errors
+                key = chunk[key_col].iloc[offset]
+                errors.append({'file': path, 'row': start + int(offset) + 1, 'rule': rule, 'id': key, 'value': key})
+            start += len(chunk)
+    return errors
+
+def _run(workers: int, fn, jobs):
+    if workers <= 1 or len(jobs) <= 1:
+        return [fn(*job) for job in jobs]
+    # One pool per stage, shut down before the stage ends, so its workers' CPU is counted in it
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(fn, *zip(*jobs)))
+
+def validate_catalog(items_paths: list = None, vars_paths: list = None, errors_out: str = None,
+                     workers: int = None, max_errors: int = MAX_ERRORS_PER_SHARD,
+                     profiler: Profiler = NULL_PROFILER) -> int:
+    items_paths = items_paths or [ITEMS_CSV]
+    vars_paths = vars_paths or [VARS_CSV]
+
+    if not all(os.path.exists(p) for p in items_paths + vars_paths):
         print("❌ Error: CSV files not found in /data folder. Run the generator first!")
-        return
-
-    # Load data into DataFrames
-    items_df = pd.read_csv(items_path)
-    vars_df = pd.read_csv(vars_path)
-    errors = 0
-
-    print(f"--- 🔍 Validating {len(items_df)} Parents and {len(vars_df)} Variations ---")
-
-    # 1. Check for Duplicate Parent IDs
-    dupes = items_df['id'].duplicated().sum()
-    if dupes > 0:
-        print(f"❌ Error: {dupes} Duplicate Parent IDs found.")
-        errors += 1
-
-    # 2. Referential Integrity (Child -> Parent)
-    # This ensures every variation actually has a parent product to live under
-    orphan_vars = vars_df[~vars_df['item_id'].isin(items_df['id'])]
-    if not orphan_vars.empty:
-        print(f"❌ Error: {len(orphan_vars)} variations found with no matching Parent ID.")
-        errors += 1
-
-    # 3. Check for Variation ID (SKU) uniqueness
-    v_dupes = vars_df['variation_id'].duplicated().sum()
-    if v_dupes > 0:
-        print(f"❌ Error: {v_dupes} Duplicate Variation IDs detected.")
-        errors += 1
-
-    if errors == 0:
+        return 1
+
+    print(f"--- 🔍 Validating {len(items_paths)} parent shard(s) and {len(vars_paths)} variation shard(s) ---")
+    workers = workers or min(len(items_paths) + len(vars_paths), os.cpu_count() or 1)
+    with profiler.stage('items') as stage:
+        item_results = _run(workers, check_items_shard, [(p, max_errors) for p in items_paths])
+        item_hashes = np.concatenate([h for _, h in item_results])
+        n_item_dupes, item_dup = duplicate_hashes(item_hashes)
+        item_hashes = np.unique(item_hashes)
+        stage.set_items(len(item_hashes))
+
+    with profiler.stage('variations') as stage:
+        var_results = _run(workers, check_variations_shard, [(p, item_hashes, max_errors) for p in vars_paths])
+        var_hashes = np.concatenate([h for _, h in var_results])
+        n_var_dupes, var_dup = duplicate_hashes(var_hashes)
+        stage.set_items(len(var_hashes))
+
+    reports = [r for r, _ in item_results + var_results]
+    counts = {}
+    for r in reports:
+        for rule, n in r.counts.items():
+            counts[rule] = counts.get(rule, 0) + n
+    if n_item_dupes:
+        counts['duplicate_item_id'] = n_item_dupes
+    if n_var_dupes:
+        counts['duplicate_variation_id'] = n_var_dupes
+
+    print(f"Checked {sum(r.rows for r, _ in item_results)} Parents and {sum(r.rows for r, _ in var_results)} Variations.")
+    for rule, message in RULE_MESSAGES.items():
+        if counts.get(rule):
+            print(f"❌ Error: {counts[rule]} {message}")
+
+    if errors_out:
+        with profiler.stage('errors_out'):
+            errors = [e for r in reports for e in r.errors]
+            if n_item_dupes:
+                errors += report_duplicates(items_paths, 'id', item_dup, 'duplicate_item_id', max_errors)
+            if n_var_dupes:
+                errors += report_duplicates(vars_paths, 'variation_id', var_dup, 'duplicate_variation_id', max_errors)
+            out = sys.stdout if errors_out == '-' else open(errors_out, 'w')
+            try:
+                for e in errors:
+                    out.write(json.dumps(e) + '\n')
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+
+    failed = len(counts)
+    if failed == 0:
         print("✅ Validation Passed! Your catalog is clean and ready for Constructor.com.")
     else:
-        print(f"⚠️ Validation Failed with {errors} major error(s).")
+        print(f"⚠️ Validation Failed with {failed} major error(s).")
+    return failed
 
 if __name__ == "__main__":
-    validate_catalog()
\ No newline at end of file
+    p = argparse.ArgumentParser()
+    p.add_argument('--items', nargs='+', default=None, help='item CSV shard(s)')
+    p.add_argument('--variations', nargs='+', default=None, help='variation CSV shard(s)')
+    p.add_argument('--errors-out', default=None, help='write row-level errors as JSON lines ("-" for stdout)')
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--max-errors', type=int, default=MAX_ERRORS_PER_SHARD, help='row-level errors kept per shard')
+    add_profile_args(p)
+    args = p.parse_args()
+    profiler = Profiler.from_args('validate_catalog', args)
+    try:
+        failed = validate_catalog(args.items, args.variations, args.errors_out, args.workers, args.max_errors, profiler)
+    finally:
+        profiler.write()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,79 @@
+"""
+Item -> variation index with per-item inventory roll-ups.
+
+variations.csv is written grouped by parent, so each item's variations form
+one contiguous run of rows. The index stores, for every item row position,
+the [start, end) range of its variations (in a parent-sorted order that is
+the identity permutation when the file is already grouped), plus roll-ups
+computed with vectorized groupbys: total inventory, and the colours and
+sizes that have stock. Looking up an item's stock or its variations is then
+an array index rather than a scan of variations.csv.
+"""
+import numpy as np
+import pandas as pd
+
+from catalog_transform import first_positions
+
+class VariationIndex:
+    def __init__(self, order, starts, ends, total_inventory, in_stock_colors, in_stock_sizes):
+        self.order = order                      # variation rows sorted by parent (None if already grouped)
+        self.starts = starts                    # int64[n_items]
+        self.ends = ends                        # int64[n_items]
+        self.total_inventory = total_inventory  # int64[n_items]
+        self.in_stock = total_inventory > 0
+        self.in_stock_colors = in_stock_colors  # object[n_items], tuple of colours per item
+        self.in_stock_sizes = in_stock_sizes    # object[n_items], tuple of sizes per item
+
+    @classmethod
+    def build(cls, items: pd.DataFrame, variations: pd.DataFrame):
+        n = len(items)
+        parent = first_positions(items['id'], variations['item_id'])
+
+        # Orphans sort to the end and are left out of every range
+        key = np.where(parent >= 0, parent, n)
+        order = None
+        if len(key) and (np.diff(key) < 0).any():
+            order = np.argsort(key, kind='stable')
+        counts = np.bincount(key, minlength=n + 1)[:n]
+        ends = np.cumsum(counts)
+        starts = ends - counts
+
+        stock = pd.to_numeric(variations['metadata:inventory'], errors='coerce').fillna(0).to_numpy()
+        owned = parent >= 0
+        total = np.bincount(parent[owned], weights=stock[owned], minlength=n).astype(np.int64)
+
+        rolled = pd.DataFrame({
+            'parent': parent,
+            'color': variations['metadata:color'].astype(object),
+            'size': variations['metadata:size'].astype(object),
+        })[owned & (stock > 0)]
+        colors = cls._rollup(rolled, 'color', n)
+        sizes = cls._rollup(rolled, 'size', n)
+        return cls(order, starts, ends, total, colors, sizes)
+
+    @staticmethod
+    def _rollup(rows: pd.DataFrame, col: str, n: int) -> np.ndarray:
+        distinct = rows[['parent', col]].dropna().drop_duplicates()
+        grouped = distinct.groupby('parent', sort=False)[col].agg(tuple)
+        out = np.empty(n, dtype=object)
+        out.fill(())
+        out[grouped.index.to_numpy()] = grouped.to_numpy()
+        return out
+
+    def variation_rows(self, item_pos: int) -> np.ndarray:
+        """Row positions in variations.csv belonging to the item at item_pos."""
+        start, end = self.starts[item_pos], self.ends[item_pos]
+        if self.order is None:
+            return np.arange(start, end)
+        return self.order[start:end]
+
+    def in_stock_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Keep only item positions that have stock, preserving their order."""
+        rows = np.asarray(rows)
+        return rows[self.in_stock[rows]]
+
+    def summary(self, item_pos: int) -> str:
+        if not self.in_stock[item_pos]:
+            return 'Sold out'
+        sizes = ', '.join(self.in_stock_sizes[item_pos])
+        return f'{self.total_inventory[item_pos]} in stock' + (f' · Sizes: {sizes}' if sizes else '')
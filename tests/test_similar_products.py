@@ -0,0 +1,39 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import similar_products  # noqa: E402
+
+def catalog_with_duplicate_ids():
+    items = pd.DataFrame({
+        'id': ['AA-1', 'AA-2', 'AA-1', 'AA-3'],
+        'item_name': ['Ridge Tee', 'Summit Tee', 'Trail Jacket', 'Peak Tee'],
+        'metadata:brand': ['Aura & Alpine'] * 4,
+        'metadata:gender': ['Men', 'Men', 'Women', 'Men'],
+        'group_ids': ['tops'] * 4,
+        'metadata:price': [20.0, 22.0, 120.0, 21.0],
+    })
+    variations = pd.DataFrame({
+        'variation_id': ['AA-1-S', 'AA-1-M', 'AA-2-S', 'AA-3-S'],
+        'item_id': ['AA-1', 'AA-1', 'AA-2', 'AA-3'],
+        'metadata:color': ['Red', 'Blue', 'Red', 'Red'],
+        'metadata:size': ['S', 'M', 'S', 'S'],
+        'metadata:inventory': [3, 1, 5, 2],
+    })
+    return items, variations
+
+def test_build_with_duplicate_ids(tmp_path):
+    items, variations = catalog_with_duplicate_ids()
+    neighbors, scores = similar_products.build(items, variations, k=2)
+    assert neighbors.shape == (4, 2)
+    assert (neighbors != np.arange(4)[:, None]).all()
+
+    similar_products.write(items['id'], neighbors, scores, 2, str(tmp_path))
+    table = similar_products.SimilarItems.load(str(tmp_path))
+    mapped, _ = table.rows_for(items['id'])
+    assert mapped.shape == (4, 2)
+    assert ((mapped >= -1) & (mapped < 4)).all()